@@ -1,6 +1,16 @@
-import os
+from data_tools.datasources import datasource_path
+from data_tools.prefetch import Datasource
 
-import pandas as pd
+couples_age_disparity_datasource = Datasource(
+        datasource_path("household", "household_composition", "table_7ab235bf-b5a7-4077-bf56-3f5c8efec7d0.csv"))
+couples_gender_disparity_datasource = Datasource(
+        datasource_path("household", "household_composition", "Marriages__key_figures_25052024_182843.csv"),
+        options=dict(sep=';'))
+mother_age_disparity_datasource = Datasource(
+        datasource_path("household", "household_composition", "Geboorte__kerncijfers_per_regio_25052024_182014.csv"),
+        options=dict(sep=';'))
+
+datasources = [couples_age_disparity_datasource, couples_gender_disparity_datasource, mother_age_disparity_datasource]
 
 
 def read_couples_age_disparity():
@@ -9,11 +19,7 @@ def read_couples_age_disparity():
     Returns:
 
     """
-    data_path = os.path.join(
-            os.path.dirname(__file__),
-            "../../datasources/household/household_composition/table_7ab235bf-b5a7-4077-bf56-3f5c8efec7d0.csv"
-    )
-    df = pd.read_csv(data_path, sep=',')
+    df = couples_age_disparity_datasource.read()
     df.loc[:, 'male_female_age_gap'] = [
         '0-0', '', '-1-4', '-5-9', '-10-14', '-15-19', '-20-100', '', '1-4', '5-9', '10-14', '15-19', '20-100'
     ]
@@ -43,11 +49,7 @@ def read_couples_gender_disparity():
     Returns:
 
     """
-    data_path = os.path.join(
-            os.path.dirname(__file__),
-            "../../datasources/household/household_composition/Marriages__key_figures_25052024_182843.csv"
-    )
-    df = pd.read_csv(data_path, sep=';').drop('Periods', axis=1).T
+    df = couples_gender_disparity_datasource.read().drop('Periods', axis=1).T
     df.loc[:, ['first_partner', 'second_partner']] = [None, None]
     df.iloc[[0, 3], [1, 2]] = ['male', 'female']
     df.iloc[[1, 4], [1, 2]] = ['male', 'male']
@@ -84,11 +86,7 @@ def get_mother_age_disparity():
     Returns:
 
     """
-    data_path = os.path.join(
-            os.path.dirname(__file__),
-            "../../datasources/household/household_composition/Geboorte__kerncijfers_per_regio_25052024_182014.csv"
-    )
-    df = pd.read_csv(data_path, sep=';')
+    df = mother_age_disparity_datasource.read()
     df.columns = df.columns.str.replace(r'Levend geboren kinderen: leeftijd moe.../(.*) \(aantal\)', r'\1', regex=True)
     df.columns = df.columns.str.replace('Levend geboren kinderen: rangnummer/(\d)e.*', ' ', regex=True)
     df.drop(['Perioden', "Regio's", " "], axis=1, inplace=True)
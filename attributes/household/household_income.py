@@ -1,12 +1,19 @@
-import os
 import re
 
 import pandas as pd
 from ipfn import ipfn
 
+from data_tools.datasources import datasource_path
+from data_tools.prefetch import Datasource
 from gensynthpop.evaluation.validation import validate_fitted_distribution
 from gensynthpop.utils.extractors import synthetic_population_to_contingency
 
+household_income_datasource = Datasource(
+        datasource_path("household", "household_income", "Inkomen_huishoudens__kenmerken__regio_25052024_182249.csv"),
+        options=dict(sep=';'))
+
+datasources = [household_income_datasource]
+
 
 def add_household_type_and_income_age_group(df_synth_households: pd.DataFrame) -> pd.DataFrame:
     df_synth_households.loc[:, 'income_age_group'] = df_synth_households.main_bread_winner_age.map(
@@ -78,11 +85,7 @@ def read_household_income():
     Returns:
 
     """
-    data_path = os.path.join(
-            os.path.dirname(__file__),
-            "../../datasources/household/household_income/Inkomen_huishoudens__kenmerken__regio_25052024_182249.csv"
-    )
-    df = pd.read_csv(data_path, sep=';')
+    df = household_income_datasource.read()
     df.drop(['Populatie', "Regio's", 'Perioden', 'Particuliere huishoudens (x 1 000)'], axis=1, inplace=True)
 
     df.rename(
@@ -1,23 +1,73 @@
+import hashlib
 import os
+from typing import Iterable, Optional
 
 import pandas as pd
 
 from attributes.marginal_data_reader import neighborhood_codes
+from data_tools.atomic_write import atomic_write
+from data_tools.datasources import datasource_path, processed_path
 
+pc6_data_path = datasource_path('household', 'postal_code', 'pc6hnr20190801_gwb.csv')
 
-def read_pc6_data() -> pd.DataFrame:
+pc6_cache_directory = processed_path(__file__)
+
+
+def read_pc6_data(neighb_codes: Optional[Iterable[str]] = None, chunk_size: int = 1_000_000) -> pd.DataFrame:
     """
     https://www.cbs.nl/nl-nl/maatwerk/2019/42/buurt-wijk-en-gemeente-2019-voor-postcode-huisnummer
-    Returns:
 
+    The source file contains one row for every address in The Netherlands. Only the columns we need are streamed
+    from it in chunks, and each chunk is filtered on the integer `Buurt2019` code before anything else is done with it.
+    The small (neighb_code, PC6, count) aggregate that remains is cached in `processed/`, so subsequent calls for the
+    same neighborhoods do not have to touch the national file at all.
+
+    Args:
+        neighb_codes: CBS neighborhood codes (e.g., BU05181785) to read the postal codes for. Defaults to the
+            neighborhoods of this synthetic population
+        chunk_size: Number of addresses to read from the national file at once
+
+    Returns:
+        Data frame with the columns `neighb_code`, `PC6` and `count`, where count is the number of addresses
     """
-    path = os.path.join(
-            os.path.dirname(__file__),
-            '../../datasources/household/postal_code/pc6hnr20190801_gwb.csv')
-    df = pd.read_csv(path, sep=';')
-    df.loc[:, 'neighb_code'] = df.Buurt2019.map(lambda x: f'BU{x:08d}')
-    df = df[df.neighb_code.isin(neighborhood_codes)]
-    df = df.groupby(['neighb_code', 'PC6'])['Huisnummer'].count()
-    df = df.reset_index().rename(columns={'Huisnummer': 'count'})
+    neighb_codes = sorted(set(neighborhood_codes if neighb_codes is None else neighb_codes))
+    cache_path = _pc6_cache_path(neighb_codes)
+
+    if os.path.exists(cache_path) and (
+            not os.path.exists(pc6_data_path) or os.path.getmtime(cache_path) >= os.path.getmtime(pc6_data_path)):
+        return pd.read_pickle(cache_path)
+
+    df = _aggregate_pc6_data(neighb_codes, chunk_size)
+
+    with atomic_write(cache_path) as tmp_path:
+        df.to_pickle(tmp_path)
 
     return df
+
+
+def _aggregate_pc6_data(neighb_codes: Iterable[str], chunk_size: int) -> pd.DataFrame:
+    # Neighborhood codes are stored as integers in the source file, i.e., BU05181785 is stored as 5181785
+    buurt_codes = [int(code[2:]) for code in neighb_codes]
+
+    counts = list()
+    for chunk in pd.read_csv(pc6_data_path, sep=';', usecols=['PC6', 'Huisnummer', 'Buurt2019'],
+                             dtype={'PC6': str, 'Buurt2019': 'int64'}, chunksize=chunk_size):
+        chunk = chunk[chunk.Buurt2019.isin(buurt_codes)]
+        if len(chunk):
+            counts.append(chunk.groupby(['Buurt2019', 'PC6'])['Huisnummer'].count())
+
+    if counts:
+        s_counts = pd.concat(counts).groupby(level=[0, 1]).sum()
+    else:
+        s_counts = pd.Series([], name='Huisnummer', dtype='int64',
+                             index=pd.MultiIndex.from_tuples([], names=['Buurt2019', 'PC6']))
+
+    df = s_counts.reset_index().rename(columns={'Huisnummer': 'count'})
+    df.insert(0, 'neighb_code', df.Buurt2019.map(lambda x: f'BU{x:08d}'))
+
+    return df.drop('Buurt2019', axis=1).sort_values(['neighb_code', 'PC6']).reset_index(drop=True)
+
+
+def _pc6_cache_path(neighb_codes: Iterable[str]) -> str:
+    digest = hashlib.sha1(','.join(neighb_codes).encode()).hexdigest()[:12]
+    return os.path.join(pc6_cache_directory, f'pc6_counts_{digest}.pkl')
@@ -1,12 +1,24 @@
-import os
 from typing import Literal
 
 import pandas as pd
 from ipfn import ipfn
 
+from data_tools.cbs_parsing import read_cbs_csv
+from data_tools.datasources import datasource_path
+from data_tools.prefetch import Datasource
 from gensynthpop.evaluation.validation import validate_fitted_distribution
 from gensynthpop.utils.extractors import synthetic_population_to_contingency
 
+vehicle_ownership_datasource = Datasource(
+        datasource_path("household", "vehicle_ownership",
+                        "Huishoudens_met_auto_of_motor__2010_2015_14062024_171657.csv"),
+        read_cbs_csv, dict(decimal=',', numeric_columns=[
+            'Huishoudens in bezit van auto/% Huishoudens in bezit van auto  (%)',
+            'Huishoudens in bezit van motor/% Huishoudens in bezit van motor  (%)'
+        ]))
+
+datasources = [vehicle_ownership_datasource]
+
 
 def read_vehicle_ownership() -> pd.DataFrame:
     """
@@ -51,11 +63,7 @@ def read_vehicle_ownership() -> pd.DataFrame:
     Returns:
 
     """
-    data_path = os.path.join(
-            os.path.dirname(__file__),
-            "../../datasources/household/vehicle_ownership/Huishoudens_met_auto_of_motor__2010_2015_14062024_171657.csv"
-    )
-    df = pd.read_csv(data_path, sep=';').drop('Perioden', axis=1)
+    df = vehicle_ownership_datasource.read().drop('Perioden', axis=1)
     df.rename(columns={
         'Aantal voertuigen in huishouden': 'n_vehicles',
         'Huishoudens in bezit van auto/Huishoudens in bezit van auto (aantal)': 'car',
@@ -84,15 +92,12 @@ def read_vehicle_ownership() -> pd.DataFrame:
     }, inplace=True)
 
     df = df.astype({'car': float, 'motorcycle': float})
-    df.loc[:, 'car_relative_float'] = df.car_relative.map(lambda x: float(x.replace(',', '.')))
-    df.loc[:, 'motorcycle_relative_float'] = df.motorcycle_relative.map(lambda x: float(x.replace(',', '.')))
     msk_no_vehicles = df.n_vehicles == 0
-    df.loc[msk_no_vehicles, 'car'] = df.loc[msk_no_vehicles].car / df.loc[msk_no_vehicles].car_relative_float * 100
+    df.loc[msk_no_vehicles, 'car'] = df.loc[msk_no_vehicles].car / df.loc[msk_no_vehicles].car_relative * 100
     df.loc[msk_no_vehicles, 'motorcycle'] = df.loc[msk_no_vehicles].motorcycle / df.loc[
-        msk_no_vehicles].motorcycle_relative_float * 100
+        msk_no_vehicles].motorcycle_relative * 100
 
-    df.drop(['car_relative', 'motorcycle_relative', 'car_relative_float', 'motorcycle_relative_float'], axis=1,
-            inplace=True)
+    df.drop(['car_relative', 'motorcycle_relative'], axis=1, inplace=True)
 
     return df
 
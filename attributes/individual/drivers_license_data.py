@@ -0,0 +1,179 @@
+import functools
+import re
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from attributes.marginal_data_reader import province_population_datasource, read_province_population_size
+from data_tools.datasources import datasource_path
+from data_tools.prefetch import Datasource
+from data_tools.type_table import population_weights
+
+joint_driver_license_datasource = Datasource(
+        datasource_path("individual", "drivers_license",
+                        "Personen_met_rijbewijs__categorie__regio_19052024_184228.csv"),
+        options=dict(sep=';'))
+
+datasources = [joint_driver_license_datasource, province_population_datasource]
+
+# Each license age group is composed of (parts of) the age groups in which the province population size is reported.
+# A part is given as (start, end, province age group), and covers the ages start <= age < end. Its size is the part of
+# the province age group with those ages, according to the relative frequency of the integer ages in the synthetic
+# population. A part of (None, None, province age group) takes the entire province age group.
+license_age_population_parts: Dict[str, List[Tuple[Optional[int], Optional[int], str]]] = {
+    '0-15': [(None, None, '<5'), (None, None, '5-10'), (None, None, '10-15')],
+    '15': [(15, 16, '15-20')],
+    '16-18': [(16, 18, '15-20')],
+    '18-20': [(18, 20, '15-20')],
+    '20-25': [(None, None, '20-25')],
+    '25-30': [(25, 30, '25-45')],
+    '30-40': [(30, 40, '25-45')],
+    '40-50': [(40, 45, '25-45'), (45, 50, '45-65')],
+    '50-60': [(50, 60, '45-65')],
+    '60-65': [(60, 65, '45-65')],
+    '65-70': [(65, 70, '65-80')],
+    '70-75': [(70, 75, '65-80')],
+    '75+': [(75, 80, '65-80'), (None, None, '80+')],
+}
+
+
+@functools.lru_cache(maxsize=None)
+def _read_joint_driver_license() -> pd.DataFrame:
+    df = joint_driver_license_datasource.read()[
+        ["Leeftijd rijbewijshouder", "Rijbewijscategorie", "Personen met rijbewijs (aantal)"]
+    ].rename(columns={
+        "Leeftijd rijbewijshouder": 'license_age',
+        "Rijbewijscategorie": 'license',
+        "Personen met rijbewijs (aantal)": 'count'
+    })
+
+    df_totals = df.groupby('license_age')['count'].sum()
+    assert df_totals.loc['Totaal'] == df_totals[df_totals.index != 'Totaal'].sum(), "CBS data totals do not match data"
+
+    df = df.pivot(index='license_age', columns='license', values='count')
+    df.index = df.index.map(
+            lambda i: '75+' if i == '75 jaar of ouder' else re.sub(r'(\d+) tot (\d+) jaar', r'\1-\2', i))
+    return df[df.index != 'Totaal']
+
+
+def read_joint_driver_license() -> pd.DataFrame:
+    """
+    Driver License data was downloaded formatted as follows:
+        https://opendata.cbs.nl/#/CBS/nl/dataset/83488NED/table?dl=A628D
+        (Download -> CSV zonder statistische symbolen)
+
+    Filters:
+        Region: Zuid Holland (PV)
+        Perioden: 2019
+        Onderwerp: Personen met Rijbewijs
+    Column Variables:
+        Rijbewijscategorie:
+            Autorijbewijs totaal, Bromfietsrijbewijs, Motorrijbewijs
+    Row Variables:
+        Leeftijd (all except "Totaal" and "Leeftijd onbekend")
+
+    The file is only read once. Each call returns a copy, so callers are free to modify the result.
+
+    Returns:
+
+    """
+    return _read_joint_driver_license().copy()
+
+
+@functools.lru_cache(maxsize=None)
+def _read_province_population_size() -> pd.DataFrame:
+    return read_province_population_size()
+
+
+def get_cumulative_age_histogram(df_synth_pop: pd.DataFrame) -> np.ndarray:
+    """
+    Counts the agents of each integer age in the synthetic population (or type table), and returns the cumulative
+    counts, such that the number of agents with start <= age < end is `cumulative[end] - cumulative[start]`
+
+    Args:
+        df_synth_pop:
+
+    Returns:
+
+    """
+    counts = np.bincount(df_synth_pop.age.to_numpy(dtype=int), weights=population_weights(df_synth_pop))
+    return np.concatenate([[0], np.cumsum(counts.astype('int64'))])
+
+
+def count_ages(cumulative_age_histogram: np.ndarray, start: int, end: int) -> int:
+    """
+    Number of agents with start <= age < end, from the cumulative histogram created with `get_cumulative_age_histogram`
+    """
+    last = len(cumulative_age_histogram) - 1
+    return cumulative_age_histogram[min(end, last)] - cumulative_age_histogram[min(start, last)]
+
+
+@functools.lru_cache(maxsize=8)
+def _get_license_age_totals(cumulative_age_histogram: Tuple[int, ...]) -> pd.Series:
+    cumulative = np.asarray(cumulative_age_histogram)
+    province_totals = _read_province_population_size()['count']
+
+    totals = dict()
+    for license_age, parts in license_age_population_parts.items():
+        totals[license_age] = 0.
+        for start, end, province_age_group in parts:
+            if start is None:
+                totals[license_age] += province_totals.loc[province_age_group]
+            else:
+                group_start, group_end = map(int, province_age_group.split('-'))
+                relative_size = count_ages(cumulative, start, end) / count_ages(cumulative, group_start, group_end)
+                totals[license_age] += relative_size * province_totals.loc[province_age_group]
+
+    return pd.Series(totals, name='total', dtype=float)
+
+
+def get_license_age_totals(df_synth_pop: pd.DataFrame) -> pd.Series:
+    """
+    Estimates the province population size of each license age group, using the relative frequencies of the integer
+    ages in the synthetic population to split the age groups in which the province population size is reported.
+
+    Args:
+        df_synth_pop:
+
+    Returns:
+        Series indexed by license age
+    """
+    return _get_license_age_totals(tuple(get_cumulative_age_histogram(df_synth_pop).tolist())).copy()
+
+
+def add_totals_to_driver_license(df_licenses: pd.DataFrame, df_synth_pop: pd.DataFrame) -> pd.DataFrame:
+    """
+    Add the known population counts for the region to the driver's licence data frame, using the relative frequencies
+    of the integer ages already added to the synthetic population (see `get_license_age_totals`).
+
+    License age groups that do not occur in the CBS data (i.e., '0-15' and '15') are added with `NaN` license counts.
+
+    Args:
+        df_licenses:
+        df_synth_pop:
+
+    Returns:
+
+    """
+    totals = get_license_age_totals(df_synth_pop)
+    df_licenses = df_licenses.reindex(
+            list(df_licenses.index) + [age_group for age_group in totals.index if age_group not in df_licenses.index])
+    df_licenses.loc[:, 'total'] = totals
+
+    return df_licenses
+
+
+def read_driver_licenses_with_totals(df_synth_pop: pd.DataFrame) -> pd.DataFrame:
+    """
+    Combines the number of car, moped and motor cycle license holders in the province with the estimated province
+    population size of each license age group, so all license types are served from one pass over the synthetic
+    population.
+
+    Args:
+        df_synth_pop:
+
+    Returns:
+        Data frame indexed by license age, with a column for each license type and the column `total`
+    """
+    return add_totals_to_driver_license(read_joint_driver_license(), df_synth_pop)
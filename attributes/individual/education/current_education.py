@@ -1,11 +1,15 @@
-import numbers
-import os
-
 import pandas as pd
 from ipfn import ipfn
 
+from data_tools.datasources import processed_path
+from data_tools.prefetch import Datasource
+from data_tools.type_table import population_margin_series
 from gensynthpop.evaluation.validation import validate_fitted_distribution
-from gensynthpop.utils.extractors import get_margin_series_from_synthetic_population
+
+joint_current_education_datasource = Datasource(
+        processed_path(__file__, 'prepared_education_conditioned_on_absolved_education.pkl'), pd.read_pickle)
+
+datasources = [joint_current_education_datasource]
 
 
 def add_education_age_group(df_synth_pop: pd.DataFrame) -> pd.DataFrame:
@@ -40,16 +44,14 @@ def read_joint_current_education() -> pd.DataFrame:
     The data set is a combination of three separate data sets, and manipulated to add the missing counts for number
     of people not currently enrolled in education.
     """
-    data_path = os.path.join(os.path.dirname(__file__),
-                             'processed/prepared_education_conditioned_on_absolved_education.pkl')
-    df = pd.read_pickle(data_path).rename(columns={'age': 'education_age_group'})
+    df = joint_current_education_datasource.read().rename(columns={'age': 'education_age_group'})
     return df
 
 
 def fit_joint_current_education(df_synth_pop: pd.DataFrame) -> pd.DataFrame:
     df_current_education_joint = read_joint_current_education()
 
-    margins_dict = get_margin_series_from_synthetic_population(df_synth_pop, current_education_margin_names)
+    margins_dict = population_margin_series(df_synth_pop, current_education_margin_names)
     aggregates = [margins_dict[tuple(names)] for names in current_education_margin_names]
 
     df_fitted = ipfn.ipfn(
@@ -66,7 +68,7 @@ def fit_joint_current_education(df_synth_pop: pd.DataFrame) -> pd.DataFrame:
     # factor is relatively huge. With many of these groups with such minor differences, the Z² score grows rapidly.
     # We could collapse all values smaller than 0.5 to 0 (or just round all values here to integers). However,
     # to minimize the effect of our meddling, we only apply this to 100 times smaller expected values than that.
-    df_fitted = df_fitted.map(lambda x: 0 if (isinstance(x, numbers.Number) and float(x) < 0.005) else x)
+    df_fitted['count'] = df_fitted['count'].mask(df_fitted['count'] < min_expected_count, 0.)
 
     # Validate
     name = "current education X gender X age X migration background x absolved education"
@@ -76,6 +78,9 @@ def fit_joint_current_education(df_synth_pop: pd.DataFrame) -> pd.DataFrame:
     return df_fitted
 
 
+# Expected counts below this are set to 0 after the fit (see `fit_joint_current_education`)
+min_expected_count = 0.005
+
 current_education_margin_names = [
     # Single margins
     ['gender'],
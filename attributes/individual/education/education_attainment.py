@@ -1,12 +1,20 @@
-import os
+import functools
 
+import numpy as np
 import pandas as pd
 from ipfn import ipfn
 
 from attributes.marginal_data_reader import read_marginal_data
+from data_tools.datasources import processed_path
+from data_tools.prefetch import Datasource
 from data_tools.static_mappings import specific_to_grouped_attained_education_map
+from data_tools.type_table import population_to_contingency
 from gensynthpop.evaluation.validation import validate_fitted_distribution
-from gensynthpop.utils.extractors import synthetic_population_to_contingency
+
+joint_education_attainment_datasource = Datasource(processed_path(__file__, 'prepared_absolved_education.pkl'),
+                                                   pd.read_pickle)
+
+datasources = [joint_education_attainment_datasource]
 
 
 def read_joint_education_attainment() -> pd.DataFrame:
@@ -19,8 +27,7 @@ def read_joint_education_attainment() -> pd.DataFrame:
     Returns:
 
     """
-    data_path = os.path.join(os.path.dirname(__file__), "processed/prepared_absolved_education.pkl")
-    df = pd.read_pickle(data_path).rename(columns={'age': 'education_attainment_age_group'})
+    df = joint_education_attainment_datasource.read().rename(columns={'age': 'education_attainment_age_group'})
     return df
 
 
@@ -43,31 +50,67 @@ def add_3_categories_education_level(df_synth_pop: pd.DataFrame) -> pd.DataFrame
     return df_synth_pop
 
 
-def get_education_attainment_margins():
+def impute_missing_margins(df_counts: pd.DataFrame, s_population: pd.Series) -> pd.DataFrame:
+    """
+    Completes the margins of the neighborhoods in which CBS suppressed some of the counts, and scales the margins of
+    every neighborhood to its population:
+        - the counts of a neighborhood with a missing count are replaced by the mean relative frequencies of the
+          categories over the neighborhoods of which the counts are known
+        - the counts of each neighborhood are then scaled to add up to its population
+
+    Args:
+        df_counts: Counts indexed by neighborhood, with a column per category. Missing counts are NaN
+        s_population: Population indexed by neighborhood
+
+    Returns:
+        The scaled counts, like `df_counts`
+    """
+    counts = df_counts.to_numpy(dtype=float, na_value=np.nan)
+    population = pd.to_numeric(s_population.reindex(df_counts.index), errors='coerce').to_numpy(dtype=float)
+
+    frequencies = np.nanmean(counts, axis=0)
+    frequencies /= frequencies.sum()
+
+    missing = np.isnan(counts).any(axis=1)
+    counts[missing] = frequencies[np.newaxis, :] * population[missing, np.newaxis]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        counts = counts / counts.sum(axis=1, keepdims=True) * population[:, np.newaxis]
+
+    return pd.DataFrame(counts, index=df_counts.index, columns=df_counts.columns)
+
+
+@functools.lru_cache(maxsize=None)
+def _get_education_attainment_margins() -> pd.DataFrame:
     margins = read_marginal_data(['education_absolved_low', 'education_absolved_middle', 'education_absolved_high'],
                                  'absolved_edu_3_cats')
-    margins.loc[:, 'count'] = pd.to_numeric(margins['count'], errors='coerce').astype('Int64')
-    margins.loc[:, 'absolved_edu_3_cats'] = margins.absolved_edu_3_cats.str.replace('education_absolved_', '')
+    margins['count'] = pd.to_numeric(margins['count'], errors='coerce')
+    margins['absolved_edu_3_cats'] = margins.absolved_edu_3_cats.str.replace('education_absolved_', '')
+
+    df_counts = margins.pivot(index='neighb_code', columns='absolved_edu_3_cats', values='count')
+    neighborhood_totals = read_marginal_data(['population'], 'population')
+    df_counts = impute_missing_margins(df_counts, neighborhood_totals.population)
+    # One count per neighborhood and category, including the NaN counts of neighborhoods without a population
+    s_counts = pd.Series(df_counts.to_numpy().ravel(),
+                         index=pd.MultiIndex.from_product([df_counts.index, df_counts.columns]))
 
-    # Calculate relative frequencies of neighborhoods that are not NAN
-    s_totals = margins.groupby('absolved_edu_3_cats')['count'].mean()
-    s_totals /= s_totals.sum()
+    # In the order of the margins
+    margins['count'] = s_counts.reindex(pd.MultiIndex.from_frame(margins[['neighb_code', 'absolved_edu_3_cats']])
+                                        ).to_numpy()
 
-    # Find missing neighborhoods
-    missing = margins[margins["count"].isna()].neighb_code.unique()
+    return margins[["neighb_code", "absolved_edu_3_cats", "count"]].reset_index(drop=True)
 
-    # Correct missing neighborhoods
-    margins = margins.set_index('absolved_edu_3_cats')
-    neighborhood_totals = read_marginal_data(['population'], 'population')
-    for neighb_code in missing:
-        margins.loc[margins.neighb_code == neighb_code, 'count'] = s_totals * neighborhood_totals.loc[neighb_code][
-            'population']
 
-    margins = margins.reset_index().merge(neighborhood_totals, left_on='neighb_code', right_index=True,
-                                          how='left').set_index(['neighb_code', 'absolved_edu_3_cats'])
-    margins.loc[:, 'count'] = margins.groupby(level=0)["count"].transform(lambda x: x / x.sum()) * margins.population
+def get_education_attainment_margins() -> pd.DataFrame:
+    """
+    The number of people of each education attainment level (low, middle, high) in each neighborhood, completed where
+    CBS suppressed them, and scaled to the population of the neighborhood (see `impute_missing_margins`). The margins
+    are computed once per run.
 
-    return margins.reset_index()[["neighb_code", "absolved_edu_3_cats", "count"]]
+    Returns:
+        Data frame with the columns `neighb_code`, `absolved_edu_3_cats` and `count`
+    """
+    return _get_education_attainment_margins().copy()
 
 
 def fit_joint_absolved_education(df_synth_pop: pd.DataFrame) -> pd.DataFrame:
@@ -83,15 +126,15 @@ def fit_joint_absolved_education(df_synth_pop: pd.DataFrame) -> pd.DataFrame:
              'absolved_education']).sum().reset_index()
 
     # Single
-    margins_gender = synthetic_population_to_contingency(df_synth_pop, ["gender"])[
+    margins_gender = population_to_contingency(df_synth_pop, ["gender"])[
         "count"].astype(float)
-    margins_age_group = synthetic_population_to_contingency(df_synth_pop, ["education_attainment_age_group"])[
+    margins_age_group = population_to_contingency(df_synth_pop, ["education_attainment_age_group"])[
         "count"].astype(float)
     margins_education_attainment = get_education_attainment_margins().groupby(['absolved_edu_3_cats']).sum()[
         "count"].astype(float)
 
     # Double
-    margins_gender_age = synthetic_population_to_contingency(
+    margins_gender_age = population_to_contingency(
             df_synth_pop, ["gender", "education_attainment_age_group"], full_crostab=True)["count"].astype(float)
 
     margins = {
@@ -141,13 +184,13 @@ def remove_missing_values(df_contingency, margins):
     for m in margins:
         if len(m) != 1:
             continue
-        not_in_synth_pop = [v for v in df_contingency[m[0]].unique() if v not in margins[m].index.unique()]
+        missing = ~df_contingency[m[0]].isin(margins[m].index)
+        not_in_synth_pop = list(df_contingency.loc[missing, m[0]].unique())
         if not_in_synth_pop:
             print(
                     f"The following values from the margin {m} are not present in the synthetic population, "
                     f"and will be "
                     f"removed from the contingency data frame:")
             print("\t", not_in_synth_pop)
-            for nisp in not_in_synth_pop:
-                mask |= df_contingency[m[0]] == nisp
+            mask |= missing
     return df_contingency.loc[~mask]
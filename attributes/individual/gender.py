@@ -1,11 +1,15 @@
-import os
-
 import pandas as pd
 from ipfn import ipfn
 
 from attributes.marginal_data_reader import age_groups, read_marginal_data
+from data_tools.datasources import datasource_path
+from data_tools.prefetch import Datasource
 from gensynthpop.evaluation.validation import validate_fitted_distribution
 
+joint_age_gender_datasource = Datasource(datasource_path('individual', 'gender', 'gender_age-03759NED-formatted.csv'))
+
+datasources = [joint_age_gender_datasource]
+
 
 def _read_joint_age_gender() -> pd.DataFrame:
     """
@@ -17,11 +21,7 @@ def _read_joint_age_gender() -> pd.DataFrame:
     Returns:
 
     """
-    data_path = os.path.join(
-            os.path.dirname(__file__),
-            '../../datasources/individual/gender/gender_age-03759NED-formatted.csv'
-    )
-    df = pd.read_csv(data_path)
+    df = joint_age_gender_datasource.read()
     df = pd.melt(df, id_vars=["age_group"], value_vars=["male", "female"], var_name="gender", value_name="count")
     df.age_group = df.age_group.transform(
             lambda x: "65+" if x == "age_over65" else x.replace("age_", "").replace("_", "-")
@@ -1,13 +1,25 @@
-import os
-
 import pandas as pd
 from ipfn import ipfn
 
 from attributes.marginal_data_reader import read_marginal_data
-from data_tools.dynamic_mappers import cbs_age_group_rename_transform
+from data_tools.cbs_parsing import cbs_age_labels
+from data_tools.datasources import datasource_path, processed_path
+from data_tools.prefetch import Datasource
 from data_tools.static_mappings import household_data_code_map
+from data_tools.type_table import population_to_contingency
 from gensynthpop.evaluation.validation import validate_fitted_distribution
-from gensynthpop.utils.extractors import synthetic_population_to_contingency
+
+household_position_datasource = Datasource(
+        datasource_path("individual", "household_position", "Huishoudens__personen__regio_26122023_151215.csv"),
+        options=dict(sep=';'))
+local_household_composition_datasource = Datasource(
+        datasource_path("individual", "household_position", "Huishoudens__samenstelling__regio_25052024_174751.csv"),
+        options=dict(sep=';'))
+households_with_position_datasource = Datasource(
+        processed_path(__file__, 'df_households_with_position_and_children.pkl'), pd.read_pickle)
+
+# Read by the household position stage (see `data_tools.prefetch`). The other datasources are only read by the notebooks
+datasources = [households_with_position_datasource]
 
 
 def get_household_position_joint_age_gender() -> pd.DataFrame():
@@ -42,15 +54,10 @@ def read_household_data(*columns: str) -> pd.DataFrame:
     Returns:
 
     """
-    data_path = os.path.join(
-            os.path.dirname(__file__),
-            "../../../datasources/individual/household_position/Huishoudens__personen__regio_26122023_151215.csv"
-    )
-
-    df = pd.read_csv(data_path, sep=";")
+    df = household_position_datasource.read()
 
     df.rename(columns=household_data_code_map, inplace=True)
-    df.age_group = df.age_group.transform(cbs_age_group_rename_transform)
+    df.age_group = cbs_age_labels(df.age_group)
     df.replace({"Mannen": "male", "Vrouwen": "female"}, inplace=True)
     df.drop(["region", "period"], axis=1, inplace=True)
     df.fillna(0, inplace=True)
@@ -95,11 +102,7 @@ def read_local_household_composition() -> pd.DataFrame:
     Returns:
 
     """
-    data_path = os.path.join(
-            os.path.dirname(__file__),
-            "../../../datasources/individual/household_position/Huishoudens__samenstelling__regio_25052024_174751.csv"
-    )
-    df = pd.read_csv(data_path, sep=';').drop(['Perioden', "Regio's"], axis=1)
+    df = local_household_composition_datasource.read().drop(['Perioden', "Regio's"], axis=1)
     df.rename(columns={
         'Leeftijd referentiepersoon': 'reference_person_age',
         'Particuliere huishoudens: samenstelling/Eenpersoonshuishouden (aantal)': 'single',
@@ -158,11 +161,10 @@ def read_households_margins():
 
 
 def fit_household_position_joint_age_gender(df_synth_pop: pd.DataFrame) -> pd.DataFrame():
-    df = pd.read_pickle(os.path.join(
-            os.path.dirname(__file__), 'processed/df_households_with_position_and_children.pkl'))
+    df = households_with_position_datasource.read()
     df = df.rename(columns={"age_group": "small_age_group"}).astype({"count": float})
     margins_gender = read_marginal_data(['male', 'female'], 'gender').groupby('gender')['count'].sum()
-    margins_age_group_gender = synthetic_population_to_contingency(df_synth_pop, ["gender", "small_age_group"], True)
+    margins_age_group_gender = population_to_contingency(df_synth_pop, ["gender", "small_age_group"], True)
     margins_age_group = margins_age_group_gender.reset_index().groupby("small_age_group")["count"].sum()
     margins_age_group_gender = margins_age_group_gender["count"]
     margins_households = read_households_margins().groupby('household_type')['count'].sum()
@@ -1,27 +1,29 @@
-import os.path
-
 import pandas as pd
 from ipfn import ipfn
 
 from attributes.marginal_data_reader import age_groups, read_marginal_data
+from data_tools.cbs_parsing import cbs_integer_ages, map_categories, read_cbs_csv
+from data_tools.datasources import datasource_path
+from data_tools.prefetch import Datasource
 from gensynthpop.evaluation.validation import validate_fitted_distribution
 from gensynthpop.utils.extractors import age_to_age_group
 
+integer_age_datasource = Datasource(datasource_path('individual', 'integer_age', 'Leeftijdsopbouw Nederland 2019.csv'),
+                                    read_cbs_csv, dict(thousands=" ", numeric_columns=["Mannen", "Vrouwen"]))
+
+datasources = [integer_age_datasource]
+
 
 def read_df_integer_age() -> pd.DataFrame:
-    data_file = os.path.join(
-            os.path.dirname(__file__),
-            '../../datasources/individual/integer_age/Leeftijdsopbouw Nederland 2019.csv',
-    )
-    df_integer_age = pd.read_csv(data_file, sep=";")
+    df_integer_age = integer_age_datasource.read()
     df_integer_age.loc[0, "Leeftijd"] = "105 jaar"
-    df_integer_age["Leeftijd"] = df_integer_age.Leeftijd.transform(lambda x: int(x.replace(" jaar", "")))
+    df_integer_age["Leeftijd"] = cbs_integer_ages(df_integer_age.Leeftijd)
     df_integer_age.rename(columns={"Mannen": "male", "Vrouwen": "female", "Leeftijd": "age"}, inplace=True)
-    df_integer_age["male"] = df_integer_age.male.transform(lambda x: int(x.replace(" ", "")))
-    df_integer_age["female"] = df_integer_age.female.transform(lambda x: int(x.replace(" ", "")))
+    df_integer_age = df_integer_age.astype({"male": int, "female": int})
     df_integer_age = df_integer_age.melt(id_vars="age", value_vars=["male", "female"], var_name="gender",
                                          value_name="count")
-    df_integer_age["age_group"] = df_integer_age.age.transform(lambda age: age_to_age_group(age, age_groups))
+    df_integer_age["age_group"] = map_categories(
+            df_integer_age.age, lambda ages: [age_to_age_group(age, age_groups) for age in ages])
     df_integer_age = df_integer_age[["age_group", "gender", "age", "count"]]
     return df_integer_age
 
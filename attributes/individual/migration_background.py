@@ -1,13 +1,19 @@
-import os.path
-
 import numpy as np
 import pandas as pd
 from ipfn import ipfn
 
 from attributes.marginal_data_reader import read_marginal_data
-from data_tools.dynamic_mappers import cbs_age_group_rename_transform
+from data_tools.cbs_parsing import cbs_age_labels
+from data_tools.datasources import datasource_path
+from data_tools.prefetch import Datasource
+from data_tools.type_table import population_to_contingency
 from gensynthpop.evaluation.validation import validate_fitted_distribution
-from gensynthpop.utils.extractors import synthetic_population_to_contingency
+
+migration_background_datasource = Datasource(
+        datasource_path('individual', 'migration_background',
+                        'Bev__migratieachtergr__regio__2010_2022_29122023_115517.csv'), options=dict(sep=';'))
+
+datasources = [migration_background_datasource]
 
 
 def read_df_migration_background_joint() -> pd.DataFrame:
@@ -32,12 +38,7 @@ def read_df_migration_background_joint() -> pd.DataFrame:
     Returns:
 
     """
-    data_file = os.path.join(
-            os.path.dirname(__file__),
-            '../../datasources/individual/migration_background'
-            '/Bev__migratieachtergr__regio__2010_2022_29122023_115517.csv'
-    )
-    df_migration_joint = pd.read_csv(data_file, sep=";")[
+    df_migration_joint = migration_background_datasource.read()[
         ["Geslacht", "Leeftijd", "Migratieachtergrond", "Bevolking op 1 januari (aantal)"]]
 
     df_migration_joint.rename(
@@ -53,7 +54,7 @@ def read_df_migration_background_joint() -> pd.DataFrame:
         "Niet-westerse migratieachtergrond": "NonWestern"
     }, inplace=True)
 
-    df_migration_joint["small_age_group"] = df_migration_joint.small_age_group.transform(cbs_age_group_rename_transform)
+    df_migration_joint["small_age_group"] = cbs_age_labels(df_migration_joint.small_age_group)
 
     return df_migration_joint
 
@@ -107,8 +108,8 @@ def fit_df_migration_background(df_synth_pop: pd.DataFrame) -> pd.DataFrame:
     df_migration_joint = read_df_migration_background_joint()
 
     margins_gender = read_marginal_data(['male', 'female'], 'gender').groupby(['gender']).sum()["count"]
-    margins_age_group = synthetic_population_to_contingency(df_synth_pop, ["small_age_group"])["count"]
-    margins_gender_age = synthetic_population_to_contingency(df_synth_pop, ["gender", "small_age_group"])["count"]
+    margins_age_group = population_to_contingency(df_synth_pop, ["small_age_group"])["count"]
+    margins_gender_age = population_to_contingency(df_synth_pop, ["gender", "small_age_group"])["count"]
     margins_migration_background = read_df_migration_background_marginal().groupby(
             'migration_background'
     )["count"].sum()
@@ -1,9 +1,11 @@
-import os
 import re
-from typing import List
+from typing import List, Optional
 
+import numpy as np
 import pandas as pd
 
+from data_tools.datasources import datasource_path, municipality_of, preview_fraction, selected_neighborhood_codes
+from data_tools.prefetch import Datasource
 from gensynthpop.utils.extractors import multicolumn_to_attribute_values
 
 
@@ -17,30 +19,110 @@ def read_marginal_data(columns: List[str], attribute_name: str) -> pd.DataFrame:
     Returns:
 
     """
-    margins_path = os.path.join(os.path.dirname(__file__),
-                                '../datasources/marginal/marginal_distributions_84583NED.csv')
-    df_marginal = pd.read_csv(margins_path, sep=";")
+    df_marginal = marginal_datasource.read()
     column_names = [original for original, renamed in marginal_data_code_map.items() if renamed in columns]
     if 'Codering_3' not in column_names:
         column_names.append('Codering_3')
     df_marginal = df_marginal[column_names]
     df_marginal = df_marginal.rename(columns=marginal_data_code_map)
     df_marginal = df_marginal[df_marginal.neighb_code.isin(neighborhood_codes)]
+    if preview_fraction() is not None:
+        df_marginal = scale_margins(df_marginal, columns, preview_fraction())
     if len(columns) > 1:
         return multicolumn_to_attribute_values(df_marginal, attribute_name, columns)
     else:
         return df_marginal.set_index('neighb_code')
 
 
+def read_municipality_neighborhood_codes(municipalities: Optional[List[str]] = None) -> List[str]:
+    """
+    The codes of all neighborhoods of `municipalities` in the core marginal dataset, which covers the whole country
+
+    Args:
+        municipalities: CBS municipality codes, e.g., ['GM0518', 'GM0363']. Defaults to all municipalities
+
+    Returns:
+
+    """
+    codes = pd.read_csv(marginal_datasource.path, sep=";", usecols=['Codering_3'])['Codering_3'].astype(str).str.strip()
+    codes = codes[codes.str.match(r'BU\d{8}$')]
+    if municipalities is not None:
+        codes = codes[codes.map(municipality_of).isin(municipalities)]
+    return sorted(codes.unique())
+
+
+def scale_margins(df_marginal: pd.DataFrame, columns: List[str], fraction: float) -> pd.DataFrame:
+    """
+    Scales the counts in `columns` of each neighborhood by `fraction`, as used by the preview mode. The scaled counts of
+    a neighborhood are rounded with the largest remainder method: each count is rounded down or up, such that the
+    counts of the neighborhood add up to its rounded scaled total. Margins that add up to the population of a
+    neighborhood (e.g., the age groups) therefore add up to its scaled population as well.
+
+    Counts of different margins (see `scaled_margin_of`), such as the population and the number of households of each
+    type, are rounded separately, so no person is rounded into a household or the other way around.
+
+    Suppressed counts (e.g., '.') are left as they are.
+
+    Args:
+        df_marginal:
+        columns:
+        fraction:
+
+    Returns:
+
+    """
+    df_marginal = df_marginal.copy()
+    for margin in dict.fromkeys(scaled_margin_of(column) for column in columns):
+        margin_columns = [column for column in columns if scaled_margin_of(column) == margin]
+        df_counts = df_marginal[margin_columns].apply(pd.to_numeric, errors='coerce')
+        rounded = _round_largest_remainder(df_counts.fillna(0).to_numpy(dtype=float) * fraction)
+
+        for i, column in enumerate(margin_columns):
+            numeric = df_counts[column].notna()
+            df_marginal[column] = df_marginal[column].where(~numeric, pd.Series(rounded[:, i].astype(int),
+                                                                                index=df_marginal.index))
+    return df_marginal
+
+
+def scaled_margin_of(column: str) -> str:
+    """
+    The margin a column of the core marginal dataset belongs to, when it is scaled (see `scale_margins`): the totals of
+    persons and of households are margins of their own, the household types are one margin, and all other columns
+    count persons of a category (e.g., an age group)
+
+    Args:
+        column: Renamed column (see `marginal_data_code_map`)
+
+    Returns:
+
+    """
+    if column in ['population', 'households']:
+        return column
+    if column in household_type_columns:
+        return 'household_types'
+    return 'persons'
+
+
+def _round_largest_remainder(scaled: np.ndarray) -> np.ndarray:
+    rounded = np.floor(scaled)
+
+    totals = np.floor(scaled.sum(axis=1) + 0.5)
+    remainders = (totals - rounded.sum(axis=1)).astype(int)
+
+    # Round up the counts with the largest remainders, until each neighborhood reaches its total
+    order = np.argsort(rounded - scaled, axis=1, kind='stable')
+    ranks = np.empty_like(order)
+    np.put_along_axis(ranks, order, np.arange(scaled.shape[1])[np.newaxis, :].repeat(len(order), axis=0), axis=1)
+    return rounded + (ranks < remainders[:, np.newaxis])
+
+
 def read_province_population_size():
     """
     Read from https://opendata.cbs.nl/#/CBS/nl/dataset/70072ned/table?dl=A6290
 
     Returns:
     """
-    path = os.path.join(os.path.dirname(__file__),
-                        '../datasources/marginal/Regionale_kerncijfers_Nederland_19052024_185018.csv')
-    df = pd.read_csv(path, sep=";")
+    df = province_population_datasource.read()
     df = df.rename(columns={
                                c: re.sub(
                                        r'Bevolking/Bevolkingssamenstelling op 1 januari/Leeftijd/Leeftijdsgroepen/('
@@ -64,10 +146,20 @@ def read_province_population_size():
     return df
 
 
-# These are the neighborhoods that we want to include
-neighborhood_codes = pd.Series(
+# These are the neighborhoods that we want to include. They can be replaced with the environment variable
+# SYNTHPOP_NEIGHBORHOODS (see `data_tools.datasources.selected_neighborhood_codes`)
+neighborhood_codes = pd.Series(selected_neighborhood_codes(
         ["BU05181785", "BU05183284", "BU05183387", "BU05183396", "BU05183398", "BU05183399", "BU05183480", "BU05183488",
-         "BU05183489", "BU05183536", "BU05183620", "BU05183637", "BU05183638", "BU05183639"], name="neighb_code")
+         "BU05183489", "BU05183536", "BU05183620", "BU05183637", "BU05183638", "BU05183639"]), name="neighb_code")
+
+marginal_datasource = Datasource(datasource_path('marginal', 'marginal_distributions_84583NED.csv'),
+                                 options=dict(sep=';'))
+province_population_datasource = Datasource(
+        datasource_path('marginal', 'Regionale_kerncijfers_Nederland_19052024_185018.csv'), options=dict(sep=';'))
+
+# Read by the stages that use this module (see `data_tools.prefetch`). The province population size is only read by the
+# driver license stage, which lists it itself
+datasources = [marginal_datasource]
 
 age_groups = ['0-15', '15-25', '25-45', '45-65', '65+']
 
@@ -95,3 +187,6 @@ marginal_data_code_map = {
     'HuishoudensZonderKinderen_30': 'without_children',
     'HuishoudensMetKinderen_31': 'with_children'
 }
+
+# Columns of the core marginal dataset that count households rather than persons
+household_type_columns = ['single_person', 'without_children', 'with_children']
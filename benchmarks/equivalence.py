@@ -0,0 +1,401 @@
+import argparse
+import importlib
+import os
+import sys
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from benchmarks.fixtures import Fixtures, write_fixtures
+from benchmarks.harness import (benchmark_directory, benchmark_scale, call_stage, run_directory_for, stage_outputs,
+                                stages)
+from data_tools.stage_registry import StageEntry
+from reporting.metrics import comparison_tuples, score_comparison_tuples
+
+equivalence_report_directory = os.path.join(benchmark_directory, 'equivalence')
+
+equivalence_report_columns = [
+    'kind', 'case', 'comparison', 'cells', 'statistic', 'p_value', 'srmse_reference', 'srmse_candidate', 'equivalent'
+]
+
+
+@dataclass(frozen=True)
+class FitCase:
+    """
+    A deterministic fit, i.e., the function `function` ('module:function'), called with the synthetic population
+    (`input` 'individuals') or households (`input` 'households') the pipeline passes to `stage`, or without arguments
+    (`input` None)
+    """
+    name: str
+    function: str
+    stage: str
+    input: Optional[str] = 'individuals'
+
+
+fit_cases = [
+    FitCase('fit_joint_age_gender', 'attributes.individual.gender:fit_joint_age_gender', 'add_gender_conditionally',
+            None),
+    FitCase('fit_df_integer_age', 'attributes.individual.integer_age:fit_df_integer_age',
+            'add_integer_age_conditionally', None),
+    FitCase('fit_df_migration_background', 'attributes.individual.migration_background:fit_df_migration_background',
+            'add_migration_background'),
+    FitCase('fit_joint_absolved_education',
+            'attributes.individual.education.education_attainment:fit_joint_absolved_education',
+            'add_absolved_education'),
+    FitCase('fit_joint_current_education',
+            'attributes.individual.education.current_education:fit_joint_current_education', 'add_current_education'),
+    FitCase('get_and_fit_joint_driver_license',
+            'attributes.individual.drivers_license:get_and_fit_joint_driver_license', 'add_drivers_licenses'),
+    FitCase('fit_household_position_joint_age_gender',
+            'attributes.individual.household_position.household_position:fit_household_position_joint_age_gender',
+            'add_household_position'),
+    FitCase('fit_joint_household_income', 'attributes.household.household_income:fit_joint_household_income',
+            'add_household_income', 'households'),
+]
+
+# The score rows (see `reporting.reporting`) that validate the result of each stochastic stage, and whether they are
+# computed for the synthetic population or the households
+stage_score_rows: Dict[str, Tuple[str, List[str]]] = {
+    'add_age_group': ('individuals', ['reporting.reporting:score_table_age_group']),
+    'add_gender_conditionally': ('individuals', ['reporting.reporting:score_table_gender']),
+    'add_integer_age_conditionally': ('individuals', ['reporting.reporting:score_table_integer_age']),
+    'add_migration_background': ('individuals', ['reporting.reporting:score_table_migration_background']),
+    'add_absolved_education': ('individuals', ['reporting.reporting:score_absolved_education']),
+    'add_current_education': ('individuals', ['reporting.reporting:score_current_eduction']),
+    'add_drivers_licenses': ('individuals', ['reporting.reporting:score_car_drivers_license',
+                                             'reporting.reporting:score_motor_cycle_drivers_license',
+                                             'reporting.reporting:score_moped_drivers_license']),
+    'add_household_position': ('individuals', ['reporting.reporting:score_table_household_position']),
+    'partition_households': ('individuals', ['reporting.reporting:score_table_household_position']),
+    'correct_household_assignment': ('individuals', ['reporting.reporting:score_table_household_position']),
+    'create_3_type_household_labels': ('households', ['reporting.household_reporting:score_3_type_households']),
+    'reassign_individual_household_position': ('individuals',
+                                               ['reporting.reporting:score_table_household_position']),
+    'add_postal_code': ('households', ['reporting.household_reporting:score_postal_code']),
+    'add_household_income': ('households', ['reporting.household_reporting:score_income_group']),
+    'add_car_ownership': ('households', ['reporting.household_reporting:score_car_ownership']),
+    'add_motorcycle_ownership': ('households', ['reporting.household_reporting:score_motor_cycle_ownership']),
+}
+
+
+def compare_joints(df_reference: pd.DataFrame, df_candidate: pd.DataFrame, relative_tolerance: float = 1e-6,
+                   absolute_tolerance: float = 1e-6) -> pd.DataFrame:
+    """
+    Compares two fitted joint distributions cell by cell. Cells are identified by the values of all non-float columns
+    (and the named index levels), and every float column (e.g., count) is compared. A cell that only occurs in one of
+    the joints counts as 0 in the other.
+
+    Args:
+        df_reference:
+        df_candidate:
+        relative_tolerance: Allowed difference, relative to the reference value
+        absolute_tolerance: Allowed difference, regardless of the reference value
+
+    Returns:
+        Data frame with one row per cell and compared column, with the reference and candidate value, their absolute
+        difference, and whether it is within tolerance
+    """
+    df_reference, df_candidate = _with_named_index_as_columns(df_reference), _with_named_index_as_columns(df_candidate)
+    value_columns = [column for column in df_reference.columns if pd.api.types.is_float_dtype(df_reference[column])]
+    key_columns = [column for column in df_reference.columns if column not in value_columns]
+    assert sorted(df_reference.columns) == sorted(df_candidate.columns), \
+        f"Reference has columns {list(df_reference.columns)}, candidate has columns {list(df_candidate.columns)}"
+
+    reference = df_reference.groupby(key_columns, dropna=False)[value_columns].sum() if key_columns \
+        else df_reference[value_columns]
+    candidate = df_candidate.groupby(key_columns, dropna=False)[value_columns].sum() if key_columns \
+        else df_candidate[value_columns]
+    reference, candidate = reference.align(candidate, join='outer', fill_value=0.)
+
+    df_cells = pd.concat({
+        'reference': reference.stack(),
+        'candidate': candidate.astype(float).stack(),
+    }, axis=1)
+    df_cells.index = df_cells.index.set_names('column', level=-1)
+    df_cells['difference'] = (df_cells.candidate - df_cells.reference).abs()
+    df_cells['within_tolerance'] = \
+        df_cells.difference <= absolute_tolerance + relative_tolerance * df_cells.reference.abs()
+    return df_cells.reset_index()
+
+
+def compare_populations(df_reference: pd.DataFrame, df_candidate: pd.DataFrame, rows: Sequence[Callable],
+                        alpha: float = 0.001) -> pd.DataFrame:
+    """
+    Compares two synthetic populations (or households) created by stochastic stages through the contingency tables of
+    the score rows that validate them. For each comparison tuple, the observed tables of both populations are tested
+    for homogeneity with Pearson's chi-squared test, and the fit of both populations to the expected (CBS) tables is
+    reported (see `reporting.metrics.score_comparison_tuples`).
+
+    Args:
+        df_reference:
+        df_candidate:
+        rows: Score rows, e.g., `reporting.reporting.score_table_gender`
+        alpha: The populations are considered equivalent in a table when the p-value is at least `alpha`
+
+    Returns:
+        Data frame with one row per comparison tuple
+    """
+    reference_tuples, row_names = comparison_tuples(df_reference, rows)
+    candidate_tuples, _ = comparison_tuples(df_candidate, rows)
+    df_reference_scores = score_comparison_tuples(reference_tuples)
+    df_candidate_scores = score_comparison_tuples(candidate_tuples)
+
+    records = list()
+    for i, (reference_tuple, candidate_tuple) in enumerate(zip(reference_tuples, candidate_tuples)):
+        statistic, p_value, cells = _homogeneity_test(reference_tuple[0], candidate_tuple[0])
+        records.append(dict(
+                row=row_names[i],
+                dimension=reference_tuple[2],
+                condition=reference_tuple[3],
+                cells=cells,
+                statistic=statistic,
+                p_value=p_value,
+                srmse_reference=df_reference_scores.srmse[i],
+                srmse_candidate=df_candidate_scores.srmse[i],
+                equivalent=p_value >= alpha,
+        ))
+
+    return pd.DataFrame(records)
+
+
+def run_fit_case(case: FitCase, candidate: Optional[str] = None, n_agents: int = 10_000,
+                 n_neighborhoods: Optional[int] = None, seed: int = 0, relative_tolerance: float = 1e-6,
+                 absolute_tolerance: float = 1e-6) -> pd.DataFrame:
+    """
+    Runs the reference fit of `case` and `candidate` on the same input, and compares the fitted joints (see
+    `compare_joints`). Without a candidate, the reference is compared with a second run of itself, which checks that
+    the fit is deterministic.
+
+    Has to run in a process that did not import the attribute modules yet, as the fixtures are selected through
+    environment variables that are read on import (see `data_tools.datasources`).
+
+    Args:
+        case:
+        candidate: Function with the same signature as the reference, as 'module:function'
+        n_agents: Scale of the fixtures
+        n_neighborhoods:
+        seed: Seed of the fixtures
+        relative_tolerance:
+        absolute_tolerance:
+
+    Returns:
+        The cells of the comparison
+    """
+    fixtures = _use_fixtures(n_agents, n_neighborhoods, seed)
+    arguments = []
+    if case.input is not None:
+        df_synth_pop, df_synth_households = _stage_inputs(_stage(case.stage), fixtures, seed)
+        arguments = [df_synth_pop if case.input == 'individuals' else df_synth_households]
+
+    df_reference = _resolve(case.function)(*[argument.copy() for argument in arguments])
+    df_candidate = _resolve(candidate or case.function)(*[argument.copy() for argument in arguments])
+    return compare_joints(df_reference, df_candidate, relative_tolerance, absolute_tolerance)
+
+
+def run_stage_case(stage_name: str, candidate: Optional[str] = None, n_agents: int = 10_000,
+                   n_neighborhoods: Optional[int] = None, seed: int = 0, alpha: float = 0.001) -> pd.DataFrame:
+    """
+    Runs the reference implementation of a stochastic stage and `candidate` on the same input, and compares the
+    results through the score rows of `stage_score_rows` (see `compare_populations`). Without a candidate, the
+    reference is compared with a run of itself with another random seed.
+
+    Like `run_fit_case`, this has to run in a process that did not import the attribute modules yet.
+
+    Args:
+        stage_name:
+        candidate: Function with the same signature as the stage function, as 'module:function'
+        n_agents: Scale of the fixtures
+        n_neighborhoods:
+        seed: Seed of the fixtures, and of the random state of the reference run. The candidate runs with `seed + 1`
+        alpha:
+
+    Returns:
+        The comparison per comparison tuple
+    """
+    stage = _stage(stage_name)
+    df_synth_pop, df_synth_households = _stage_inputs(stage, _use_fixtures(n_agents, n_neighborhoods, seed), seed)
+    reference = stage.resolve()
+
+    results = list()
+    for run_seed, function in [(seed, reference), (seed + 1, _resolve(candidate) if candidate else reference)]:
+        np.random.seed(run_seed)
+        results.append(call_stage(stage, function, _copy(df_synth_pop), _copy(df_synth_households)))
+
+    frame, row_names = stage_score_rows[stage.function]
+    position = 0 if frame == 'individuals' else 1
+    return compare_populations(results[0][position], results[1][position], [_resolve(row) for row in row_names],
+                               alpha)
+
+
+def equivalence_summary(kind: str, case: str, df_comparison: pd.DataFrame) -> pd.DataFrame:
+    """
+    One line per compared column (fits) or comparison tuple (stages), in the columns `equivalence_report_columns`.
+    For fits, the statistic is the largest absolute difference of a cell; for stages, it is the chi-squared statistic,
+    and the SRMSE of both populations against the expected tables is included.
+
+    Args:
+        kind: 'fit' or 'stage'
+        case: Name of the fit case or stage
+        df_comparison: As returned by `run_fit_case` or `run_stage_case`
+
+    Returns:
+
+    """
+    if kind == 'fit':
+        df_summary = df_comparison.groupby('column').agg(
+                cells=('difference', 'size'),
+                statistic=('difference', 'max'),
+                equivalent=('within_tolerance', 'all'),
+        ).reset_index().rename(columns={'column': 'comparison'})
+        df_summary[['p_value', 'srmse_reference', 'srmse_candidate']] = np.nan
+    else:
+        df_summary = df_comparison.assign(comparison=[
+            f'{dimension} by {condition}' if condition else dimension
+            for dimension, condition in zip(df_comparison.dimension, df_comparison.condition)
+        ])
+
+    return df_summary.assign(kind=kind, case=case)[equivalence_report_columns]
+
+
+def render_equivalence_report(df_report: pd.DataFrame) -> str:
+    """
+    Formats an equivalence report as a Markdown table
+
+    Args:
+        df_report: Concatenated results of `equivalence_summary`
+
+    Returns:
+
+    """
+    lines = [
+        '| Kind | Case | Comparison | Cells | Statistic | p-value | SRMSE reference | SRMSE candidate | Equivalent |',
+        '|---|---|---|--:|--:|--:|--:|--:|---|',
+    ]
+    for _, row in df_report.iterrows():
+        lines.append('| ' + ' | '.join([
+            row.kind,
+            row.case,
+            row.comparison,
+            f'{row.cells:,}',
+            f'{row.statistic:.3g}',
+            *['--' if not np.isfinite(value) else f'{value:.3f}'
+              for value in [row.p_value, row.srmse_reference, row.srmse_candidate]],
+            'yes' if row.equivalent else '**no**',
+        ]) + ' |')
+
+    return '\n'.join(lines) + '\n'
+
+
+def _homogeneity_test(df_reference_observed: pd.DataFrame, df_candidate_observed: pd.DataFrame
+                      ) -> Tuple[float, float, int]:
+    reference = _counts(df_reference_observed)
+    candidate = _counts(df_candidate_observed)
+    reference, candidate = reference.align(candidate, join='outer', fill_value=0.)
+    table = np.stack([reference.to_numpy(), candidate.to_numpy()])
+    table = table[:, table.sum(axis=0) > 0]
+
+    if table.shape[1] < 2 or (table.sum(axis=1) == 0).any():
+        return 0., 1., table.shape[1]
+    statistic, p_value, _, _ = stats.chi2_contingency(table, correction=False)
+    return float(statistic), float(p_value), table.shape[1]
+
+
+def _counts(frame: Any) -> pd.Series:
+    if isinstance(frame, pd.DataFrame):
+        frame = frame['count']
+    return frame.astype(float)
+
+
+def _with_named_index_as_columns(df: pd.DataFrame) -> pd.DataFrame:
+    return df.reset_index() if any(name is not None for name in df.index.names) else df
+
+
+def _stage(name: str) -> StageEntry:
+    matching = [stage for stage in stages if stage.function == name]
+    assert matching, f"Unknown stage {name}"
+    return matching[0]
+
+
+def _use_fixtures(n_agents: int, n_neighborhoods: Optional[int], seed: int) -> Fixtures:
+    # The attribute modules imported from here on read the fixtures
+    fixtures = write_fixtures(n_agents, n_neighborhoods, seed=seed)
+    os.environ.update(fixtures.environment())
+    return fixtures
+
+
+def _stage_inputs(stage: StageEntry, fixtures: Fixtures, seed: int
+                  ) -> Tuple[Optional[pd.DataFrame], Optional[pd.DataFrame]]:
+    """
+    The synthetic population and households that are passed to `stage`, i.e., the results of the stage before it on
+    `fixtures`. The stages before it are run with the benchmark harness if needed.
+    """
+    index = stages.index(stage)
+    if index == 0:
+        return None, None
+
+    paths = stage_outputs(run_directory_for(fixtures), stages[index - 1])
+    if not os.path.exists(paths[0]):
+        results = benchmark_scale(fixtures.n_agents, len(fixtures.neighb_codes), stages[:index], seed)
+        assert all(result['status'] == 'ok' for result in results), \
+            f"The stages before {stage.function} failed, see {results[-1]['log']}"
+
+    return tuple(pd.read_pickle(path) if os.path.exists(path) else None for path in paths)
+
+
+def _resolve(function: str) -> Callable:
+    module_name, name = function.split(':')
+    return getattr(importlib.import_module(module_name), name)
+
+
+def _copy(df: Optional[pd.DataFrame]) -> Optional[pd.DataFrame]:
+    return None if df is None else df.copy()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compares candidate implementations of fits and stages with the "
+                                                 "reference pipeline on the benchmark fixtures, and exits with status "
+                                                 "1 if any of them is not equivalent")
+    parser.add_argument('cases', nargs='*',
+                        help="Names of fit cases or stages to compare. Defaults to those with a candidate")
+    parser.add_argument('--candidate', action='append', default=list(), metavar='CASE=MODULE:FUNCTION',
+                        help="Candidate implementation of a fit case or stage")
+    parser.add_argument('--agents', type=int, default=10_000, help="Scale of the fixtures")
+    parser.add_argument('--neighborhoods', type=int)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--tolerance', type=float, default=1e-6,
+                        help="Allowed relative (and absolute) difference of the cells of the fitted joints")
+    parser.add_argument('--alpha', type=float, default=0.001, help="Significance level of the homogeneity tests")
+    parser.add_argument('--name', default='equivalence', help="Name of the report")
+    arguments = parser.parse_args()
+
+    candidates = dict(candidate.split('=', 1) for candidate in arguments.candidate)
+    selected_cases = arguments.cases or list(candidates)
+    if not selected_cases:
+        parser.error("Give the cases to compare, or at least one candidate")
+
+    fit_cases_by_name = {case.name: case for case in fit_cases}
+    summaries = list()
+    for case_name in selected_cases:
+        print(f"Comparing {case_name}")
+        if case_name in fit_cases_by_name:
+            summaries.append(equivalence_summary('fit', case_name, run_fit_case(
+                    fit_cases_by_name[case_name], candidates.get(case_name), arguments.agents, arguments.neighborhoods,
+                    arguments.seed, arguments.tolerance, arguments.tolerance)))
+        elif case_name in stage_score_rows:
+            summaries.append(equivalence_summary('stage', case_name, run_stage_case(
+                    case_name, candidates.get(case_name), arguments.agents, arguments.neighborhoods, arguments.seed,
+                    arguments.alpha)))
+        else:
+            parser.error(f"Unknown case {case_name}")
+
+    report = pd.concat(summaries, ignore_index=True)
+    os.makedirs(equivalence_report_directory, exist_ok=True)
+    report.to_csv(os.path.join(equivalence_report_directory, f'{arguments.name}.csv'), index=False)
+    with open(os.path.join(equivalence_report_directory, f'{arguments.name}.md'), 'w') as file:
+        file.write(render_equivalence_report(report))
+
+    print(render_equivalence_report(report))
+    sys.exit(0 if report.equivalent.all() else 1)
@@ -0,0 +1,465 @@
+import json
+import os
+import re
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from data_tools.datasources import (datasources_environment_variable, neighborhoods_environment_variable, output_path,
+                                    processed_environment_variable)
+from data_tools.static_mappings import (household_map, specific_to_grouped_attained_education_map,
+                                        specific_to_grouped_education_map)
+
+fixture_directory = output_path('benchmarks', 'fixtures')
+
+# The real population has about 3500 inhabitants per neighborhood
+default_agents_per_neighborhood = 3500
+
+# Relative size of each integer age in the fixtures, from 0 to 105 years. Ages over 100 get no inhabitants, because the
+# age groups of the education attributes end at 100
+_age_profile = np.concatenate([np.full(65, 1.), np.linspace(1., 0.05, 36), np.zeros(5)])
+
+_age_groups = {'0-15': (0, 15), '15-25': (15, 25), '25-45': (25, 45), '45-65': (45, 65), '65+': (65, 106)}
+
+_province_age_groups = ['Jonger dan 5 jaar', '5 tot 10 jaar', '10 tot 15 jaar', '15 tot 20 jaar', '20 tot 25 jaar',
+                        '25 tot 45 jaar', '45 tot 65 jaar', '65 tot 80 jaar', '80 jaar of ouder']
+
+# Fraction of the inhabitants of each license age with a car, moped and motor cycle license. Moped licenses include
+# those granted through a car license
+_license_fractions = {
+    '16 tot 18 jaar': (0.05, 0.35, 0.), '18 tot 20 jaar': (0.45, 0.55, 0.02), '20 tot 25 jaar': (0.6, 0.65, 0.05),
+    '25 tot 30 jaar': (0.7, 0.72, 0.08), '30 tot 40 jaar': (0.75, 0.77, 0.12), '40 tot 50 jaar': (0.78, 0.8, 0.15),
+    '50 tot 60 jaar': (0.78, 0.8, 0.18), '60 tot 65 jaar': (0.75, 0.77, 0.15), '65 tot 70 jaar': (0.7, 0.72, 0.12),
+    '70 tot 75 jaar': (0.6, 0.62, 0.08), '75 jaar of ouder': (0.35, 0.37, 0.03),
+}
+
+_license_categories = ['Autorijbewijs totaal', 'Bromfietsrijbewijs', 'Motorrijbewijs']
+
+_migration_backgrounds = {
+    'Nederlandse achtergrond': 0.45, 'Westerse migratieachtergrond': 0.18, 'Niet-westerse migratieachtergrond': 0.37
+}
+
+_household_sizes = ['Huishoudensgrootte: 1 persoon', 'Huishoudensgrootte: 2 personen', 'Huishoudensgrootte: 3 personen',
+                    'Huishoudensgrootte: 4 personen', 'Huishoudensgrootte: 5 of meer personen']
+
+
+@dataclass
+class Fixtures:
+    """
+    Location of a set of synthetic CBS-shaped datasources, written by `write_fixtures`
+
+    The readers of the attribute modules read the fixtures instead of the real data when the variables of
+    `environment` are set (see `data_tools.datasources`).
+    """
+    directory: str
+    neighb_codes: List[str]
+    n_agents: int
+    seed: int
+
+    @property
+    def datasources_directory(self) -> str:
+        return os.path.join(self.directory, 'datasources')
+
+    @property
+    def processed_directory(self) -> str:
+        return os.path.join(self.directory, 'processed')
+
+    def environment(self) -> Dict[str, str]:
+        """Environment variables that make the attribute modules read these fixtures"""
+        return {
+            datasources_environment_variable: os.path.abspath(self.datasources_directory),
+            processed_environment_variable: os.path.abspath(self.processed_directory),
+            neighborhoods_environment_variable: ','.join(self.neighb_codes),
+        }
+
+
+def neighborhood_codes_for(n_neighborhoods: int) -> List[str]:
+    """
+    CBS-shaped codes of `n_neighborhoods` fictional neighborhoods, e.g., BU05180000
+
+    Args:
+        n_neighborhoods:
+
+    Returns:
+
+    """
+    assert 0 < n_neighborhoods <= 10 ** 6, "The number of neighborhoods must be between 1 and 1000000"
+    municipalities, neighborhoods = np.divmod(np.arange(n_neighborhoods), 10 ** 4)
+    return [f'BU{518 + municipality:04d}{neighborhood:04d}'
+            for municipality, neighborhood in zip(municipalities, neighborhoods)]
+
+
+def write_fixtures(n_agents: int, n_neighborhoods: Optional[int] = None, directory: Optional[str] = None,
+                   seed: int = 0) -> Fixtures:
+    """
+    Writes synthetic datasources with the same file names, columns and labels as the CBS files the attribute modules
+    read, for `n_neighborhoods` neighborhoods with `n_agents` inhabitants in total, including the prepared joints in
+    the `processed` directories. The counts are random, but consistent: all margins of a neighborhood sum to its
+    population, and the joints have a non-zero count for every combination the pipeline can produce.
+
+    Fixtures that were written before with the same arguments are reused.
+
+    Args:
+        n_agents: Total population of all neighborhoods
+        n_neighborhoods: Defaults to one neighborhood per `default_agents_per_neighborhood` agents
+        directory: Defaults to {fixture_directory}/{n_agents}_{n_neighborhoods}
+        seed:
+
+    Returns:
+
+    """
+    n_neighborhoods = n_neighborhoods or max(1, round(n_agents / default_agents_per_neighborhood))
+    directory = directory or os.path.join(fixture_directory, f'{n_agents}_{n_neighborhoods}')
+    fixtures = Fixtures(directory, neighborhood_codes_for(n_neighborhoods), n_agents, seed)
+
+    manifest_path = os.path.join(directory, 'fixtures.json')
+    manifest = dict(n_agents=n_agents, n_neighborhoods=n_neighborhoods, seed=seed)
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as file:
+            if json.load(file) == manifest:
+                return fixtures
+
+    rng = np.random.default_rng(seed)
+    df_marginal = _marginal_distributions(fixtures.neighb_codes, n_agents, rng)
+
+    _write_csv(df_marginal, fixtures, 'marginal', 'marginal_distributions_84583NED.csv')
+    _write_csv(_province_population(n_agents), fixtures, 'marginal',
+               'Regionale_kerncijfers_Nederland_19052024_185018.csv')
+    _write_csv(_integer_ages(n_agents), fixtures, 'individual', 'integer_age', 'Leeftijdsopbouw Nederland 2019.csv')
+    _write_csv(_gender_age(n_agents), fixtures, 'individual', 'gender', 'gender_age-03759NED-formatted.csv', sep=',')
+    _write_csv(_migration_background(n_agents, rng), fixtures, 'individual', 'migration_background',
+               'Bev__migratieachtergr__regio__2010_2022_29122023_115517.csv')
+    _write_csv(_driver_licenses(n_agents), fixtures, 'individual', 'drivers_license',
+               'Personen_met_rijbewijs__categorie__regio_19052024_184228.csv')
+    _write_csv(_couples_age_disparity(), fixtures, 'household', 'household_composition',
+               'table_7ab235bf-b5a7-4077-bf56-3f5c8efec7d0.csv', sep=',')
+    _write_csv(_couples_gender_disparity(), fixtures, 'household', 'household_composition',
+               'Marriages__key_figures_25052024_182843.csv')
+    _write_csv(_mother_age_disparity(n_agents), fixtures, 'household', 'household_composition',
+               'Geboorte__kerncijfers_per_regio_25052024_182014.csv')
+    _write_csv(_household_income(n_agents, rng), fixtures, 'household', 'household_income',
+               'Inkomen_huishoudens__kenmerken__regio_25052024_182249.csv')
+    _write_csv(_vehicle_ownership(n_agents, rng), fixtures, 'household', 'vehicle_ownership',
+               'Huishoudens_met_auto_of_motor__2010_2015_14062024_171657.csv')
+    _write_csv(_postal_codes(df_marginal), fixtures, 'household', 'postal_code', 'pc6hnr20190801_gwb.csv')
+
+    _write_pickle(_absolved_education(n_agents, rng), fixtures, 'attributes/individual/education',
+                  'prepared_absolved_education.pkl')
+    _write_pickle(_current_education(n_agents, rng), fixtures, 'attributes/individual/education',
+                  'prepared_education_conditioned_on_absolved_education.pkl')
+    _write_pickle(_household_positions(n_agents, rng), fixtures, 'attributes/individual/household_position',
+                  'df_households_with_position_and_children.pkl')
+
+    with open(manifest_path, 'w') as file:
+        json.dump(manifest, file)
+
+    return fixtures
+
+
+def _marginal_distributions(neighb_codes: List[str], n_agents: int, rng: np.random.Generator) -> pd.DataFrame:
+    population = rng.multinomial(n_agents, rng.dirichlet(np.full(len(neighb_codes), 20.)))
+
+    age_probabilities = np.array([_age_profile[start:end].sum() for start, end in _age_groups.values()])
+    ages = rng.multinomial(population, age_probabilities / age_probabilities.sum())
+    male = rng.binomial(population, 0.49)
+    western = rng.binomial(population, 0.18)
+    non_western = rng.binomial(population - western, 0.45)
+    education = rng.multinomial(population - ages[:, 0], [0.3, 0.35, 0.35])
+    unmarried = rng.binomial(population, 0.6)
+
+    # CBS suppresses the education levels of some neighborhoods, which the pipeline imputes
+    education = education.astype(object)
+    education[np.arange(len(neighb_codes)) % 20 == 19] = '.'
+
+    households = np.round(population / 2.1).astype(int)
+    single_person = np.round(households * 0.45).astype(int)
+    without_children = np.round(households * 0.28).astype(int)
+
+    return pd.DataFrame({
+        'ID': np.arange(len(neighb_codes)),
+        'WijkenEnBuurten': neighb_codes,
+        'Gemeentenaam_1': "'s-Gravenhage",
+        'SoortRegio_2': 'Buurt',
+        'Codering_3': neighb_codes,
+        'IndelingswijzigingWijkenEnBuurten_4': 1,
+        'AantalInwoners_5': population,
+        'Mannen_6': male,
+        'Vrouwen_7': population - male,
+        'k_0Tot15Jaar_8': ages[:, 0],
+        'k_15Tot25Jaar_9': ages[:, 1],
+        'k_25Tot45Jaar_10': ages[:, 2],
+        'k_45Tot65Jaar_11': ages[:, 3],
+        'k_65JaarOfOuder_12': ages[:, 4],
+        'Ongehuwd_13': unmarried,
+        'Gehuwd_14': population - unmarried,
+        'WestersTotaal_17': western,
+        'NietWestersTotaal_18': non_western,
+        'HuishoudensTotaal_28': households,
+        'Eenpersoonshuishoudens_29': single_person,
+        'HuishoudensZonderKinderen_30': without_children,
+        'HuishoudensMetKinderen_31': households - single_person - without_children,
+        'OpleidingsniveauLaag_64': education[:, 0],
+        'OpleidingsniveauMiddelbaar_65': education[:, 1],
+        'OpleidingsniveauHoog_66': education[:, 2],
+    })
+
+
+def _province_population(n_agents: int) -> pd.DataFrame:
+    # The province is a few times larger than the synthetic population, like Zuid-Holland is for The Hague
+    ages = _province_ages(n_agents)
+    prefix = 'Bevolking/Bevolkingssamenstelling op 1 januari'
+    counts = {f'{prefix}/Leeftijd/Leeftijdsgroepen/{label} (aantal)': int(ages[slice(*_age_range(label))].sum())
+              for label in _province_age_groups}
+    return pd.DataFrame([{
+        'Perioden': '2019',
+        "Regio's": 'Zuid-Holland (PV)',
+        f'{prefix}/Totale bevolking (aantal)': sum(counts.values()),
+        **counts
+    }])
+
+
+def _province_ages(n_agents: int) -> np.ndarray:
+    return np.round(_age_profile / _age_profile.sum() * n_agents * 5).astype(int)
+
+
+def _integer_ages(n_agents: int) -> pd.DataFrame:
+    # The national population, with a thousands separator as in the CBS file. The first row is replaced by the reader
+    counts = np.round(_age_profile / _age_profile.sum() * n_agents * 20).astype(int)
+    male = np.round(counts * 0.49).astype(int)
+    return pd.DataFrame({
+        'Leeftijd': ['105 jaar of ouder'] + [f'{age} jaar' for age in range(105)],
+        'Mannen': [_thousands(count) for count in np.roll(male, 1)],
+        'Vrouwen': [_thousands(count) for count in np.roll(counts - male, 1)],
+    })
+
+
+def _gender_age(n_agents: int) -> pd.DataFrame:
+    counts = np.array([_age_profile[start:end].sum() for start, end in _age_groups.values()])
+    counts = np.round(counts / counts.sum() * n_agents * 1.2).astype(int)
+    return pd.DataFrame({
+        'age_group': ['age_0_15', 'age_15_25', 'age_25_45', 'age_45_65', 'age_over65'],
+        'male': np.round(counts * 0.49).astype(int),
+        'female': counts - np.round(counts * 0.49).astype(int),
+    })
+
+
+def _migration_background(n_agents: int, rng: np.random.Generator) -> pd.DataFrame:
+    labels = [f'{start} tot {start + 5} jaar' for start in range(0, 95, 5)] + ['95 jaar of ouder']
+    ages = np.add.reduceat(_age_profile, np.arange(0, 100, 5))
+    rows = list()
+    for gender in ['Mannen', 'Vrouwen']:
+        for label, age_count in zip(labels, ages / ages.sum() * n_agents * 1.2):
+            for background, fraction in _migration_backgrounds.items():
+                rows.append({
+                    'Geslacht': gender,
+                    'Leeftijd': label,
+                    'Migratieachtergrond': background,
+                    'Generatie': 'Totaal',
+                    'Perioden': '2019',
+                    "Regio's": "'s-Gravenhage",
+                    'Bevolking op 1 januari (aantal)': int(age_count / 2 * fraction * rng.uniform(0.8, 1.2)) + 1,
+                })
+    return pd.DataFrame(rows)
+
+
+def _driver_licenses(n_agents: int) -> pd.DataFrame:
+    ages = _province_ages(n_agents)
+    rows = list()
+    for label, fractions in _license_fractions.items():
+        start, end = _age_range(label)
+        for category, fraction in zip(_license_categories, fractions):
+            rows.append({
+                'Rijbewijscategorie': category,
+                'Leeftijd rijbewijshouder': label,
+                'Perioden': '2019',
+                "Regio's": 'Zuid-Holland (PV)',
+                'Personen met rijbewijs (aantal)': int(ages[start:end].sum() * fraction),
+            })
+
+    df = pd.DataFrame(rows)
+    df_totals = df.groupby('Rijbewijscategorie', as_index=False)['Personen met rijbewijs (aantal)'].sum()
+    df_totals = df_totals.assign(**{'Leeftijd rijbewijshouder': 'Totaal', 'Perioden': '2019',
+                                    "Regio's": 'Zuid-Holland (PV)'})
+    return pd.concat([df, df_totals[df.columns]], ignore_index=True)
+
+
+def _couples_age_disparity() -> pd.DataFrame:
+    return pd.DataFrame({
+        'Age difference': ['Same age', 'Man older', '1-4 years', '5-9 years', '10-14 years', '15-19 years',
+                           '20 years or more', 'Woman older', '1-4 years', '5-9 years', '10-14 years', '15-19 years',
+                           '20 years or more'],
+        'All marriages (%)': [12.0, None, 45.0, 15.0, 4.0, 1.0, 0.5, None, 17.0, 3.5, 1.0, 0.5, 0.5],
+    })
+
+
+def _couples_gender_disparity() -> pd.DataFrame:
+    return pd.DataFrame([{
+        'Periods': '2019',
+        'Marriages/Between man and woman (number)': 62000,
+        'Marriages/Between men (number)': 700,
+        'Marriages/Between women (number)': 800,
+        'Partnership registrations/Between man and woman (number)': 17000,
+        'Partnership registrations/Between men (number)': 300,
+        'Partnership registrations/Between women (number)': 400,
+    }])
+
+
+def _mother_age_disparity(n_agents: int) -> pd.DataFrame:
+    prefix = 'Levend geboren kinderen: leeftijd moe...'
+    labels = ['Jonger dan 20 jaar', '20 tot 25 jaar', '25 tot 30 jaar', '30 tot 35 jaar', '35 tot 40 jaar',
+              '40 tot 45 jaar', '45 jaar of ouder']
+    fractions = [0.01, 0.08, 0.27, 0.38, 0.21, 0.045, 0.005]
+    births = n_agents / 90
+    return pd.DataFrame([{
+        'Perioden': '2019',
+        "Regio's": "'s-Gravenhage",
+        **{f'{prefix}/{label} (aantal)': int(births * fraction) + 1 for label, fraction in zip(labels, fractions)},
+        **{f'Levend geboren kinderen: rangnummer/{rank}e kind (aantal)': int(births * fraction) + 1
+           for rank, fraction in zip(range(1, 5), [0.45, 0.35, 0.13, 0.07])},
+    }])
+
+
+def _household_income(n_agents: int, rng: np.random.Generator) -> pd.DataFrame:
+    characteristics = [
+        'Type: Eenpersoonshuishouden', 'Type: Meerpersoonshuishouden', 'Type: Eenoudergezin',
+        'Type: Paar, zonder kind', 'Type: Paar, met kind(eren)', 'Type: Meerpersoonshuishouden, overig',
+        'Hoofdkostwinner: tot 25 jaar', 'Hoofdkostwinner: 25 tot 45 jaar', 'Hoofdkostwinner: 45 tot 65 jaar',
+        'Hoofdkostwinner: 65 jaar of ouder', 'Hoofdkostwinner: Nederland', 'Hoofdkostwinner: westers',
+        'Hoofdkostwinner: niet-westers',
+    ]
+    rows = list()
+    for characteristic in characteristics:
+        distribution = rng.dirichlet(np.full(10, 10.)) * 100
+        rows.append({
+            'Populatie': 'Particuliere huishoudens incl. studenten',
+            "Regio's": "'s-Gravenhage (gemeente)",
+            'Perioden': '2019',
+            'Kenmerken van huishoudens': characteristic,
+            'Particuliere huishoudens (x 1 000)': round(n_agents / 2.1 / 1000 * rng.uniform(0.1, 0.4), 1),
+            'Inkomen/Gemiddeld gestandaardiseerd inkomen (1 000 euro)': round(rng.uniform(20, 40), 1),
+            'Inkomen/Mediaan gestandaardiseerd inkomen (1 000 euro)': round(rng.uniform(20, 35), 1),
+            'Inkomen/Gemiddeld besteedbaar inkomen (1 000 euro)': round(rng.uniform(30, 60), 1),
+            'Inkomen/Mediaan besteedbaar inkomen (1 000 euro)': round(rng.uniform(25, 50), 1),
+            **{f'Verdeling inkomen/Gestandaardiseerd inkomen: {i}e 10%-groep (%)': round(share, 1)
+               for i, share in enumerate(distribution, start=1)},
+        })
+    return pd.DataFrame(rows)
+
+
+def _vehicle_ownership(n_agents: int, rng: np.random.Generator) -> pd.DataFrame:
+    characteristics = (
+            ['Type: Eenpersoonshuishouden', 'Type: Eenoudergezin', 'Type: Paar, zonder kind',
+             'Type: Paar, met kind(eren)'] + _household_sizes +
+            [f'Gestandaardiseerd inkomen: {i}e 20%-groep' for i in range(1, 6)])
+
+    rows = list()
+    for characteristic in characteristics:
+        n_households = n_agents / 2.1 * 40 * rng.uniform(0.1, 0.3)
+        counts = dict()
+        for vehicle_type, ownership in [('auto', rng.uniform(0.4, 0.9)), ('motor', rng.uniform(0.02, 0.1))]:
+            owners = int(n_households * ownership)
+            one, two = rng.multinomial(owners, [0.75, 0.2, 0.05])[:2]
+            counts[vehicle_type] = [owners, one, two, owners - one - two]
+            counts[f'{vehicle_type}_relative'] = owners / n_households * 100
+
+        for i, n_vehicles in enumerate(['Minimaal één voertuig', 'Eén voertuig', 'Twee voertuigen',
+                                        'Drie of meer voertuigen']):
+            rows.append({
+                'Perioden': '2015*',
+                'Huishoudkenmerken': characteristic,
+                'Aantal voertuigen in huishouden': n_vehicles,
+                'Huishoudens in bezit van auto/Huishoudens in bezit van auto (aantal)': counts['auto'][i],
+                'Huishoudens in bezit van auto/% Huishoudens in bezit van auto  (%)':
+                    _decimal_comma(counts['auto_relative'] if i == 0 else counts['auto'][i] / n_households * 100),
+                'Huishoudens in bezit van motor/Huishoudens in bezit van motor (aantal)': counts['motor'][i],
+                'Huishoudens in bezit van motor/% Huishoudens in bezit van motor  (%)':
+                    _decimal_comma(counts['motor_relative'] if i == 0 else counts['motor'][i] / n_households * 100),
+            })
+    return pd.DataFrame(rows)
+
+
+def _postal_codes(df_marginal: pd.DataFrame, addresses_per_postal_code: int = 20) -> pd.DataFrame:
+    # One row per address, with about 20 addresses per postal code, as in the national file
+    n_postal_codes = np.maximum(np.ceil(df_marginal.HuishoudensTotaal_28.to_numpy() / addresses_per_postal_code), 1)
+    n_postal_codes = n_postal_codes.astype(int)
+    buurt_codes = np.repeat([int(code[2:]) for code in df_marginal.Codering_3], n_postal_codes)
+    postal_code_ids = np.arange(n_postal_codes.sum())
+
+    letters = np.array([chr(ord('A') + i) for i in range(26)])
+    postal_codes = [f'{1000 + number}{letters[first]}{letters[second]}' for number, first, second in
+                    zip(postal_code_ids // 676 % 9000, postal_code_ids // 26 % 26, postal_code_ids % 26)]
+
+    return pd.DataFrame({
+        'PC6': np.repeat(postal_codes, addresses_per_postal_code),
+        'Huisnummer': np.tile(np.arange(1, addresses_per_postal_code + 1), len(postal_codes)),
+        'Buurt2019': np.repeat(buurt_codes, addresses_per_postal_code),
+        'Wijk2019': np.repeat(buurt_codes // 100, addresses_per_postal_code),
+        'Gemeente2019': np.repeat(buurt_codes // 10 ** 4, addresses_per_postal_code),
+    })
+
+
+def _absolved_education(n_agents: int, rng: np.random.Generator) -> pd.DataFrame:
+    ages = ['0-4'] + [str(age) for age in range(4, 15)] + [f'{start}-{start + 10}' for start in range(15, 75, 10)] + [
+        '75+']
+    rows = [
+        {'age': age, 'absolved_edu_3_cats': group, 'gender': gender, 'absolved_education': education,
+         'count': rng.uniform(0.5, 1.5) * n_agents / 1000}
+        for age in ages for gender in ['male', 'female']
+        for education, group in specific_to_grouped_attained_education_map.items()
+    ]
+    return pd.DataFrame(rows)
+
+
+def _current_education(n_agents: int, rng: np.random.Generator) -> pd.DataFrame:
+    ages = ['0-4'] + [str(age) for age in range(4, 30)] + [f'{start}-{start + 5}' for start in range(30, 95, 5)] + [
+        '95+']
+    index = pd.MultiIndex.from_product([
+        ages, ['male', 'female'], ['Dutch', 'Western', 'NonWestern'], list(specific_to_grouped_attained_education_map),
+        ['not_enrolled'] + list(specific_to_grouped_education_map)
+    ], names=['age', 'gender', 'migration_background', 'absolved_education', 'current_education'])
+    df = index.to_frame(index=False)
+    df['count'] = rng.uniform(0.5, 1.5, len(df)) * n_agents / len(df)
+    return df
+
+
+def _household_positions(n_agents: int, rng: np.random.Generator) -> pd.DataFrame:
+    # Children live with their parents until they are 25 at most, and the other positions are taken from 15 years on
+    age_groups = [f'{start}-{start + 5}' for start in range(0, 95, 5)] + ['95+']
+    rows = list()
+    for i, age_group in enumerate(age_groups):
+        for gender in ['male', 'female']:
+            for household_position, household_type in household_map.items():
+                is_child = household_position.startswith('child')
+                if (is_child and i >= 5) or (not is_child and i < 3):
+                    continue
+                rows.append({'gender': gender, 'age_group': age_group, 'household_position': household_position,
+                             'household_type': household_type, 'count': rng.uniform(0.5, 1.5) * n_agents / 1000})
+    return pd.DataFrame(rows)
+
+
+def _age_range(label: str) -> Tuple[int, int]:
+    """Ages start <= age < end of a CBS age label, e.g., '16 tot 18 jaar' or '75 jaar of ouder'"""
+    bounds = [int(bound) for bound in re.findall(r'\d+', label)]
+    return (bounds[0], 106) if 'ouder' in label else (0, bounds[0]) if 'Jonger' in label else (bounds[0], bounds[1])
+
+
+def _thousands(value: int) -> str:
+    return f'{value:,}'.replace(',', ' ')
+
+
+def _decimal_comma(value: float) -> str:
+    return f'{value:.1f}'.replace('.', ',')
+
+
+def _write_csv(df: pd.DataFrame, fixtures: Fixtures, *parts: str, sep: str = ';') -> None:
+    path = os.path.join(fixtures.datasources_directory, *parts)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    df.to_csv(path, sep=sep, index=False)
+
+
+def _write_pickle(df: pd.DataFrame, fixtures: Fixtures, module_directory: str, file_name: str) -> None:
+    path = os.path.join(fixtures.processed_directory, module_directory, 'processed', file_name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    df.to_pickle(path)
@@ -0,0 +1,299 @@
+import argparse
+import datetime
+import importlib
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+from dataclasses import asdict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import pandas as pd
+
+from benchmarks.fixtures import Fixtures, write_fixtures
+from benchmarks.instrumentation import StageInstrumentation
+from data_tools.datasources import output_path, repository_directory
+from data_tools.stage_registry import StageEntry, household_stage_registry, individual_stage_registry, pipeline_modules
+
+benchmark_directory = output_path('benchmarks')
+
+default_scales = [10_000, 100_000, 1_000_000, 10_000_000]
+
+# The stages in the order of the pipelines (see `data_tools.stage_registry`)
+stages = individual_stage_registry + household_stage_registry
+
+
+def benchmark_scale(n_agents: int, n_neighborhoods: Optional[int] = None,
+                    selected_stages: Sequence[StageEntry] = stages, seed: int = 0, repeats: int = 1
+                    ) -> List[Dict[str, Any]]:
+    """
+    Runs `selected_stages` in order on fixtures (see `benchmarks.fixtures`) of `n_agents` agents, each stage in its own
+    process, and measures the wall time and peak memory of each stage. Only the call to the stage function is timed;
+    importing the pipeline and the fitters of the stage, and reading the result of the previous stage are not. The
+    import of each pipeline module is measured separately, as the stage `startup` (see `measure_startup`).
+
+    Each stage is run `repeats` times on the same input, so the noise of the measurements can be estimated (see
+    `benchmarks.regression`). The next stage continues from the result of the last repeat.
+
+    The result of each stage is stored in {benchmark_directory}/runs/, where the next stage reads it. When a stage
+    fails, the remaining stages are skipped.
+
+    Args:
+        n_agents:
+        n_neighborhoods: Defaults to the number of neighborhoods of `write_fixtures`
+        selected_stages: A consecutive range of `stages`. The stage before the first selected stage must have been run
+            before at the same scale
+        seed: Seed of the fixtures
+        repeats:
+
+    Returns:
+        One result per stage and repeat that was run (see `run_stage`)
+    """
+    fixtures = write_fixtures(n_agents, n_neighborhoods, seed=seed)
+    run_directory = run_directory_for(fixtures)
+
+    results = list()
+    for pipeline in dict.fromkeys(stage.pipeline for stage in selected_stages):
+        for repeat in range(repeats):
+            results.append(measure_startup(pipeline, fixtures) | dict(repeat=repeat))
+
+    for stage in selected_stages:
+        for repeat in range(repeats):
+            print(f"Benchmarking {stage.function} with {n_agents} agents ({repeat + 1}/{repeats})")
+            result = run_stage(stage, fixtures, run_directory) | dict(repeat=repeat)
+            results.append(result)
+            if result['status'] != 'ok':
+                print(f"Stage {stage.function} failed, see {result['log']}")
+                return results
+
+    return results
+
+
+def run_directory_for(fixtures: Fixtures) -> str:
+    """Directory where the results of the stages run on `fixtures` are stored"""
+    return os.path.abspath(os.path.join(benchmark_directory, 'runs', os.path.basename(fixtures.directory)))
+
+
+def run_stage(stage: StageEntry, fixtures: Fixtures, run_directory: str) -> Dict[str, Any]:
+    """
+    Runs one stage in a new process, with the environment of `fixtures`
+
+    Args:
+        stage:
+        fixtures:
+        run_directory: Directory with the results of the previous stages
+
+    Returns:
+        The stage, scale, status, wall time (seconds), the peak resident set size of the process before and after the
+        stage (bytes), the number of agents and households the stage returned, the number of IPF fits and iterations,
+        and the same measurements for each instrumented function the stage called (see
+        `benchmarks.instrumentation`)
+    """
+    os.makedirs(run_directory, exist_ok=True)
+    index = stages.index(stage)
+    result_path = _stage_path(run_directory, index, 'json')
+    log_path = _stage_path(run_directory, index, 'log')
+    spec = dict(
+            stage=asdict(stage),
+            inputs=_stage_outputs(run_directory, index - 1) if index > 0 else [None, None],
+            outputs=_stage_outputs(run_directory, index),
+            result=result_path,
+    )
+
+    if os.path.exists(result_path):
+        os.remove(result_path)
+
+    with open(log_path, 'w') as log:
+        process = subprocess.run(
+                [sys.executable, '-m', 'benchmarks.harness', '--stage', json.dumps(spec)],
+                cwd=repository_directory, env=os.environ | fixtures.environment(), stdout=log, stderr=subprocess.STDOUT
+        )
+
+    result = dict(
+            stage=stage.function,
+            pipeline=stage.pipeline,
+            n_agents=fixtures.n_agents,
+            n_neighborhoods=len(fixtures.neighb_codes),
+            status='ok' if process.returncode == 0 and os.path.exists(result_path) else 'failed',
+            log=log_path,
+    )
+    if result['status'] == 'ok':
+        with open(result_path) as file:
+            result |= json.load(file)
+
+    return result
+
+
+def measure_startup(pipeline: str, fixtures: Fixtures) -> Dict[str, Any]:
+    """
+    Imports the module of `pipeline` in a new process, with the environment of `fixtures`, and measures the time and
+    peak memory of the import, i.e., the startup cost of a run of which all stages were stored
+
+    Args:
+        pipeline:
+        fixtures:
+
+    Returns:
+        A result like those of `run_stage`, for the stage `startup`
+    """
+    code = (f"import json, resource, sys, time; start = time.perf_counter(); import {pipeline_modules[pipeline]}; "
+            f"wall_time = time.perf_counter() - start; peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss; "
+            f"print(json.dumps(dict(wall_time=wall_time, peak_rss=peak if sys.platform == 'darwin' else peak * 1024)))")
+    process = subprocess.run([sys.executable, '-c', code], cwd=repository_directory,
+                             env=os.environ | fixtures.environment(), capture_output=True, text=True)
+
+    result = dict(stage='startup', pipeline=pipeline, n_agents=fixtures.n_agents,
+                  n_neighborhoods=len(fixtures.neighb_codes), status='ok' if process.returncode == 0 else 'failed')
+    if result['status'] == 'ok':
+        result |= json.loads(process.stdout.strip().splitlines()[-1])
+    else:
+        print(process.stderr)
+    return result
+
+
+def write_results(results: List[Dict[str, Any]], label: Optional[str] = None) -> str:
+    """
+    Writes benchmark results to {benchmark_directory}/results/{label}.json
+
+    Args:
+        results:
+        label: Defaults to the current date and time
+
+    Returns:
+        The path of the written file
+    """
+    label = label or datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+    path = os.path.join(benchmark_directory, 'results', f'{label}.json')
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as file:
+        json.dump(dict(label=label, created=datetime.datetime.now().isoformat(timespec='seconds'), results=results),
+                  file, indent=1)
+    return path
+
+
+def results_table(results: List[Dict[str, Any]]) -> pd.DataFrame:
+    """
+    Wall time, peak memory and IPF iterations per stage and scale
+
+    Args:
+        results:
+
+    Returns:
+
+    """
+    df = pd.DataFrame(results)
+    for column in ['wall_time', 'peak_rss', 'baseline_rss', 'ipf_iterations']:
+        if column not in df.columns:
+            df[column] = float('nan')
+    df['peak_rss_mb'] = df.peak_rss / 2 ** 20
+    df['stage_rss_mb'] = (df.peak_rss - df.baseline_rss) / 2 ** 20
+    return df[['pipeline', 'stage', 'n_agents', 'status', 'wall_time', 'peak_rss_mb', 'stage_rss_mb', 'ipf_iterations']]
+
+
+def call_stage(stage: StageEntry, function: Callable, df_synth_pop: Optional[pd.DataFrame],
+               df_synth_households: Optional[pd.DataFrame]) -> Tuple[pd.DataFrame, Optional[pd.DataFrame]]:
+    """
+    Calls `function` (the function of `stage`, or a replacement with the same signature) the way the pipeline calls
+    the stage
+
+    Args:
+        stage:
+        function:
+        df_synth_pop: Result of the previous stage, None for the first stage
+        df_synth_households: Households of the previous stage, None before the household pipeline
+
+    Returns:
+        The synthetic population and households after the stage
+    """
+    if stage.pipeline == 'individuals':
+        return function(*([] if df_synth_pop is None else [df_synth_pop])), df_synth_households
+    return function(df_synth_pop, df_synth_households)
+
+
+def stage_outputs(run_directory: str, stage: StageEntry) -> List[str]:
+    """Paths of the synthetic population and households written after `stage` in `run_directory`"""
+    return _stage_outputs(run_directory, stages.index(stage))
+
+
+def _stage_path(run_directory: str, index: int, extension: str) -> str:
+    return os.path.join(run_directory, f'{index:02d}_{stages[index].function}.{extension}')
+
+
+def _stage_outputs(run_directory: str, index: int) -> List[str]:
+    return [_stage_path(run_directory, index, 'individuals.pkl'), _stage_path(run_directory, index, 'households.pkl')]
+
+
+def _peak_rss() -> int:
+    # ru_maxrss is in kilobytes on Linux, and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _run_stage_in_this_process(spec: Dict[str, Any]) -> None:
+    stage = StageEntry(**(spec['stage'] | dict(modules=tuple(spec['stage']['modules']))))
+
+    start = time.perf_counter()
+    module = importlib.import_module(pipeline_modules[stage.pipeline])
+    # The pipeline modules import the fitters of a stage when it runs, which should neither be timed as part of the
+    # stage, nor happen after the instrumentation wrapped the loaded modules
+    stage.preload()
+    import_time = time.perf_counter() - start
+
+    instrumentation = StageInstrumentation().install()
+    function = getattr(module, stage.function)
+
+    df_synth_pop, df_synth_households = [pd.read_pickle(path) if path and os.path.exists(path) else None
+                                         for path in spec['inputs']]
+    baseline_rss = _peak_rss()
+
+    start = time.perf_counter()
+    df_synth_pop, df_synth_households = call_stage(stage, function, df_synth_pop, df_synth_households)
+    wall_time = time.perf_counter() - start
+    peak_rss = _peak_rss()
+
+    for df, path in zip([df_synth_pop, df_synth_households], spec['outputs']):
+        if df is not None:
+            df.to_pickle(path)
+        elif os.path.exists(path):
+            os.remove(path)
+
+    with open(spec['result'], 'w') as file:
+        json.dump(dict(
+                wall_time=wall_time,
+                import_time=import_time,
+                baseline_rss=baseline_rss,
+                peak_rss=peak_rss,
+                agents=len(df_synth_pop),
+                households=None if df_synth_households is None else len(df_synth_households),
+                ipf_fits=instrumentation.ipf_fits,
+                ipf_iterations=instrumentation.ipf_iterations,
+                calls=instrumentation.summary(),
+        ), file)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Times each stage of the individual and household pipelines on "
+                                                 "synthetic fixtures of increasing scale")
+    parser.add_argument('--scales', type=int, nargs='+', default=default_scales, help="Numbers of agents")
+    parser.add_argument('--neighborhoods', type=int, help="Number of neighborhoods (defaults to one per 3500 agents)")
+    parser.add_argument('--pipelines', nargs='+', choices=list(pipeline_modules), default=list(pipeline_modules))
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeats', type=int, default=1, help="Number of times each stage is run")
+    parser.add_argument('--label', help="Name of the results file")
+    parser.add_argument('--stage', help=argparse.SUPPRESS)
+    arguments = parser.parse_args()
+
+    if arguments.stage:
+        _run_stage_in_this_process(json.loads(arguments.stage))
+        sys.exit()
+
+    all_results = list()
+    for scale in arguments.scales:
+        all_results += benchmark_scale(scale, arguments.neighborhoods,
+                                       [stage for stage in stages if stage.pipeline in arguments.pipelines],
+                                       arguments.seed, arguments.repeats)
+
+    print(f"Results written to {write_results(all_results, arguments.label)}")
+    print(results_table(all_results).to_string(index=False))
@@ -0,0 +1,117 @@
+import functools
+import re
+import sys
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, List, Optional
+
+# Functions of the attribute modules and pipelines that are timed separately within a stage
+instrumented_function_pattern = re.compile(r'^((get_and_)?fit_\w+|partition_households)$')
+
+instrumented_module_prefixes = ('attributes.', 'generate_individuals', 'generate_households')
+
+
+@dataclass
+class CallRecord:
+    """Total wall time, number of IPF fits and IPF iterations of all calls to one instrumented function"""
+    name: str
+    calls: int = 0
+    wall_time: float = 0.
+    ipf_fits: int = 0
+    ipf_iterations: int = 0
+
+
+class StageInstrumentation:
+    """
+    Times the `fit_*` functions of the attribute modules, the runs of the `ConditionalAttributeAdder` and
+    `partition_households` within a benchmarked stage, and counts the IPF fits and iterations of each of them.
+
+    Times are inclusive, e.g., the time of `get_and_fit_car_driver_license` includes that of `fit_car_driver_license`.
+    IPF iterations are attributed to the innermost instrumented function that runs the fit.
+
+    Only used in the processes of the benchmark harness: `install` replaces the functions in the loaded modules, and
+    the replacements stay in place until the process exits.
+    """
+
+    def __init__(self):
+        self.records: Dict[str, CallRecord] = dict()
+        self.ipf_fits = 0
+        self.ipf_iterations = 0
+        self._active: List[CallRecord] = list()
+
+    def install(self) -> 'StageInstrumentation':
+        """
+        Instruments the functions of all loaded attribute and pipeline modules, the `ConditionalAttributeAdder` and
+        the `ipfn` fitter
+
+        Returns:
+
+        """
+        wrappers: Dict[Callable, Callable] = dict()
+        for module_name, module in list(sys.modules.items()):
+            if module is None or not module_name.startswith(instrumented_module_prefixes):
+                continue
+            for name, value in list(vars(module).items()):
+                if callable(value) and getattr(value, '__module__', '').startswith(instrumented_module_prefixes) and \
+                        instrumented_function_pattern.match(getattr(value, '__name__', '')):
+                    if value not in wrappers:
+                        wrappers[value] = self._timed(value, value.__name__)
+                    setattr(module, name, wrappers[value])
+
+        conditional_attribute_adder = _optional_attribute('gensynthpop.conditional_attribute_adder',
+                                                          'ConditionalAttributeAdder')
+        if conditional_attribute_adder is not None:
+            conditional_attribute_adder.run = self._timed(conditional_attribute_adder.run,
+                                                          'ConditionalAttributeAdder.run')
+
+        ipfn_class = _optional_attribute('ipfn.ipfn', 'ipfn')
+        if ipfn_class is not None:
+            ipfn_class.iteration = self._counted_fit(ipfn_class.iteration)
+            for method in ['ipfn_df', 'ipfn_np']:
+                setattr(ipfn_class, method, self._counted_iteration(getattr(ipfn_class, method)))
+
+        return self
+
+    def summary(self) -> List[Dict[str, Any]]:
+        """The records of all instrumented functions that were called, in the order of their first call"""
+        return [asdict(record) for record in self.records.values()]
+
+    def _timed(self, function: Callable, name: str) -> Callable:
+        @functools.wraps(function)
+        def timed(*args, **kwargs):
+            record = self.records.setdefault(name, CallRecord(name))
+            self._active.append(record)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                record.calls += 1
+                record.wall_time += time.perf_counter() - start
+                self._active.pop()
+
+        return timed
+
+    def _counted_fit(self, iteration: Callable) -> Callable:
+        @functools.wraps(iteration)
+        def counted(*args, **kwargs):
+            self.ipf_fits += 1
+            if self._active:
+                self._active[-1].ipf_fits += 1
+            return iteration(*args, **kwargs)
+
+        return counted
+
+    def _counted_iteration(self, method: Callable) -> Callable:
+        @functools.wraps(method)
+        def counted(*args, **kwargs):
+            self.ipf_iterations += 1
+            if self._active:
+                self._active[-1].ipf_iterations += 1
+            return method(*args, **kwargs)
+
+        return counted
+
+
+def _optional_attribute(module_name: str, attribute: str) -> Optional[Any]:
+    module = sys.modules.get(module_name)
+    return getattr(module, attribute, None) if module is not None else None
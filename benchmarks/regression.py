@@ -0,0 +1,273 @@
+import argparse
+import json
+import os
+import sys
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.harness import benchmark_directory
+from data_tools.atomic_write import atomic_write
+
+baseline_directory = os.path.join(benchmark_directory, 'baselines')
+
+regression_report_directory = os.path.join(benchmark_directory, 'reports')
+
+regression_report_columns = [
+    'pipeline', 'stage', 'call', 'n_agents', 'metric', 'baseline', 'candidate', 'change', 'allowed', 'status'
+]
+
+
+@dataclass(frozen=True)
+class Threshold:
+    """
+    The largest change of a metric that is not reported, which is the largest of:
+        - `relative` times the baseline value
+        - `absolute`, so changes of stages that take almost no time or memory are ignored
+        - `noise_factor` times the noise of the measurements, i.e., the scaled median absolute deviation of the
+          repeats (see `benchmarks.harness.benchmark_scale`) of the baseline or the candidate, whichever is larger
+    """
+    relative: float
+    absolute: float
+    noise_factor: float = 3.
+
+
+default_thresholds = {
+    'wall_time': Threshold(relative=0.1, absolute=0.05),
+    'peak_rss': Threshold(relative=0.1, absolute=16 * 2 ** 20),
+    'ipf_iterations': Threshold(relative=0.05, absolute=2),
+}
+
+# Metrics of the instrumented functions within a stage (see `benchmarks.instrumentation`)
+call_metrics = ['wall_time', 'ipf_iterations']
+
+
+def load_results(path_or_baseline: str) -> Dict[str, Any]:
+    """
+    Reads benchmark results, as written by `benchmarks.harness.write_results` or `save_baseline`
+
+    Args:
+        path_or_baseline: Path of a results file, or the name of a saved baseline
+
+    Returns:
+
+    """
+    path = path_or_baseline
+    if not os.path.exists(path):
+        path = os.path.join(baseline_directory, f'{path_or_baseline}.json')
+    with open(path) as file:
+        return json.load(file)
+
+
+def save_baseline(results: Dict[str, Any], name: str = 'baseline') -> str:
+    """
+    Saves benchmark results as the baseline `name`, which later runs are compared against
+
+    Args:
+        results: Results as returned by `load_results`
+        name:
+
+    Returns:
+        Path of the saved baseline
+    """
+    path = os.path.join(baseline_directory, f'{name}.json')
+    with atomic_write(path) as tmp_path:
+        with open(tmp_path, 'w') as file:
+            json.dump(results, file, indent=1)
+
+    return path
+
+
+def measurements(results: Dict[str, Any]) -> pd.DataFrame:
+    """
+    One row per measured value of the stages, and of the instrumented functions they called, of each repeat
+
+    Args:
+        results:
+
+    Returns:
+        Data frame with the columns pipeline, stage, call, n_agents, repeat, status, metric and value. `call` is empty
+        for the measurements of the entire stage
+    """
+    rows = list()
+    for result in results['results']:
+        key = dict(pipeline=result['pipeline'], stage=result['stage'], n_agents=result['n_agents'],
+                   repeat=result.get('repeat', 0), status=result['status'])
+        if result['status'] != 'ok':
+            rows.append(key | dict(call='', metric='status', value=np.nan))
+            continue
+        for metric in default_thresholds:
+            rows.append(key | dict(call='', metric=metric, value=result.get(metric, np.nan)))
+        for call in result.get('calls', list()):
+            for metric in call_metrics:
+                rows.append(key | dict(call=call['name'], metric=metric, value=call[metric]))
+
+    return pd.DataFrame(rows, columns=['pipeline', 'stage', 'call', 'n_agents', 'repeat', 'status', 'metric', 'value'])
+
+
+def compare_results(baseline: Dict[str, Any], candidate: Dict[str, Any],
+                    thresholds: Optional[Dict[str, Threshold]] = None) -> pd.DataFrame:
+    """
+    Compares the median of each metric of each stage and instrumented function of `candidate` with `baseline`, at the
+    scales that occur in both.
+
+    Statuses:
+        regression: The metric increased by more than the threshold (see `Threshold`)
+        improvement: The metric decreased by more than the threshold
+        ok: The change is within the threshold
+        failed: The stage failed in the candidate run, but not in the baseline
+        missing: The stage or function was measured in the baseline, but not in the candidate
+        new: The stage or function was measured in the candidate, but not in the baseline
+
+    Args:
+        baseline:
+        candidate:
+        thresholds: Per metric. Defaults to `default_thresholds`
+
+    Returns:
+        The regression report, with one row per stage (or function), scale and metric
+    """
+    thresholds = thresholds or default_thresholds
+    df_baseline = measurements(baseline)
+    df_candidate = measurements(candidate)
+
+    scales = set(df_baseline.n_agents) & set(df_candidate.n_agents)
+    df_baseline = df_baseline[df_baseline.n_agents.isin(scales)]
+    df_candidate = df_candidate[df_candidate.n_agents.isin(scales)]
+
+    keys = ['pipeline', 'stage', 'call', 'n_agents', 'metric']
+    baseline_groups = dict(list(df_baseline.groupby(keys, sort=False)))
+    candidate_groups = dict(list(df_candidate.groupby(keys, sort=False)))
+
+    rows = list()
+    for key in list(baseline_groups) + [key for key in candidate_groups if key not in baseline_groups]:
+        row = dict(zip(keys, key)) | dict(baseline=np.nan, candidate=np.nan, change=np.nan, allowed=np.nan)
+        baseline_values = baseline_groups[key].value.dropna().to_numpy() if key in baseline_groups else None
+        candidate_values = candidate_groups[key].value.dropna().to_numpy() if key in candidate_groups else None
+
+        if row['metric'] == 'status':
+            row['status'] = 'failed' if key in candidate_groups and key not in baseline_groups else 'ok'
+            rows.append(row)
+            continue
+        if candidate_values is None:
+            stage_failed = ((df_candidate.stage == row['stage']) & (df_candidate.n_agents == row['n_agents']) &
+                            (df_candidate.metric == 'status')).any()
+            row['status'] = 'failed' if stage_failed else 'missing'
+        elif baseline_values is None:
+            row['status'] = 'new'
+        else:
+            row |= _compare_values(baseline_values, candidate_values, thresholds[row['metric']])
+        if baseline_values is not None and len(baseline_values):
+            row['baseline'] = float(np.median(baseline_values))
+        if candidate_values is not None and len(candidate_values):
+            row['candidate'] = float(np.median(candidate_values))
+        rows.append(row)
+
+    return pd.DataFrame(rows, columns=regression_report_columns)
+
+
+def has_regressions(df_report: pd.DataFrame) -> bool:
+    """True if any stage or function regressed or failed"""
+    return bool(df_report.status.isin(['regression', 'failed']).any())
+
+
+def render_regression_report(df_report: pd.DataFrame, only_changes: bool = True) -> str:
+    """
+    Formats a regression report as a Markdown table
+
+    Args:
+        df_report:
+        only_changes: Leave out the rows with status ok
+
+    Returns:
+
+    """
+    if only_changes:
+        df_report = df_report[df_report.status != 'ok']
+
+    lines = [
+        '| Stage | Function | Agents | Metric | Baseline | Candidate | Change | Status |',
+        '|---|---|--:|---|--:|--:|--:|---|',
+    ]
+    for _, row in df_report.iterrows():
+        lines.append('| ' + ' | '.join([
+            row.stage,
+            row.call,
+            f'{row.n_agents:,}',
+            row.metric,
+            _format_value(row.baseline, row.metric),
+            _format_value(row.candidate, row.metric),
+            '--' if not np.isfinite(row.change) else f'{row.change:+.1%}',
+            row.status,
+        ]) + ' |')
+
+    return '\n'.join(lines) + '\n'
+
+
+def _compare_values(baseline_values: np.ndarray, candidate_values: np.ndarray,
+                    threshold: Threshold) -> Dict[str, Any]:
+    baseline_value = float(np.median(baseline_values))
+    difference = float(np.median(candidate_values)) - baseline_value
+    noise = max(_noise(baseline_values), _noise(candidate_values))
+    allowed = max(threshold.relative * abs(baseline_value), threshold.absolute, threshold.noise_factor * noise)
+
+    status = 'regression' if difference > allowed else 'improvement' if difference < -allowed else 'ok'
+    return dict(change=difference / baseline_value if baseline_value else np.nan, allowed=allowed, status=status)
+
+
+def _noise(values: np.ndarray) -> float:
+    # Median absolute deviation, scaled to estimate the standard deviation of normally distributed measurements
+    if len(values) < 2:
+        return 0.
+    return 1.4826 * float(np.median(np.abs(values - np.median(values))))
+
+
+def _format_value(value: float, metric: str) -> str:
+    if not np.isfinite(value):
+        return '--'
+    if metric == 'wall_time':
+        return f'{value:.2f} s'
+    if metric == 'peak_rss':
+        return f'{value / 2 ** 20:,.0f} MB'
+    return f'{value:,.0f}'
+
+
+def _write_report(df_report: pd.DataFrame, name: str) -> List[str]:
+    os.makedirs(regression_report_directory, exist_ok=True)
+    paths = [os.path.join(regression_report_directory, f'{name}.{extension}') for extension in ['csv', 'md']]
+    df_report.to_csv(paths[0], index=False)
+    with open(paths[1], 'w') as file:
+        file.write(render_regression_report(df_report))
+    return paths
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compares benchmark results with a saved baseline, and exits with "
+                                                 "status 1 if any stage regressed")
+    parser.add_argument('results', help="Results file written by benchmarks.harness")
+    parser.add_argument('--baseline', default='baseline', help="Path or name of the baseline")
+    parser.add_argument('--save-baseline', action='store_true',
+                        help="Save the results as the baseline instead of comparing them")
+    parser.add_argument('--time-tolerance', type=float, default=default_thresholds['wall_time'].relative,
+                        help="Relative increase of the wall time that is not reported")
+    parser.add_argument('--memory-tolerance', type=float, default=default_thresholds['peak_rss'].relative,
+                        help="Relative increase of the peak memory that is not reported")
+    arguments = parser.parse_args()
+
+    candidate_results = load_results(arguments.results)
+    if arguments.save_baseline:
+        print(f"Baseline saved to {save_baseline(candidate_results, arguments.baseline)}")
+        sys.exit()
+
+    baseline_results = load_results(arguments.baseline)
+    report = compare_results(baseline_results, candidate_results, default_thresholds | {
+        'wall_time': Threshold(arguments.time_tolerance, default_thresholds['wall_time'].absolute),
+        'peak_rss': Threshold(arguments.memory_tolerance, default_thresholds['peak_rss'].absolute),
+    })
+
+    report_paths = _write_report(report, f"{candidate_results['label']}_vs_{baseline_results['label']}")
+    print(render_regression_report(report))
+    print(f"Report written to {', '.join(report_paths)}")
+    sys.exit(1 if has_regressions(report) else 0)
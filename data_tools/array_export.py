@@ -0,0 +1,144 @@
+import json
+import os
+from typing import Any, Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+from data_tools.atomic_write import atomic_write
+from data_tools.datasources import output_path
+
+codebook_file = 'codebook.json'
+
+# Columns with more distinct values than this (e.g., IDs) are stored as fixed-width byte strings instead of codes
+max_code_values = 2 ** 15
+
+
+def array_export_directory() -> str:
+    """Directory of the exported arrays, output/synthetic_population/arrays"""
+    return output_path('synthetic_population', 'arrays')
+
+
+def column_to_array(s: pd.Series) -> tuple:
+    """
+    A column as a fixed-width NumPy array, and its entry in the codebook:
+        - numbers and booleans are stored as they are
+        - strings with few distinct values are stored as integer codes into the sorted `values`, or -1 if missing
+        - other strings are stored as fixed-width byte strings
+
+    Args:
+        s:
+
+    Returns:
+        The array and its codebook entry
+    """
+    if pd.api.types.is_bool_dtype(s) or (pd.api.types.is_numeric_dtype(s) and not isinstance(s.dtype,
+                                                                                              pd.CategoricalDtype)):
+        array = s.to_numpy()
+        return array, dict(kind='numeric', dtype=array.dtype.str)
+
+    if s.nunique() <= max_code_values:
+        codes, values = pd.factorize(s, sort=True)
+        dtype = np.int8 if len(values) < 2 ** 7 else np.int16
+        return codes.astype(dtype), dict(kind='category', dtype=np.dtype(dtype).str,
+                                         values=[value.item() if isinstance(value, np.generic) else value
+                                                 for value in values])
+
+    array = s.astype(str).str.encode('utf-8').to_numpy().astype(bytes)
+    return array, dict(kind='bytes', dtype=array.dtype.str)
+
+
+def export_arrays(df_synth_pop: pd.DataFrame, df_synth_households: pd.DataFrame,
+                  directory: Optional[str] = None) -> str:
+    """
+    Exports the final individuals and households as one `.npy` file per column, which simulators can memory-map
+    (see `load_arrays`), with a codebook.json that describes the columns and the values of the categorical codes.
+
+    The individuals are ordered by household, in the order of the households, so the members of the i-th household are
+    the individuals offsets[i]:offsets[i + 1], with `offsets` in households/member_offsets.npy. The row of the
+    household of each individual is stored in individuals/household_row.npy.
+
+    Args:
+        df_synth_pop:
+        df_synth_households:
+        directory: Defaults to `array_export_directory()`
+
+    Returns:
+        The directory
+    """
+    directory = directory or array_export_directory()
+
+    household_rows = pd.Series(np.arange(len(df_synth_households)), index=df_synth_households.household_id)
+    individual_household_rows = df_synth_pop.household_id.map(household_rows)
+    assert individual_household_rows.notna().all(), "Individuals without a household"
+    individual_household_rows = individual_household_rows.to_numpy(dtype='int64')
+
+    order = np.argsort(individual_household_rows, kind='stable')
+    df_synth_pop = df_synth_pop.iloc[order].reset_index(drop=True)
+    member_offsets = np.concatenate([[0], np.cumsum(np.bincount(individual_household_rows,
+                                                                minlength=len(df_synth_households)))])
+
+    # A simulator never maps a partially written export (see `data_tools.atomic_write.atomic_write`)
+    codebook = dict()
+    with atomic_write(directory) as tmp_directory:
+        for name, df, extra in [
+            ('individuals', df_synth_pop, dict(household_row=individual_household_rows[order].astype('int32'))),
+            ('households', df_synth_households.reset_index(drop=True),
+             dict(member_offsets=member_offsets.astype('int64'))),
+        ]:
+            os.makedirs(os.path.join(tmp_directory, name))
+            columns = dict()
+            for column in df.columns:
+                array, columns[column] = column_to_array(df[column])
+                np.save(os.path.join(tmp_directory, name, f'{column}.npy'), array, allow_pickle=False)
+            for column, array in extra.items():
+                np.save(os.path.join(tmp_directory, name, f'{column}.npy'), array, allow_pickle=False)
+                columns[column] = dict(kind='numeric', dtype=array.dtype.str)
+            codebook[name] = dict(n_rows=len(df), columns=columns)
+
+        with open(os.path.join(tmp_directory, codebook_file), 'w') as file:
+            json.dump(codebook, file, indent=1)
+
+    return directory
+
+
+def read_codebook(directory: Optional[str] = None) -> Dict[str, Any]:
+    """The codebook of an array export"""
+    with open(os.path.join(directory or array_export_directory(), codebook_file)) as file:
+        return json.load(file)
+
+
+def load_arrays(table: str, directory: Optional[str] = None) -> Dict[str, np.ndarray]:
+    """
+    Memory-maps the arrays of a table of an array export, which reads no data until it is accessed
+
+    Args:
+        table: individuals or households
+        directory: Defaults to `array_export_directory()`
+
+    Returns:
+        Array by column
+    """
+    directory = directory or array_export_directory()
+    return {column: np.load(os.path.join(directory, table, f'{column}.npy'), mmap_mode='r')
+            for column in read_codebook(directory)[table]['columns']}
+
+
+def decode(array: np.ndarray, entry: Dict[str, Any]) -> np.ndarray:
+    """
+    The values of a column of an array export, e.g., `decode(arrays['gender'], codebook['individuals']['columns']
+    ['gender'])`
+
+    Args:
+        array: As returned by `load_arrays`
+        entry: Codebook entry of the column
+
+    Returns:
+
+    """
+    if entry['kind'] == 'category':
+        values = np.array(entry['values'] + [None], dtype=object)
+        return values[array]
+    if entry['kind'] == 'bytes':
+        return np.char.decode(array, 'utf-8')
+    return np.asarray(array)
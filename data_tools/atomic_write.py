@@ -0,0 +1,55 @@
+import contextlib
+import os
+import shutil
+from typing import Iterator
+
+
+@contextlib.contextmanager
+def atomic_write(path: str) -> Iterator[str]:
+    """
+    Yields a temporary path next to `path` to write a file or a directory to, which replaces `path` when the block
+    exits without an error, e.g.:
+
+        with atomic_write(cache_path) as tmp_path:
+            df.to_pickle(tmp_path)
+
+    A file is replaced in one `os.replace`, so readers see either the old or the new file, and never a partially written
+    one. A directory cannot be replaced in one step while it exists: the old directory is moved aside first, and
+    removed after the new one is moved in. Readers never see a partially written directory, but can briefly find no
+    directory at `path` between the two moves.
+
+    If the block raises, whatever was written to the temporary path is removed, and `path` is left as it was.
+
+    Args:
+        path: File or directory to write. Its parent directory is created if it does not exist
+
+    Returns:
+
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    _remove(tmp_path)
+
+    try:
+        yield tmp_path
+    except BaseException:
+        _remove(tmp_path)
+        raise
+
+    if not os.path.isdir(tmp_path):
+        os.replace(tmp_path, path)
+        return
+
+    old_path = f'{path}.{os.getpid()}.old'
+    _remove(old_path)
+    if os.path.lexists(path):
+        os.replace(path, old_path)
+    os.replace(tmp_path, path)
+    _remove(old_path)
+
+
+def _remove(path: str) -> None:
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.lexists(path):
+        os.remove(path)
@@ -0,0 +1,145 @@
+from typing import Any, Dict, Hashable, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from data_tools.datasources import final_population_paths
+
+# Columns with more distinct values than this (e.g., IDs) are not indexed
+max_index_values = 256
+
+# Number of set bits in each byte, to count the set bits of a bitmap
+_byte_popcounts = np.unpackbits(np.arange(256, dtype=np.uint8)[:, np.newaxis], axis=1).sum(axis=1)
+
+
+class BitmapIndex:
+    """
+    Index of the agents (or households) with each value of each categorical attribute, stored as one bitmap per value
+    with a bit per row. Filters that combine attributes are answered with bitwise operations on the bitmaps, without
+    scanning the columns, e.g., the NonWestern women aged 25-45 with a car license in BU05183284:
+
+    ```
+    index = BitmapIndex(df_synth_pop)
+    conditions = dict(neighb_code='BU05183284', gender='female', age_group='25-45',
+                      migration_background='NonWestern', car_license='yes')
+    index.count(**conditions)
+    index.ids(**conditions)
+    ```
+
+    A condition is a value, or a list of values of which any may match. Conditions on different attributes must all
+    match.
+    """
+
+    def __init__(self, df: pd.DataFrame, id_column: str = 'agent_id', columns: Optional[List[str]] = None):
+        """
+        Args:
+            df: Synthetic population or households
+            id_column: Column with the IDs returned by `ids`
+            columns: Columns to index. Defaults to all columns with at most `max_index_values` distinct values
+        """
+        self.n_rows = len(df)
+        self.row_ids = df[id_column].to_numpy()
+        self.bitmaps: Dict[str, Dict[Hashable, np.ndarray]] = dict()
+
+        if columns is None:
+            columns = [column for column in df.columns
+                       if column != id_column and df[column].nunique(dropna=False) <= max_index_values]
+        for column in columns:
+            self.bitmaps[column] = self._build_bitmaps(df[column])
+
+    def _build_bitmaps(self, s: pd.Series) -> Dict[Hashable, np.ndarray]:
+        codes, values = pd.factorize(s, sort=True)
+
+        # Sorting the rows by value once gives the rows of every value, instead of comparing the column to each value
+        order = np.argsort(codes, kind='stable')
+        bounds = np.searchsorted(codes[order], np.arange(len(values) + 1))
+
+        bitmaps = dict()
+        for code, value in enumerate(values):
+            bits = np.zeros(self.n_rows, dtype=bool)
+            bits[order[bounds[code]:bounds[code + 1]]] = True
+            bitmaps[value] = np.packbits(bits, bitorder='little')
+        return bitmaps
+
+    @property
+    def columns(self) -> List[str]:
+        """The indexed columns"""
+        return list(self.bitmaps)
+
+    def values(self, column: str) -> List[Any]:
+        """The values of an indexed column"""
+        return list(self.bitmaps[column])
+
+    def bitmap(self, **conditions: Any) -> np.ndarray:
+        """
+        The bitmap of the rows that match all conditions, packed in bytes with the first row in the lowest bit
+
+        Args:
+            **conditions: Value, or list of values, by column
+
+        Returns:
+
+        """
+        result = np.full((self.n_rows + 7) // 8, 0xff, dtype=np.uint8)
+        for column, condition in conditions.items():
+            assert column in self.bitmaps, f"{column} is not indexed, indexed columns are {', '.join(self.columns)}"
+            values = condition if _is_value_list(condition) else [condition]
+
+            any_value = np.zeros_like(result)
+            for value in values:
+                if value in self.bitmaps[column]:
+                    any_value |= self.bitmaps[column][value]
+            result &= any_value
+
+        # Clear the padding bits after the last row
+        if self.n_rows % 8:
+            result[-1] &= (1 << (self.n_rows % 8)) - 1
+        return result
+
+    def mask(self, **conditions: Any) -> np.ndarray:
+        """Boolean mask of the rows that match all conditions, e.g., to select them from the data frame"""
+        return np.unpackbits(self.bitmap(**conditions), count=self.n_rows, bitorder='little').astype(bool)
+
+    def count(self, **conditions: Any) -> int:
+        """Number of rows that match all conditions"""
+        return int(_byte_popcounts[self.bitmap(**conditions)].sum())
+
+    def ids(self, **conditions: Any) -> np.ndarray:
+        """IDs of the rows that match all conditions, in the order of the data frame"""
+        return self.row_ids[np.flatnonzero(self.mask(**conditions))]
+
+    def counts_by(self, column: str, **conditions: Any) -> pd.Series:
+        """
+        Number of rows that match all conditions, for each value of `column`
+
+        Args:
+            column: An indexed column
+            **conditions:
+
+        Returns:
+            Counts indexed by the values of `column`
+        """
+        selection = self.bitmap(**conditions)
+        return pd.Series({value: int(_byte_popcounts[selection & bitmap].sum())
+                          for value, bitmap in self.bitmaps[column].items()}, name='count').rename_axis(column)
+
+
+def _is_value_list(condition: Any) -> bool:
+    return isinstance(condition, Iterable) and not isinstance(condition, (str, bytes, tuple))
+
+
+def read_final_indexes(version: int = 10) -> Dict[str, BitmapIndex]:
+    """
+    Indexes of the final individuals and households of `generate_households.py`
+
+    Args:
+        version: Stage of the household pipeline to read
+
+    Returns:
+        The index of the individuals and of the households
+    """
+    paths = final_population_paths(version)
+    return dict(
+        individuals=BitmapIndex(pd.read_pickle(paths['individuals']), 'agent_id'),
+        households=BitmapIndex(pd.read_pickle(paths['households']), 'household_id'),
+    )
@@ -0,0 +1,116 @@
+import re
+from typing import Callable, Hashable, Iterable, Optional
+
+import pandas as pd
+
+# Applied in order. Each label matches at most one of the patterns, because the replacement no longer contains "jaar"
+cbs_age_label_patterns = [
+    (re.compile(r'(\d+) jaar of ouder'), r'\1+'),
+    (re.compile(r'jonger dan (\d+) jaar', flags=re.IGNORECASE), r'<\1'),
+    (re.compile(r'(\d+) tot (\d+) jaar'), r'\1-\2'),
+    (re.compile(r'(\d+) jaar'), r'\1'),
+]
+
+cbs_integer_age_pattern = re.compile(r'(\d+)')
+
+
+def read_cbs_csv(path: str, decimal: str = '.', thousands: Optional[str] = None,
+                 numeric_columns: Optional[Iterable[str]] = None, **kwargs) -> pd.DataFrame:
+    """
+    Reads a CSV file as downloaded from CBS StatLine, decoding Dutch number formats while the file is parsed.
+
+    Args:
+        path: Path to the CSV file
+        decimal: Character used as decimal separator in the file, e.g. ','
+        thousands: Character used as thousands separator in the file, e.g. ' '
+        numeric_columns: Columns that should be numeric. If the CSV parser could not convert them (for example because
+            the thousands separator is only used in some of the rows), they are converted with `cbs_numeric`
+        **kwargs: Passed on to `pd.read_csv`
+
+    Returns:
+
+    """
+    kwargs.setdefault('sep', ';')
+    df = pd.read_csv(path, decimal=decimal, thousands=thousands, **kwargs)
+
+    for column in numeric_columns or []:
+        df[column] = cbs_numeric(df[column], decimal=decimal, thousands=thousands)
+
+    return df
+
+
+def cbs_numeric(values: pd.Series, decimal: str = '.', thousands: Optional[str] = None) -> pd.Series:
+    """
+    Converts a column of numbers formatted as text (e.g., "104 512" or "12,5") to a numeric column.
+    Columns that are already numeric are returned unchanged.
+
+    Args:
+        values:
+        decimal: Character used as decimal separator
+        thousands: Character used as thousands separator
+
+    Returns:
+
+    """
+    if pd.api.types.is_numeric_dtype(values):
+        return values
+
+    values = values.astype(str)
+    if thousands is not None:
+        values = values.str.replace(thousands, '', regex=False)
+    if decimal != '.':
+        values = values.str.replace(decimal, '.', regex=False)
+
+    return pd.to_numeric(values)
+
+
+def map_categories(values: pd.Series, transform: Callable[[pd.Index], Iterable[Hashable]]) -> pd.Series:
+    """
+    Applies `transform` to the unique values of `values` only, and maps the result back onto the full column.
+
+    Args:
+        values:
+        transform: Takes an Index with the unique values, and returns the transformed values in the same order
+
+    Returns:
+
+    """
+    uniques = pd.Index(values.unique())
+    return values.map(dict(zip(uniques, transform(uniques))))
+
+
+def cbs_age_labels(values: pd.Series) -> pd.Series:
+    """
+    Vectorized equivalent of `data_tools.dynamic_mappers.cbs_age_group_rename_transform`, i.e.:
+        "95 jaar of ouder" -> "95+"
+        "Jonger dan 5 jaar" -> "<5"
+        "15 tot 20 jaar" -> "15-20"
+        "16 jaar" -> "16"
+
+    Args:
+        values:
+
+    Returns:
+
+    """
+
+    def rename(labels: pd.Index) -> pd.Index:
+        labels = labels.astype(str)
+        for pattern, replacement in cbs_age_label_patterns:
+            labels = labels.str.replace(pattern, replacement, regex=True)
+        return labels
+
+    return map_categories(values, rename)
+
+
+def cbs_integer_ages(values: pd.Series) -> pd.Series:
+    """
+    Converts labels such as "16 jaar" to the integer 16
+
+    Args:
+        values:
+
+    Returns:
+
+    """
+    return values.astype(str).str.extract(cbs_integer_age_pattern, expand=False).astype(int)
@@ -0,0 +1,69 @@
+import os
+from typing import Optional, Sequence
+
+import pandas as pd
+
+# Formats the stages of the pipelines can store their results in. Only pkl and parquet are read back, as the CSV files
+# do not keep the data types
+checkpoint_formats = ['pkl', 'csv', 'parquet']
+readable_checkpoint_formats = ['pkl', 'parquet']
+default_checkpoint_formats = ['pkl', 'csv']
+
+
+def checkpoint_exists(template: str, version: int) -> bool:
+    """
+    True if the result of stage `version` was stored in a readable format
+
+    Args:
+        template: Output template with the fields `version` and `extension`
+        version:
+
+    Returns:
+
+    """
+    return any(os.path.exists(template.format(version=version, extension=extension))
+               for extension in readable_checkpoint_formats)
+
+
+def read_checkpoint(template: str, version: int) -> Optional[pd.DataFrame]:
+    """
+    The stored result of stage `version`, or None if it was not stored in a readable format
+
+    Args:
+        template: Output template with the fields `version` and `extension`
+        version:
+
+    Returns:
+
+    """
+    for extension in readable_checkpoint_formats:
+        path = template.format(version=version, extension=extension)
+        if os.path.exists(path):
+            return pd.read_pickle(path) if extension == 'pkl' else pd.read_parquet(path)
+    return None
+
+
+def write_checkpoint(df: pd.DataFrame, template: str, version: int,
+                     formats: Sequence[str] = tuple(default_checkpoint_formats)):
+    """
+    Stores the result of stage `version` in each of `formats`
+
+    Args:
+        df:
+        template: Output template with the fields `version` and `extension`
+        version:
+        formats: See `checkpoint_formats`
+
+    Returns:
+
+    """
+    assert set(formats) <= set(checkpoint_formats), f"Unknown checkpoint formats {set(formats) - set(checkpoint_formats)}"
+    os.makedirs(os.path.dirname(template), exist_ok=True)
+    for extension in formats:
+        path = template.format(version=version, extension=extension)
+        if extension == 'pkl':
+            df.to_pickle(path)
+        elif extension == 'csv':
+            df.to_csv(path)
+        else:
+            df.to_parquet(path)
@@ -0,0 +1,281 @@
+import json
+import os
+from typing import Dict, List, Optional
+
+repository_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Environment variables that point the readers to another copy of the data, e.g., the synthetic fixtures of the
+# benchmark suite (see `benchmarks.fixtures`). Without them, the data in this repository is read.
+datasources_environment_variable = 'SYNTHPOP_DATASOURCES'
+processed_environment_variable = 'SYNTHPOP_PROCESSED'
+neighborhoods_environment_variable = 'SYNTHPOP_NEIGHBORHOODS'
+
+# Environment variable that switches on the preview mode, in which all neighborhood margins are scaled by a fraction
+# (see `attributes.marginal_data_reader.read_marginal_data`) and all output is written to a separate directory
+preview_environment_variable = 'SYNTHPOP_PREVIEW_FRACTION'
+
+# Environment variables of a run of one region (see `run_regions.py`): the municipality whose joint distributions are
+# read, the directory all output is written to, and the name of the region in the names of the generated files
+municipality_environment_variable = 'SYNTHPOP_MUNICIPALITY'
+output_environment_variable = 'SYNTHPOP_OUTPUT'
+region_name_environment_variable = 'SYNTHPOP_REGION_NAME'
+# Set by a run of which the configuration allows the data of 's-Gravenhage to replace missing municipal data (see
+# `check_municipal_datasources`)
+municipal_fallback_environment_variable = 'SYNTHPOP_MUNICIPAL_FALLBACK'
+
+# The joint distributions in the datasources directory are those of 's-Gravenhage, for the neighborhoods of The Hague
+# South-West (DHWZ). The joints of other municipalities are read from datasources/municipalities/{municipality}/
+default_municipality = 'GM0518'
+default_region_name = 'DHWZ'
+municipalities_directory = 'municipalities'
+
+# Data sets in the datasources directory that cover the whole country, and thus have no municipal counterpart
+national_datasources = ['marginal', os.path.join('household', 'postal_code')]
+
+# Attribute modules with joints prepared for 's-Gravenhage in their processed directory (see `processed_path`)
+prepared_joint_modules = [os.path.join('attributes', 'individual', 'education'),
+                          os.path.join('attributes', 'individual', 'household_position')]
+
+# Name of the file in the output directory of a region that lists the data of 's-Gravenhage its run used instead of
+# missing municipal data (see `check_municipal_datasources`)
+municipal_fallback_file = 'municipal_fallback.json'
+
+
+def datasource_path(*parts: str) -> str:
+    """
+    Path of a file in the datasources directory, e.g., `datasource_path('marginal', 'marginal_distributions.csv')`.
+    The directory can be replaced by setting the environment variable `SYNTHPOP_DATASOURCES`.
+
+    When the environment variable `SYNTHPOP_MUNICIPALITY` selects another municipality than 's-Gravenhage, the file is
+    read from datasources/municipalities/{municipality}/... if it exists there (see `municipal_path`).
+
+    Args:
+        *parts: Path relative to the datasources directory
+
+    Returns:
+
+    """
+    return municipal_path(datasources_directory(), *parts)
+
+
+def datasources_directory() -> str:
+    """The datasources directory, or the directory given by `SYNTHPOP_DATASOURCES`"""
+    return os.environ.get(datasources_environment_variable) or os.path.join(repository_directory, 'datasources')
+
+
+def selected_municipality() -> str:
+    """The municipality whose joint distributions are read, set by `SYNTHPOP_MUNICIPALITY` (default: 's-Gravenhage)"""
+    return os.environ.get(municipality_environment_variable) or default_municipality
+
+
+def municipality_of(neighb_code: str) -> str:
+    """CBS code of the municipality of a neighborhood, e.g., GM0518 for BU05181785"""
+    return f'GM{neighb_code[2:6]}'
+
+
+def municipal_path(directory: str, *parts: str) -> str:
+    """
+    Path of a file of the selected municipality (see `selected_municipality`):
+    {directory}/municipalities/{municipality}/{parts} if it exists, else {directory}/{parts}, i.e., the data of
+    's-Gravenhage or a national data set.
+
+    Args:
+        directory: The datasources or a processed directory
+        *parts: Path relative to `directory`
+
+    Returns:
+
+    """
+    municipality = selected_municipality()
+    if municipality != default_municipality:
+        path = os.path.join(directory, municipalities_directory, municipality, *parts)
+        if os.path.exists(path):
+            return path
+    return os.path.join(directory, *parts)
+
+
+def missing_municipal_datasources(municipality: str) -> List[str]:
+    """
+    The data sets and prepared joints of 's-Gravenhage that `municipality` has no counterpart of in
+    datasources/municipalities/ or processed/municipalities/, and that would thus be read for it instead. National data
+    sets (see `national_datasources`) are left out.
+
+    Args:
+        municipality: CBS municipality code, e.g., GM0363
+
+    Returns:
+        Paths relative to the datasources directory, and of the prepared joints, relative to the processed root (the
+        repository, or `SYNTHPOP_PROCESSED`)
+    """
+    if municipality == default_municipality:
+        return list()
+
+    missing = [path for path in _files_without_municipal_counterpart(datasources_directory(), municipality)
+               if not any(path.startswith(national + os.sep) for national in national_datasources)]
+
+    processed_root = os.environ.get(processed_environment_variable) or repository_directory
+    for module_directory in prepared_joint_modules:
+        directory = os.path.join(processed_root, module_directory, 'processed')
+        missing += [os.path.join(module_directory, 'processed', path)
+                    for path in _files_without_municipal_counterpart(directory, municipality)]
+    return sorted(missing)
+
+
+def check_municipal_datasources(municipality: str, allow_fallback: bool = False,
+                                output_directory_of_run: Optional[str] = None) -> List[str]:
+    """
+    Makes sure the joint distributions of `municipality` are not silently replaced by those of 's-Gravenhage (see
+    `missing_municipal_datasources`). Without `allow_fallback` (or the environment variable
+    `SYNTHPOP_MUNICIPAL_FALLBACK`), a municipality with missing data raises an error. With it, the data of
+    's-Gravenhage is used, and the files it is used for are recorded in
+    {output_directory_of_run}/municipal_fallback.json.
+
+    Args:
+        municipality: CBS municipality code, e.g., GM0363
+        allow_fallback: Use the data of 's-Gravenhage where the municipal data is missing
+        output_directory_of_run: Output directory of the run of `municipality`
+
+    Returns:
+        The missing data sets
+
+    Raises:
+        FileNotFoundError: If data of `municipality` is missing, and `allow_fallback` is False
+    """
+    allow_fallback = allow_fallback or bool(os.environ.get(municipal_fallback_environment_variable))
+    missing = missing_municipal_datasources(municipality)
+    if missing and not allow_fallback:
+        raise FileNotFoundError(f"{municipality} has no municipal data for {', '.join(missing)}. Add it to "
+                                f"datasources/municipalities/{municipality} (or the processed directories), or allow "
+                                f"the data of 's-Gravenhage to be used instead")
+
+    if missing:
+        print(f"{municipality}: no municipal data for {', '.join(missing)}, the data of 's-Gravenhage is used")
+    if missing and output_directory_of_run is not None:
+        os.makedirs(output_directory_of_run, exist_ok=True)
+        with open(os.path.join(output_directory_of_run, municipal_fallback_file), 'w') as file:
+            json.dump(dict(municipality=municipality, used_municipality=default_municipality, datasources=missing),
+                      file, indent=1)
+    return missing
+
+
+def _files_without_municipal_counterpart(directory: str, municipality: str) -> List[str]:
+    # The files in `directory` (outside its municipalities directory) that are not in municipalities/{municipality}
+    missing = list()
+    for root, directories, files in os.walk(directory):
+        relative_root = os.path.relpath(root, directory)
+        if relative_root.split(os.sep)[0] == municipalities_directory:
+            directories.clear()
+            continue
+        for file in files:
+            relative_path = os.path.normpath(os.path.join(relative_root, file))
+            if not os.path.exists(os.path.join(directory, municipalities_directory, municipality, relative_path)):
+                missing.append(relative_path)
+    return missing
+
+
+def processed_path(module_file: str, *parts: str) -> str:
+    """
+    Path of a file in the `processed` directory next to an attribute module, e.g.,
+    `processed_path(__file__, 'prepared_absolved_education.pkl')`.
+
+    With the environment variable `SYNTHPOP_PROCESSED`, the directory is moved to the same relative location under
+    that directory instead, i.e., {SYNTHPOP_PROCESSED}/attributes/individual/education/processed/...
+
+    Like the data sources, the processed joints of another municipality than 's-Gravenhage are read from (and written
+    to) processed/municipalities/{municipality}/... (see `municipal_path`), once that directory exists.
+
+    Args:
+        module_file: `__file__` of the module
+        *parts: Path relative to the processed directory
+
+    Returns:
+
+    """
+    directory = os.path.dirname(os.path.abspath(module_file))
+    root = os.environ.get(processed_environment_variable)
+    if root:
+        directory = os.path.join(root, os.path.relpath(directory, repository_directory))
+    return municipal_path(os.path.join(directory, 'processed'), *parts)
+
+
+def selected_neighborhood_codes(default: List[str]) -> List[str]:
+    """
+    The neighborhoods to synthesize, i.e., `default` unless the environment variable `SYNTHPOP_NEIGHBORHOODS` gives a
+    comma separated list of CBS neighborhood codes
+
+    Args:
+        default:
+
+    Returns:
+
+    """
+    codes = os.environ.get(neighborhoods_environment_variable)
+    if not codes:
+        return list(default)
+    return [code.strip() for code in codes.split(',') if code.strip()]
+
+
+def preview_fraction() -> Optional[float]:
+    """
+    The fraction the neighborhood margins are scaled by in preview mode, or None outside preview mode
+
+    Returns:
+
+    """
+    fraction = os.environ.get(preview_environment_variable)
+    if not fraction:
+        return None
+    fraction = float(fraction)
+    assert 0 < fraction <= 1, f"{preview_environment_variable} should be a fraction in (0, 1], got {fraction}"
+    return fraction
+
+
+def output_path(*parts: str) -> str:
+    """
+    Path of a file in the output directory, e.g., `output_path('scores', 'store')`. In preview mode, the output of the
+    preview with fraction 0.01 is written to output/preview_0.01/... instead, so a preview never overwrites (or reuses)
+    the output of a full run.
+
+    The output directory can be replaced by setting the environment variable `SYNTHPOP_OUTPUT`, as the runs of the
+    regions of a run configuration do (see `run_regions.py`).
+
+    Args:
+        *parts: Path relative to the output directory
+
+    Returns:
+
+    """
+    fraction = preview_fraction()
+    return os.path.join(output_directory() if fraction is None else preview_output_directory(fraction), *parts)
+
+
+def preview_output_directory(fraction: float) -> str:
+    """Output directory of the preview with `fraction`, e.g., output/preview_0.01"""
+    return os.path.join(output_directory(), f'preview_{fraction:g}')
+
+
+def output_directory() -> str:
+    """The output directory, or the directory given by `SYNTHPOP_OUTPUT`"""
+    return os.environ.get(output_environment_variable) or 'output'
+
+
+def final_population_paths(version: int = 10) -> Dict[str, str]:
+    """
+    Paths of the pickles of the individuals and households after the last stage of `generate_households.py`
+
+    Args:
+        version: Stage of the household pipeline
+
+    Returns:
+        Path by name (individuals, households)
+    """
+    directory = output_path('synthetic_population', 'with_households')
+    return dict(
+        individuals=os.path.join(directory, 'individuals', f'synth_pop_{region_name()}_v{version}.pkl'),
+        households=os.path.join(directory, 'households', f'synth_households_{region_name()}_v{version}.pkl'),
+    )
+
+
+def region_name() -> str:
+    """Name of the synthesized region in the names of the generated files, set by `SYNTHPOP_REGION_NAME`"""
+    return os.environ.get(region_name_environment_variable) or default_region_name
@@ -1,13 +1,8 @@
-import re
+from data_tools.cbs_parsing import cbs_age_label_patterns
 
 
 def cbs_age_group_rename_transform(row_value):
-    # return "95+" if "of ouder" in row_value else re.sub(r'(\d+) tot (\d+) jaar', r'\1-\2', row_value)
-    if "of ouder" in row_value:
-        return re.sub(r'(\d+) jaar of ouder', r'\1+', row_value)
-    elif "jonger dan" in row_value.lower():
-        return re.sub(r'jonger dan (\d+) jaar', r'<\1', row_value, flags=re.IGNORECASE)
-    elif "tot" in row_value:
-        return re.sub(r'(\d+) tot (\d+) jaar', r'\1-\2', row_value)
-    else:
-        return re.sub(r'(\d+) jaar', r'\1', row_value)
+    # Single value version of `data_tools.cbs_parsing.cbs_age_labels`, which should be preferred for entire columns
+    for pattern, replacement in cbs_age_label_patterns:
+        row_value = pattern.sub(replacement, row_value)
+    return row_value
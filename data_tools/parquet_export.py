@@ -0,0 +1,129 @@
+import os
+from typing import Dict, List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from data_tools.atomic_write import atomic_write
+from data_tools.datasources import output_path
+
+# Identifiers are unique per agent or household, so they are not stored as categories
+id_columns = ['agent_id', 'household_id']
+
+# Columns with at most this many distinct values (relative to the number of rows) are stored as categories
+max_category_fraction = 0.5
+
+# Row groups are the unit of the column statistics (min, max, null count) that filters are checked against
+row_group_size = 64 * 1024
+
+
+def export_directory() -> str:
+    """Directory of the exported datasets, output/synthetic_population/export"""
+    return output_path('synthetic_population', 'export')
+
+
+def to_categorical(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Converts the string columns with few distinct values (see `max_category_fraction`) to categories, which Parquet
+    stores dictionary encoded, and which are read back as categories
+
+    Args:
+        df:
+
+    Returns:
+
+    """
+    df = df.copy()
+    for column in df.columns:
+        if column in id_columns or not (pd.api.types.is_object_dtype(df[column]) or
+                                        pd.api.types.is_string_dtype(df[column])):
+            continue
+        if df[column].nunique() <= max(1, max_category_fraction * len(df)):
+            df[column] = df[column].astype('category')
+    return df
+
+
+def write_partitioned(df: pd.DataFrame, directory: str, partition_columns: List[str]) -> str:
+    """
+    Writes `df` as a Parquet dataset with a directory per value of `partition_columns`, e.g.,
+    {directory}/neighb_code=BU05181785/part-0.parquet, replacing the dataset that was there.
+
+    Within each partition the rows are sorted by the partition columns and the ID column, and every row group stores
+    the minimum and maximum of each column, so readers can skip partitions and row groups that do not match a filter.
+
+    Args:
+        df:
+        directory:
+        partition_columns:
+
+    Returns:
+        `directory`
+    """
+    sort_columns = partition_columns + [column for column in id_columns if column in df.columns][:1]
+    df = to_categorical(df.sort_values(sort_columns, kind='stable').reset_index(drop=True))
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    with atomic_write(directory) as tmp_directory:
+        ds.write_dataset(
+                table,
+                tmp_directory,
+                format='parquet',
+                partitioning=ds.partitioning(table.select(partition_columns).schema, flavor='hive'),
+                file_options=ds.ParquetFileFormat().make_write_options(compression='zstd', write_statistics=True),
+                max_rows_per_group=row_group_size,
+                min_rows_per_group=min(row_group_size, max(1, len(df))),
+                basename_template='part-{i}.parquet',
+        )
+
+    return directory
+
+
+def export_population(df_synth_pop: pd.DataFrame, df_synth_households: pd.DataFrame, by_postal_code: bool = False,
+                      directory: Optional[str] = None) -> Dict[str, str]:
+    """
+    Exports the final individuals and households as Parquet datasets partitioned by neighborhood, and optionally by
+    postal code within each neighborhood, for simulations that only need some neighborhoods (see `read_exported`).
+
+    The individuals get the postal code of their household when partitioning by postal code.
+
+    Args:
+        df_synth_pop:
+        df_synth_households:
+        by_postal_code: Partition by `neighb_code` and `PC6` instead of `neighb_code` only
+        directory: Defaults to `export_directory()`
+
+    Returns:
+        Directory of each dataset, by name (individuals, households)
+    """
+    directory = directory or export_directory()
+    partition_columns = ['neighb_code', 'PC6'] if by_postal_code else ['neighb_code']
+
+    if by_postal_code and 'PC6' not in df_synth_pop.columns:
+        df_synth_pop = df_synth_pop.merge(df_synth_households[['household_id', 'PC6']], on='household_id', how='left')
+
+    os.makedirs(directory, exist_ok=True)
+    return {
+        name: write_partitioned(df, os.path.join(directory, name), partition_columns)
+        for name, df in [('individuals', df_synth_pop), ('households', df_synth_households)]
+    }
+
+
+def read_exported(name: str, columns: Optional[List[str]] = None, filters: Optional[List[tuple]] = None,
+                  directory: Optional[str] = None) -> pd.DataFrame:
+    """
+    Reads (part of) an exported dataset. Filters on the partition columns only open the matching partitions, and
+    filters on other columns skip the row groups of which the statistics rule out a match, e.g.,
+    `read_exported('individuals', filters=[('neighb_code', 'in', ['BU05181785']), ('gender', '==', 'female')])`
+
+    Args:
+        name: individuals or households
+        columns: Defaults to all columns
+        filters: Conjunction of (column, operator, value) filters, as accepted by `pandas.read_parquet`
+        directory: Defaults to `export_directory()`
+
+    Returns:
+
+    """
+    path = os.path.join(directory or export_directory(), name)
+    return pd.read_parquet(path, engine='pyarrow', columns=columns, filters=filters)
@@ -0,0 +1,196 @@
+import argparse
+import functools
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+from data_tools.bitmap_index import BitmapIndex
+from data_tools.datasources import final_population_paths
+
+id_columns = dict(individuals='agent_id', households='household_id')
+
+# Query parameters that are not filters on an attribute
+reserved_parameters = ['table', 'by', 'n', 'seed', 'columns']
+
+default_port = 8765
+
+max_sample_size = 10_000
+
+
+class PopulationService:
+    """
+    Answers queries on the final population, which is loaded into memory once:
+        - counts: the number of agents or households of each combination of the `by` attributes
+        - sample: a random sample of the agents or households
+
+    Both take filters on the attributes, i.e., a value or a list of values by attribute, which are matched with the
+    bitmap indexes of the tables (see `data_tools.bitmap_index`). The counts of the most recent queries are cached.
+    """
+
+    def __init__(self, tables: Dict[str, pd.DataFrame], cache_size: int = 256):
+        """
+        Args:
+            tables: The individuals and households, by name
+            cache_size: Number of count queries that are cached
+        """
+        self.tables = tables
+        self.indexes = {name: BitmapIndex(df, id_columns[name]) for name, df in tables.items()}
+        self.counts = functools.lru_cache(maxsize=cache_size)(self._counts)
+
+    def attributes(self) -> Dict[str, Dict[str, Any]]:
+        """The columns of each table, with the values of the indexed columns"""
+        return {
+            name: {column: [_to_json(value) for value in self.indexes[name].values(column)]
+                   if column in self.indexes[name].columns else None for column in df.columns}
+            for name, df in self.tables.items()
+        }
+
+    def mask(self, table: str, filters: Tuple[Tuple[str, Tuple[str, ...]], ...]) -> np.ndarray:
+        """
+        Boolean mask of the rows of `table` that match all filters
+
+        Args:
+            table: individuals or households
+            filters: Values by attribute, as strings (as they occur in a query string)
+
+        Returns:
+
+        """
+        df = self.tables[table]
+        index = self.indexes[table]
+        indexed = dict()
+        mask = np.ones(len(df), dtype=bool)
+        for column, values in filters:
+            assert column in df.columns, f"{table} has no attribute {column}"
+            values = _parse_values(df[column], values)
+            if column in index.columns:
+                indexed[column] = values
+            else:
+                mask &= df[column].isin(values).to_numpy()
+        return mask & index.mask(**indexed) if indexed else mask
+
+    def _counts(self, table: str, by: Tuple[str, ...], filters: Tuple[Tuple[str, Tuple[str, ...]], ...]
+                ) -> List[Dict[str, Any]]:
+        df = self.tables[table][self.mask(table, filters)]
+        if not by:
+            return [dict(count=len(df))]
+        s_counts = df.groupby(list(by), observed=True).size()
+        return [dict(zip(by, map(_to_json, key if isinstance(key, tuple) else (key,))), count=int(count))
+                for key, count in s_counts.items()]
+
+    def sample(self, table: str, n: int, seed: int, columns: Tuple[str, ...],
+               filters: Tuple[Tuple[str, Tuple[str, ...]], ...]) -> List[Dict[str, Any]]:
+        """
+        A random sample of at most `n` rows of `table` that match all filters
+
+        Args:
+            table:
+            n:
+            seed: The same seed gives the same sample
+            columns: Defaults to all columns
+            filters:
+
+        Returns:
+            The sampled rows
+        """
+        rows = np.flatnonzero(self.mask(table, filters))
+        rows = np.sort(np.random.default_rng(seed).choice(rows, min(n, len(rows), max_sample_size), replace=False))
+        df = self.tables[table].iloc[rows]
+        if columns:
+            df = df[list(columns)]
+        return [{column: _to_json(value) for column, value in row.items()} for row in df.to_dict('records')]
+
+    def handle(self, path: str, query: Dict[str, List[str]]) -> Any:
+        """
+        Answers a request, e.g., /counts?table=households&by=neighb_code,small_hh_type&neighb_code=BU05181785
+
+        Args:
+            path: /attributes, /counts or /sample
+            query: Parsed query string
+
+        Returns:
+            The JSON serializable answer
+        """
+        if path == '/attributes':
+            return self.attributes()
+
+        table = query.get('table', ['individuals'])[0]
+        assert table in self.tables, f"Unknown table {table}, the tables are {', '.join(self.tables)}"
+        filters = tuple(sorted((column, tuple(values)) for column, values in query.items()
+                               if column not in reserved_parameters))
+
+        if path == '/counts':
+            by = tuple(column for column in query.get('by', [''])[0].split(',') if column)
+            return self.counts(table, by, filters)
+        if path == '/sample':
+            columns = tuple(column for column in query.get('columns', [''])[0].split(',') if column)
+            return self.sample(table, int(query.get('n', ['100'])[0]), int(query.get('seed', ['0'])[0]), columns,
+                               filters)
+        raise KeyError(path)
+
+
+def _parse_values(s: pd.Series, values: Tuple[str, ...]) -> List[Any]:
+    # Query strings only contain strings, so the values of numeric attributes are converted to numbers
+    values = [value for item in values for value in item.split(',')]
+    if pd.api.types.is_numeric_dtype(s):
+        return pd.to_numeric(pd.Series(values)).tolist()
+    return values
+
+
+def _to_json(value: Any) -> Any:
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    return value
+
+
+def make_handler(service: PopulationService) -> type:
+    """HTTP request handler that answers GET requests with `service`, as JSON"""
+
+    class PopulationRequestHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            start = time.perf_counter()
+            try:
+                status, answer = 200, service.handle(url.path, parse_qs(url.query))
+            except KeyError as error:
+                status, answer = 404, dict(error=f"Unknown path or attribute {error}")
+            except (AssertionError, ValueError) as error:
+                status, answer = 400, dict(error=str(error))
+
+            body = json.dumps(answer).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('Server-Timing', f'query;dur={1000 * (time.perf_counter() - start):.1f}')
+            self.end_headers()
+            self.wfile.write(body)
+
+    return PopulationRequestHandler
+
+
+def read_final_population(version: int = 10) -> Dict[str, pd.DataFrame]:
+    """The final individuals and households of `generate_households.py`, by name"""
+    return {name: pd.read_pickle(path) for name, path in final_population_paths(version).items()}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serves counts and samples of the final synthetic population on a "
+                                                 "local port")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=default_port)
+    parser.add_argument('--version', type=int, default=10, help="Stage of the household pipeline to serve")
+    parser.add_argument('--cache-size', type=int, default=256, help="Number of count queries that are cached")
+    arguments = parser.parse_args()
+
+    population_service = PopulationService(read_final_population(arguments.version), arguments.cache_size)
+    server = ThreadingHTTPServer((arguments.host, arguments.port), make_handler(population_service))
+    print(f"Serving the synthetic population on http://{arguments.host}:{arguments.port}, e.g., "
+          f"/counts?table=households&by=neighb_code")
+    server.serve_forever()
@@ -0,0 +1,174 @@
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from data_tools.datasources import output_path
+
+
+def postcode_index_path() -> str:
+    """Path of the postcode index of the final households, output/synthetic_population/postcode_index.npz"""
+    return output_path('synthetic_population', 'postcode_index.npz')
+
+
+class PostcodeIndex:
+    """
+    Index of the households and their members by postal code (PC6). The households are sorted by PC6, so the
+    households of each postal code, and of each range or prefix (e.g., PC4) of postal codes, are a contiguous range
+    that is found with a binary search on the sorted postal codes:
+        - households `household_offsets[p]:household_offsets[p + 1]` have postal code `postcodes[p]`
+        - members `member_offsets[h]:member_offsets[h + 1]` are the members of household `h` (in the sorted order)
+
+    Queries thus take time logarithmic in the number of postal codes, plus the size of the answer.
+    """
+
+    def __init__(self, postcodes: np.ndarray, household_offsets: np.ndarray, household_ids: np.ndarray,
+                 member_offsets: np.ndarray, agent_ids: np.ndarray):
+        self.postcodes = postcodes
+        self.household_offsets = household_offsets
+        self.household_ids = household_ids
+        self.member_offsets = member_offsets
+        self.agent_ids = agent_ids
+
+    @classmethod
+    def build(cls, df_synth_households: pd.DataFrame, df_synth_pop: pd.DataFrame) -> 'PostcodeIndex':
+        """
+        Indexes the households (with a postal code, see `add_postal_code` in `generate_households.py`) and their
+        members
+
+        Args:
+            df_synth_households: Households with the columns `household_id` and `PC6`
+            df_synth_pop: Individuals with the column `household_id`
+
+        Returns:
+
+        """
+        df_households = df_synth_households[df_synth_households.PC6.notna()]
+        household_pc6 = df_households.PC6.to_numpy().astype(str)
+        order = np.argsort(household_pc6, kind='stable')
+        household_pc6 = household_pc6[order]
+        household_ids = df_households.household_id.to_numpy().astype(str)[order]
+
+        postcodes, starts = np.unique(household_pc6, return_index=True)
+        household_offsets = np.append(starts, len(household_pc6)).astype('int64')
+
+        household_rows = pd.Series(np.arange(len(household_ids)), index=household_ids)
+        member_rows = df_synth_pop.household_id.map(household_rows)
+        df_members = df_synth_pop[member_rows.notna()]
+        member_rows = member_rows[member_rows.notna()].to_numpy(dtype='int64')
+        member_order = np.argsort(member_rows, kind='stable')
+        member_offsets = np.concatenate([[0], np.cumsum(np.bincount(member_rows, minlength=len(household_ids)))])
+
+        return cls(postcodes, household_offsets, household_ids, member_offsets.astype('int64'),
+                   df_members.agent_id.to_numpy().astype(str)[member_order])
+
+    def save(self, path: Optional[str] = None) -> str:
+        """
+        Saves the index, by default to `postcode_index_path()`
+
+        Args:
+            path:
+
+        Returns:
+            The path
+        """
+        path = path or postcode_index_path()
+        np.savez(path, postcodes=self.postcodes, household_offsets=self.household_offsets,
+                 household_ids=self.household_ids, member_offsets=self.member_offsets, agent_ids=self.agent_ids)
+        return path
+
+    @classmethod
+    def load(cls, path: Optional[str] = None) -> 'PostcodeIndex':
+        """Reads an index saved with `save`, by default from `postcode_index_path()`"""
+        with np.load(path or postcode_index_path()) as arrays:
+            return cls(**{name: arrays[name] for name in arrays.files})
+
+    def postcode_range(self, start: str, end: Optional[str] = None) -> slice:
+        """
+        The positions in `postcodes` of the postal codes from `start` up to (excluding) `end`, or of the postal codes
+        that start with `start` if `end` is None, e.g., `postcode_range('2531')` for the PC4 area 2531
+
+        Args:
+            start:
+            end:
+
+        Returns:
+
+        """
+        end = end if end is not None else start + '\uffff'
+        return slice(int(np.searchsorted(self.postcodes, start, side='left')),
+                     int(np.searchsorted(self.postcodes, end, side='left')))
+
+    def household_range(self, start: str, end: Optional[str] = None) -> slice:
+        """The positions in `household_ids` of the households in a range of postal codes (see `postcode_range`)"""
+        postcodes = self.postcode_range(start, end)
+        return slice(int(self.household_offsets[postcodes.start]), int(self.household_offsets[postcodes.stop]))
+
+    def households(self, postcodes: Optional[Iterable[str]] = None, prefix: Optional[str] = None) -> np.ndarray:
+        """
+        IDs of the households in `postcodes`, or in the postal codes that start with `prefix`
+
+        Args:
+            postcodes: PC6 codes
+            prefix: E.g., a PC4 code
+
+        Returns:
+
+        """
+        return self.household_ids[self._household_positions(postcodes, prefix)]
+
+    def members(self, postcodes: Optional[Iterable[str]] = None, prefix: Optional[str] = None) -> np.ndarray:
+        """IDs of the members of the households in `postcodes`, or in the postal codes that start with `prefix`"""
+        positions = self._household_positions(postcodes, prefix)
+        if isinstance(positions, slice):
+            return self.agent_ids[self.member_offsets[positions.start]:self.member_offsets[positions.stop]]
+        return self.agent_ids[_ranges(self.member_offsets[positions], self.member_offsets[positions + 1])]
+
+    def _household_positions(self, postcodes: Optional[Iterable[str]], prefix: Optional[str]):
+        assert (postcodes is None) != (prefix is None), "Give either postal codes or a prefix"
+        if prefix is not None:
+            return self.household_range(prefix)
+
+        postcodes = np.asarray(sorted(set(postcodes)), dtype=self.postcodes.dtype)
+        positions = np.searchsorted(self.postcodes, postcodes)
+        found = positions < len(self.postcodes)
+        found[found] = self.postcodes[positions[found]] == postcodes[found]
+        positions = positions[found]
+        return _ranges(self.household_offsets[positions], self.household_offsets[positions + 1])
+
+    def postcode_summary(self) -> pd.DataFrame:
+        """Number of households and members of each postal code"""
+        n_households = np.diff(self.household_offsets)
+        n_members = np.diff(self.member_offsets[self.household_offsets])
+        return pd.DataFrame({'PC6': self.postcodes, 'households': n_households, 'members': n_members})
+
+    def pc4_summary(self) -> pd.DataFrame:
+        """Number of postal codes, households and members of each PC4 area"""
+        df = self.postcode_summary()
+        df.insert(0, 'PC4', df.PC6.str[:4])
+        return df.groupby('PC4', sort=True).agg(postcodes=('PC6', 'size'), households=('households', 'sum'),
+                                                members=('members', 'sum')).reset_index()
+
+    def postcode_sums(self, s_values: pd.Series) -> pd.Series:
+        """
+        Sum of a household attribute per postal code, e.g., `postcode_sums(df_households.set_index('household_id').
+        cars)`
+
+        Args:
+            s_values: Numeric values, indexed by household ID
+
+        Returns:
+            Sums indexed by PC6
+        """
+        values = s_values.reindex(self.household_ids).fillna(0).to_numpy()
+        sums = np.add.reduceat(values, self.household_offsets[:-1]) if len(values) else values
+        return pd.Series(sums, index=pd.Index(self.postcodes, name='PC6'), name=s_values.name)
+
+
+def _ranges(starts: np.ndarray, stops: np.ndarray) -> np.ndarray:
+    # The positions start:stop of all ranges, concatenated
+    lengths = stops - starts
+    if not lengths.sum():
+        return np.zeros(0, dtype='int64')
+    offsets = np.repeat(starts - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths)
+    return np.arange(lengths.sum()) + offsets
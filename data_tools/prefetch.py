@@ -0,0 +1,130 @@
+import importlib
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import pandas as pd
+
+from data_tools.stage_registry import StageEntry
+
+# Number of threads that read datasources. Parsing CSV files releases the GIL for most of the time, so the reads overlap
+# with each other and with the stages, of which the IPF fits spend most of their time in NumPy
+default_prefetch_workers = 4
+
+
+@dataclass(frozen=True, eq=False)
+class Datasource:
+    """
+    A file in the datasources or processed directory, and how it is parsed, e.g.,
+    `Datasource(datasource_path('individual', 'gender', 'gender_age-03759NED-formatted.csv'))`.
+
+    The attribute modules define their datasources at the top, and list them in `datasources`, so a `Prefetcher` can
+    start reading them before the stages that use them run (see `prefetch_stages`).
+    """
+    path: str
+    reader: Callable[..., pd.DataFrame] = pd.read_csv
+    options: Dict[str, Any] = field(default_factory=dict)
+
+    def load(self) -> pd.DataFrame:
+        """Reads the file"""
+        return self.reader(self.path, **self.options)
+
+    def read(self) -> pd.DataFrame:
+        """The data frame read by the active `Prefetcher`, if it prefetches this datasource, or else the file"""
+        df = _active_prefetcher.take(self) if _active_prefetcher is not None else None
+        return df if df is not None else self.load()
+
+
+class Prefetcher:
+    """
+    Reads datasources in a thread pool, so the reads overlap with each other and with the stages that run in the
+    meantime. While the prefetcher is active (between `start` and `close`, or within a `with` block), `Datasource.read`
+    waits for the prefetched data frame instead of reading the file again.
+
+    Each read returns a copy, so a data frame that is read by several stages (e.g., the marginal data) is parsed only
+    once, and changing it in one stage does not affect the others. A datasource that could not be read raises its
+    error in the stage that reads it, as it would have without prefetching.
+    """
+
+    def __init__(self, datasources: Iterable[Datasource], workers: int = default_prefetch_workers):
+        self.datasources = list(dict.fromkeys(datasources))
+        self.workers = workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._futures: Dict[Datasource, Future] = dict()
+
+    def start(self) -> 'Prefetcher':
+        """Starts reading the datasources, and makes this the active prefetcher"""
+        global _active_prefetcher
+
+        if self.datasources:
+            self._executor = ThreadPoolExecutor(max_workers=min(self.workers, len(self.datasources)),
+                                                thread_name_prefix='prefetch')
+            self._futures = {datasource: self._executor.submit(datasource.load) for datasource in self.datasources}
+        _active_prefetcher = self
+        return self
+
+    def take(self, datasource: Datasource) -> Optional[pd.DataFrame]:
+        """
+        A copy of the prefetched data frame of `datasource`, once it is read, or None if it is not prefetched
+
+        Args:
+            datasource:
+
+        Returns:
+
+        """
+        future = self._futures.get(datasource)
+        return None if future is None else future.result().copy()
+
+    def close(self):
+        """Stops reading the datasources that were not read yet, and releases the prefetched data frames"""
+        global _active_prefetcher
+
+        if _active_prefetcher is self:
+            _active_prefetcher = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self._futures = dict()
+
+    def __enter__(self) -> 'Prefetcher':
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+_active_prefetcher: Optional[Prefetcher] = None
+
+
+def module_datasources(module_names: Iterable[str]) -> List[Datasource]:
+    """
+    The datasources listed in `datasources` of each of the modules, which are imported
+
+    Args:
+        module_names: E.g., the modules of a stage (see `data_tools.stage_registry.StageEntry`)
+
+    Returns:
+
+    """
+    return [datasource for module_name in module_names
+            for datasource in getattr(importlib.import_module(module_name), 'datasources', ())]
+
+
+def prefetch_stages(entries: Iterable[StageEntry], workers: int = default_prefetch_workers) -> Prefetcher:
+    """
+    A prefetcher of the datasources of the stages that are about to run, in the order of the stages, so the
+    datasources of the first stages are read first. Use it as a context manager around the stages:
+
+        with prefetch_stages(planned_entries):
+            for entry in planned_entries:
+                ...
+
+    Args:
+        entries: The stages that will run
+        workers:
+
+    Returns:
+
+    """
+    return Prefetcher(module_datasources(module for entry in entries for module in entry.modules), workers)
@@ -0,0 +1,79 @@
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+from data_tools.datasources import municipality_of, output_directory
+
+# Stands for all municipalities in the core marginal dataset, i.e., a national run
+all_municipalities = '*'
+
+
+@dataclass
+class RunConfig:
+    """
+    The region to synthesize: a set of neighborhoods and/or whole municipalities. The neighborhoods are grouped by
+    municipality, and each municipality is synthesized separately (see `run_regions.py`), with its own joint
+    distributions and its own output directory.
+
+    Attributes:
+        name: Name of the run, e.g., randstad. The output is written to output/regions/{name}/{municipality}/
+        neighborhoods: CBS neighborhood codes, e.g., BU05181785
+        municipalities: CBS municipality codes of which all neighborhoods are synthesized, e.g., GM0363, or ['*'] for
+            all municipalities
+        workers: Number of municipalities that are synthesized in parallel
+        engine: Engine of the individual pipeline, agents or types (see `generate_individuals.py`)
+        allow_fallback: Synthesize municipalities of which data is missing with the data of 's-Gravenhage instead,
+            which is recorded in their output directory (see `data_tools.datasources.check_municipal_datasources`).
+            Without it, such municipalities are not synthesized
+    """
+    name: str
+    neighborhoods: List[str] = field(default_factory=list)
+    municipalities: List[str] = field(default_factory=list)
+    workers: int = 1
+    engine: str = 'agents'
+    allow_fallback: bool = False
+
+    def regions(self) -> Dict[str, List[str]]:
+        """
+        The neighborhoods to synthesize, grouped by municipality
+
+        Returns:
+            Sorted neighborhood codes, by municipality code
+        """
+        codes = set(self.neighborhoods)
+        if self.municipalities:
+            # Imported here, as the marginal data reader depends on gensynthpop, which reading a config should not
+            from attributes.marginal_data_reader import read_municipality_neighborhood_codes
+            codes |= set(read_municipality_neighborhood_codes(
+                    None if all_municipalities in self.municipalities else self.municipalities))
+
+        regions = dict()
+        for code in sorted(codes):
+            regions.setdefault(municipality_of(code), list()).append(code)
+        return regions
+
+    def output_directory(self, municipality: str) -> str:
+        """Output directory of the run of `municipality`"""
+        return os.path.join(output_directory(), 'regions', self.name, municipality)
+
+
+def load_run_config(path: str) -> RunConfig:
+    """
+    Reads a run configuration from a JSON file, e.g., run_configs/randstad.json
+
+    Args:
+        path:
+
+    Returns:
+
+    """
+    with open(path) as file:
+        config = json.load(file)
+    config.setdefault('name', os.path.splitext(os.path.basename(path))[0])
+    run_config = RunConfig(**config)
+
+    assert run_config.neighborhoods or run_config.municipalities, f"{path} names no neighborhoods or municipalities"
+    assert run_config.workers >= 1, f"{path}: workers should be at least 1, got {run_config.workers}"
+    assert run_config.engine in ['agents', 'types'], f"{path}: unknown engine {run_config.engine}"
+    return run_config
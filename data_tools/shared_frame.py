@@ -0,0 +1,239 @@
+import os
+import uuid
+from dataclasses import dataclass, field
+from multiprocessing import resource_tracker, shared_memory
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+@dataclass(frozen=True)
+class SharedArraySpec:
+    """Describes a numpy array stored in a shared memory block, so it can be attached to by name"""
+    shm_name: str
+    dtype: str
+    length: int
+
+
+@dataclass(frozen=True)
+class SharedColumnSpec:
+    """
+    A column of a `SharedPopulationFrame`. Categorical (and string) columns are stored as integer codes in `values`.
+    Their categories are small, so they are kept in the spec itself (and pickled with it), with their original values
+    and dtype
+    """
+    name: str
+    values: SharedArraySpec
+    categories: Optional[pd.Index] = None
+    ordered: bool = False
+
+
+@dataclass(frozen=True)
+class SharedFrameSpec:
+    """
+    Picklable description of a `SharedPopulationFrame`. This is all that has to be sent to a worker process, which
+    can then attach to the shared memory with `SharedPopulationFrame.attach`
+    """
+    length: int
+    columns: Tuple[SharedColumnSpec, ...] = field(default_factory=tuple)
+
+    def column(self, name: str) -> SharedColumnSpec:
+        for column in self.columns:
+            if column.name == name:
+                return column
+        raise KeyError(name)
+
+
+class SharedPopulationFrame:
+    """
+    Column store of a synthetic population (or household) frame in shared memory, so worker processes can read it
+    without the frame being pickled and copied to each of them.
+
+    Numeric and boolean columns are stored as they are. Any other column is stored as categorical codes, with its
+    categories (the codebook) in the spec.
+
+    The frame is read-only: the worker processes read the columns, but there is no way to hand values written in a
+    worker back to a data frame of the owner.
+
+    The process that creates the frame owns the shared memory, and releases it in `close` (or when used as a context
+    manager). Worker processes attach with `attach(spec)`, e.g. in the initializer of a process pool, and should only
+    `close` their view (see `reporting.scoring_engine.ScoringEngine`).
+    """
+
+    def __init__(self, spec: SharedFrameSpec, owner: bool = False):
+        self._spec = spec
+        self._owner = owner
+        self._blocks: Dict[str, shared_memory.SharedMemory] = dict()
+        self._arrays: Dict[str, np.ndarray] = dict()
+        for column in spec.columns:
+            self._attach_column(column)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, columns: Optional[Iterable[str]] = None) -> 'SharedPopulationFrame':
+        """
+        Copies `columns` (all columns by default) of `df` into shared memory. This is the only copy that is made.
+
+        Args:
+            df:
+            columns:
+
+        Returns:
+
+        """
+        frame = cls(SharedFrameSpec(len(df)), owner=True)
+        try:
+            for name in (df.columns if columns is None else columns):
+                frame.add_column(name, df[name])
+        except BaseException:
+            frame.close()
+            raise
+        return frame
+
+    @classmethod
+    def attach(cls, spec: SharedFrameSpec) -> 'SharedPopulationFrame':
+        """
+        Attaches to the shared memory of an existing frame, e.g. in a worker process
+
+        Args:
+            spec: The `spec` of the frame created with `from_frame`
+
+        Returns:
+
+        """
+        return cls(spec, owner=False)
+
+    @property
+    def spec(self) -> SharedFrameSpec:
+        return self._spec
+
+    @property
+    def columns(self) -> List[str]:
+        return [column.name for column in self._spec.columns]
+
+    def __len__(self) -> int:
+        return self._spec.length
+
+    def __enter__(self) -> 'SharedPopulationFrame':
+        return self
+
+    def __exit__(self, *_) -> None:
+        self.close()
+
+    def add_column(self, name: str, values: pd.Series) -> None:
+        """
+        Copies a column into shared memory. Only the process that created the frame can add columns, and columns
+        should be added before the spec is sent to worker processes.
+
+        Args:
+            name:
+            values:
+
+        Returns:
+
+        """
+        assert self._owner, "Only the process that created the shared frame can add columns"
+        assert len(values) == len(self), f"Column {name} has {len(values)} values, expected {len(self)}"
+
+        if pd.api.types.is_bool_dtype(values.dtype) or (
+                pd.api.types.is_numeric_dtype(values.dtype) and not isinstance(values.dtype, pd.CategoricalDtype)):
+            column = SharedColumnSpec(name, self._create_array(_numeric_to_array(values)))
+        else:
+            categorical = pd.Categorical(values)
+            column = SharedColumnSpec(
+                    name, self._create_array(categorical.codes), categorical.categories, categorical.ordered)
+
+        self._spec = SharedFrameSpec(self._spec.length, self._spec.columns + (column,))
+        self._attach_column(column)
+
+    def column(self, name: str) -> np.ndarray:
+        """
+        Values of a numeric column, or the codes of a categorical column, as an array backed by the shared memory
+        (not a copy). The array should only be read.
+        """
+        return self._arrays[name]
+
+    def categories(self, name: str) -> Optional[pd.Index]:
+        """Categories of a categorical column, or None for a numeric column"""
+        return self._spec.column(name).categories
+
+    def series(self, name: str, start: int = 0, stop: Optional[int] = None, categorical: bool = True) -> pd.Series:
+        """
+        Rows `start` up to `stop` of a column as a pandas Series. Numeric columns are not copied. Other columns are
+        returned as categoricals, or, with `categorical=False`, decoded to the values (and dtype) of their categories.
+        """
+        values = self._arrays[name][start:stop]
+        column = self._spec.column(name)
+        if column.categories is not None:
+            values = pd.Categorical.from_codes(values, categories=column.categories, ordered=column.ordered)
+            if not categorical:
+                values = np.asarray(values)
+        return pd.Series(values, name=name, index=pd.RangeIndex(start, start + len(values)), copy=False)
+
+    def to_frame(self, columns: Optional[Iterable[str]] = None, start: int = 0, stop: Optional[int] = None,
+                 categorical: bool = True) -> pd.DataFrame:
+        """
+        Rows `start` up to `stop` of `columns` (all columns by default) as a data frame.
+
+        Args:
+            columns:
+            start:
+            stop:
+            categorical: Whether non-numeric columns are returned as categoricals (see `series`)
+
+        Returns:
+
+        """
+        columns = self.columns if columns is None else list(columns)
+        return pd.concat([self.series(name, start, stop, categorical) for name in columns], axis=1)
+
+    def close(self) -> None:
+        """Releases this process' view on the shared memory. The owner also frees the shared memory itself"""
+        self._arrays.clear()
+        for block in self._blocks.values():
+            block.close()
+            if self._owner:
+                block.unlink()
+        self._blocks.clear()
+
+    def _create_array(self, values: np.ndarray) -> SharedArraySpec:
+        values = np.ascontiguousarray(values)
+        block = shared_memory.SharedMemory(
+                name=f'synthpop_{os.getpid()}_{uuid.uuid4().hex[:12]}', create=True, size=max(values.nbytes, 1))
+        np.ndarray(values.shape, dtype=values.dtype, buffer=block.buf)[:] = values
+        self._blocks[block.name] = block
+        return SharedArraySpec(block.name, values.dtype.str, len(values))
+
+    def _attach_column(self, column: SharedColumnSpec) -> None:
+        self._arrays[column.name] = self._attach_array(column.values)
+
+    def _attach_array(self, spec: SharedArraySpec) -> np.ndarray:
+        if spec.shm_name not in self._blocks:
+            self._blocks[spec.shm_name] = _attach_shared_memory(spec.shm_name)
+        return np.ndarray((spec.length,), dtype=np.dtype(spec.dtype), buffer=self._blocks[spec.shm_name].buf)
+
+
+def _attach_shared_memory(name: str) -> shared_memory.SharedMemory:
+    try:
+        # Python >= 3.13: do not let the resource tracker of an attaching process unlink memory it does not own
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        pass
+
+    register = resource_tracker.register
+    resource_tracker.register = lambda *args, **kwargs: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+def _numeric_to_array(values: pd.Series) -> np.ndarray:
+    numpy_dtype = getattr(values.dtype, 'numpy_dtype', None)
+    if numpy_dtype is None:
+        return values.to_numpy()
+    # Nullable extension types (e.g., Int64) have no numpy equivalent with missing values, so those become floats
+    if values.isna().any():
+        return values.to_numpy(dtype='float64', na_value=np.nan)
+    return values.to_numpy(dtype=numpy_dtype)
+
@@ -0,0 +1,82 @@
+import importlib
+from dataclasses import dataclass
+from typing import Callable, List, Tuple
+
+pipeline_modules = {'individuals': 'generate_individuals', 'households': 'generate_households'}
+
+# Modules the attribute adders and validation of every fitting stage import (see `data_tools.type_table`)
+fitting_modules = ('gensynthpop.conditional_attribute_adder', 'gensynthpop.evaluation.validation',
+                   'gensynthpop.utils.extractors', 'ipfn.ipfn')
+
+
+@dataclass(frozen=True)
+class StageEntry:
+    """
+    A stage of a pipeline: the function `function` of the pipeline module, which stores its result as version
+    `version`.
+
+    The pipeline modules only import the attribute modules, gensynthpop and ipfn within the stage functions that use
+    them, so a run of which the stages were stored, or a rerun of a single stage, does not import the fitters of the
+    other stages. `modules` lists the modules the stage imports when it runs, so they can be loaded before the stage is
+    timed (see `benchmarks.harness`), and their datasources can be read before the stage runs (see
+    `data_tools.prefetch`).
+    """
+    pipeline: str
+    version: int
+    function: str
+    modules: Tuple[str, ...] = ()
+
+    def resolve(self) -> Callable:
+        """The stage function, which imports the pipeline module"""
+        return getattr(importlib.import_module(pipeline_modules[self.pipeline]), self.function)
+
+    def preload(self):
+        """Imports the modules the stage imports when it runs"""
+        for module in self.modules:
+            importlib.import_module(module)
+
+
+individual_stage_registry = [
+    StageEntry('individuals', 1, 'instantiate_population', ('attributes.marginal_data_reader',)),
+    StageEntry('individuals', 2, 'add_age_group', ('attributes.marginal_data_reader',) + fitting_modules),
+    StageEntry('individuals', 3, 'add_gender_conditionally',
+               ('attributes.individual.gender', 'attributes.marginal_data_reader') + fitting_modules),
+    StageEntry('individuals', 4, 'add_integer_age_conditionally',
+               ('attributes.individual.integer_age', 'attributes.marginal_data_reader') + fitting_modules),
+    StageEntry('individuals', 5, 'add_migration_background',
+               ('attributes.individual.migration_background', 'attributes.marginal_data_reader') + fitting_modules),
+    StageEntry('individuals', 6, 'add_absolved_education',
+               ('attributes.individual.education.education_attainment',) + fitting_modules),
+    StageEntry('individuals', 7, 'add_current_education',
+               ('attributes.individual.education.current_education',) + fitting_modules),
+    # Takes the place of the separate car (8), motor cycle (9) and moped (10) license stages. Its result differs from
+    # theirs, so it and the stages after it have new versions, and the stored results of the old stages are not read
+    StageEntry('individuals', 12, 'add_drivers_licenses',
+               ('attributes.individual.drivers_license', 'attributes.individual.drivers_license_data') + fitting_modules),
+    StageEntry('individuals', 13, 'add_household_position',
+               ('attributes.individual.household_position.household_position', 'attributes.marginal_data_reader') +
+               fitting_modules),
+]
+
+# The first stage of the type table engine (see `generate_individuals.run_individual_pipeline`)
+type_table_instantiation = StageEntry('individuals', 1, 'instantiate_type_table', ('attributes.marginal_data_reader',))
+
+household_stage_registry = [
+    StageEntry('households', 1, 'partition_households',
+               ('attributes.household.household_composition', 'gensynthpop.household_grouper')),
+    StageEntry('households', 2, 'correct_household_assignment'),
+    StageEntry('households', 3, 'create_3_type_household_labels'),
+    StageEntry('households', 4, 'reassign_individual_household_position'),
+    StageEntry('households', 5, 'add_postal_code', ('attributes.household.post_code',) + fitting_modules),
+    StageEntry('households', 6, 'add_income_household_type'),
+    StageEntry('households', 7, 'add_household_income', ('attributes.household.household_income',) + fitting_modules),
+    StageEntry('households', 8, 'add_number_of_licenses'),
+    StageEntry('households', 9, 'add_car_ownership', ('attributes.household.vehicle_ownership',) + fitting_modules),
+    StageEntry('households', 10, 'add_motorcycle_ownership',
+               ('attributes.household.vehicle_ownership',) + fitting_modules),
+]
+
+
+def pipeline_stages(pipeline: str) -> List[StageEntry]:
+    """The stages of `pipeline` (individuals or households), in order"""
+    return dict(individuals=individual_stage_registry, households=household_stage_registry)[pipeline]
@@ -0,0 +1,303 @@
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Type, Union
+
+import numpy as np
+import pandas as pd
+
+# gensynthpop and ipfn are imported by the functions that use them, so importing the pipelines stays fast (see
+# `data_tools.stage_registry`)
+if TYPE_CHECKING:
+    from gensynthpop.conditional_attribute_adder import ConditionalAttributeAdder
+
+# Number of agents each row of a type table represents
+weight_column = 'weight'
+
+
+def is_type_table(df: pd.DataFrame) -> bool:
+    """True if `df` is a type table, i.e., has a row per combination of attributes, weighted by the number of agents"""
+    return weight_column in df.columns
+
+
+def population_size(df: pd.DataFrame) -> int:
+    """Number of agents in a synthetic population or type table"""
+    return int(df[weight_column].sum()) if is_type_table(df) else len(df)
+
+
+def population_weights(df: pd.DataFrame) -> np.ndarray:
+    """Number of agents each row of a synthetic population (always 1) or type table represents"""
+    return df[weight_column].to_numpy(dtype='int64') if is_type_table(df) else np.ones(len(df), dtype='int64')
+
+
+def population_to_contingency(df: pd.DataFrame, columns: List[str], full_crostab: bool = False) -> pd.DataFrame:
+    """
+    `synthetic_population_to_contingency` for both synthetic populations and type tables, i.e., counts the agents of
+    each combination of `columns`, where each row of a type table counts as its weight
+
+    Args:
+        df: Synthetic population or type table
+        columns:
+        full_crostab: Include all combinations of the values of `columns`, with a count of 0 if they do not occur
+
+    Returns:
+        Data frame indexed by `columns` with the column `count`
+    """
+    if not is_type_table(df):
+        from gensynthpop.utils.extractors import synthetic_population_to_contingency
+
+        return synthetic_population_to_contingency(df, columns, full_crostab)
+
+    s_counts = df.groupby(columns, sort=True)[weight_column].sum().rename('count')
+    if full_crostab:
+        if len(columns) > 1:
+            index = pd.MultiIndex.from_product([sorted(df[column].unique()) for column in columns], names=columns)
+        else:
+            index = pd.Index(sorted(df[columns[0]].unique()), name=columns[0])
+        s_counts = s_counts.reindex(index, fill_value=0)
+    return s_counts.to_frame()
+
+
+def population_margin_series(df: pd.DataFrame, names: List[List[str]]) -> Dict[tuple, pd.Series]:
+    """`get_margin_series_from_synthetic_population` for both synthetic populations and type tables"""
+    return {tuple(name): population_to_contingency(df, name, len(name) > 1)['count'] for name in names}
+
+
+def population_margin_frames(df: pd.DataFrame, names: List[List[str]]) -> Dict[tuple, pd.DataFrame]:
+    """`get_margin_frames_from_synthetic_population` for both synthetic populations and type tables"""
+    return {tuple(name): population_to_contingency(df, name, True).reset_index() for name in names}
+
+
+def attribute_adder_for(df: pd.DataFrame) -> Type[Union['ConditionalAttributeAdder', 'WeightedAttributeAdder']]:
+    """The attribute adder for a synthetic population (`ConditionalAttributeAdder`) or type table"""
+    if is_type_table(df):
+        return WeightedAttributeAdder
+
+    from gensynthpop.conditional_attribute_adder import ConditionalAttributeAdder
+
+    return ConditionalAttributeAdder
+
+
+def type_table_from_totals(s_totals: pd.Series) -> pd.DataFrame:
+    """
+    The type table of a synthetic population without attributes, i.e., one row per neighborhood weighted by its
+    number of inhabitants
+
+    Args:
+        s_totals: Number of inhabitants, indexed by neighborhood code
+
+    Returns:
+
+    """
+    df = pd.DataFrame({'neighb_code': s_totals.index, weight_column: s_totals.to_numpy(dtype='int64')})
+    return df[df[weight_column] > 0].reset_index(drop=True)
+
+
+def compress_population(df_synth_pop: pd.DataFrame, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Turns a synthetic population into a type table with one row per distinct combination of `columns`
+
+    Args:
+        df_synth_pop:
+        columns: Defaults to all columns but `agent_id`
+
+    Returns:
+
+    """
+    columns = columns or [column for column in df_synth_pop.columns if column != 'agent_id']
+    return df_synth_pop.groupby(columns, sort=False, dropna=False).size().rename(weight_column).reset_index()
+
+
+def expand_type_table(df_types: pd.DataFrame, id_prefix: str = 'SA', random_state: Optional[int] = None
+                      ) -> pd.DataFrame:
+    """
+    Expands a type table into a synthetic population with one row per agent, as needed for household formation.
+
+    Agents are ordered by neighborhood, in the order in which the neighborhoods occur in the type table, and in random
+    order within each neighborhood. They get consecutive IDs, like those of `instantiate_population`.
+
+    Args:
+        df_types:
+        id_prefix:
+        random_state: Seed of the order within each neighborhood
+
+    Returns:
+
+    """
+    rng = np.random.default_rng(random_state)
+    rows = np.repeat(np.arange(len(df_types)), population_weights(df_types))
+    rows = rows[rng.permutation(len(rows))]
+    if 'neighb_code' in df_types.columns:
+        neighborhood = pd.factorize(df_types.neighb_code)[0][rows]
+        rows = rows[np.argsort(neighborhood, kind='stable')]
+
+    df = df_types.drop(weight_column, axis=1).iloc[rows].reset_index(drop=True)
+    df.insert(0, 'agent_id', [f"{id_prefix}{i:06d}" for i in range(len(df))])
+    return df
+
+
+def split_weights(weights: np.ndarray, probabilities: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    """
+    Splits the weight of each type over the values of an attribute, such that the expected number of agents with each
+    value is `weight * probability`, and the weights of each type add up to its original weight.
+
+    Each type first gets the integer part of its expected counts. The agents that remain are given to distinct values,
+    drawn with systematic sampling with the fractional parts as inclusion probabilities, so the expected counts are
+    exact (truncate, replicate, sample).
+
+    Args:
+        weights: Weight of each type
+        probabilities: Probability of each value (columns) for each type (rows). Rows add up to 1
+        rng:
+
+    Returns:
+        Integer weights of each type (rows) and value (columns)
+    """
+    expected = weights[:, np.newaxis] * probabilities
+    counts = np.floor(expected + 1e-9)
+    fractions = np.clip(expected - counts, 0., None)
+
+    # Value k is drawn if one of the points u, u + 1, u + 2, ... falls in the k-th interval of the cumulative fractions
+    cumulative = np.cumsum(fractions, axis=1)
+    offsets = rng.random((len(counts), 1))
+    drawn = np.diff(np.floor(cumulative - offsets), axis=1, prepend=np.floor(-offsets))
+    counts += np.clip(drawn, 0, 1) * (fractions > 0)
+
+    # Agents lost to rounding errors go to the most likely value
+    counts[np.arange(len(counts)), probabilities.argmax(axis=1)] += weights - counts.sum(axis=1)
+
+    return counts.astype('int64')
+
+
+class WeightedAttributeAdder:
+    """
+    Counterpart of `ConditionalAttributeAdder` for type tables: adds `target_attribute` conditioned on the attributes
+    in the contingency table that the type table already has, by splitting the weight of each type over the values of
+    the target attribute (see `split_weights`) instead of assigning a value to every agent.
+
+    Like the `ConditionalAttributeAdder`, the contingency table is fitted to the margins of each group (e.g.,
+    neighborhood) separately before it is used.
+    """
+
+    def __init__(self, df_synthetic_population: pd.DataFrame, df_contingency: pd.DataFrame, target_attribute: str,
+                 group_by: Optional[List[str]] = None, random_state: Optional[int] = None):
+        assert is_type_table(df_synthetic_population), f"Type table without the column {weight_column}"
+        self.df_types = df_synthetic_population
+        self.df_contingency = df_contingency.reset_index() if 'count' not in df_contingency.columns \
+            else df_contingency
+        self.target_attribute = target_attribute
+        self.group_by = group_by or list()
+        self.margins: List[pd.DataFrame] = list()
+        self.margins_names: List[List[str]] = list()
+        self.rng = np.random.default_rng(random_state)
+
+    def add_margins(self, margins: Sequence[pd.DataFrame], margins_names: Sequence[List[str]]
+                    ) -> 'WeightedAttributeAdder':
+        """
+        Margins to fit the contingency table to. Margins with the `group_by` columns are fitted per group, others are
+        used as they are for all groups.
+
+        Args:
+            margins: Data frames with the column `count`
+            margins_names: Columns of each margin
+
+        Returns:
+
+        """
+        self.margins += [margin.reset_index() if 'count' not in margin.columns else margin for margin in margins]
+        self.margins_names += [list(names) for names in margins_names]
+        return self
+
+    def run(self) -> pd.DataFrame:
+        """
+        Returns:
+            The type table, with the target attribute
+        """
+        conditions = [column for column in self.df_contingency.columns
+                      if column not in [self.target_attribute, 'count'] and column in self.df_types.columns]
+
+        if not self.group_by:
+            return self._split_types(self.df_types, self._fit(()), conditions)
+
+        return pd.concat([
+            self._split_types(df_group, self._fit(key if isinstance(key, tuple) else (key,)), conditions)
+            for key, df_group in self.df_types.groupby(self.group_by, sort=False)
+        ], ignore_index=True)
+
+    def _fit(self, group: tuple) -> pd.DataFrame:
+        from ipfn import ipfn
+
+        df_contingency = self.df_contingency.astype({'count': float})
+        if not self.margins:
+            return df_contingency
+
+        aggregates = list()
+        for margin, names in zip(self.margins, self.margins_names):
+            if self.group_by and all(column in margin.columns for column in self.group_by):
+                in_group = np.ones(len(margin), dtype=bool)
+                for column, value in zip(self.group_by, group):
+                    in_group &= (margin[column] == value).to_numpy()
+                margin = margin[in_group]
+            aggregates.append(pd.to_numeric(margin['count']).groupby([margin[name] for name in names]).sum()
+                              .astype(float))
+
+        return ipfn.ipfn(df_contingency.copy(), aggregates=aggregates, dimensions=self.margins_names,
+                         weight_col='count').iteration()
+
+    def _split_types(self, df_types: pd.DataFrame, df_fitted: pd.DataFrame, conditions: List[str]) -> pd.DataFrame:
+        # Only the cells with a count are needed, as conditions without any are given the fallback distribution below.
+        # Fitted joints are mostly empty cells (e.g., the current education joint, of which the smallest counts are set
+        # to 0)
+        if (df_fitted['count'] > 0).any():
+            df_fitted = df_fitted[df_fitted['count'] > 0]
+        df_conditional = df_fitted.groupby(conditions + [self.target_attribute])['count'].sum().unstack(
+                self.target_attribute, fill_value=0.) if conditions else \
+            df_fitted.groupby(self.target_attribute)['count'].sum().to_frame().T
+        values = df_conditional.columns.to_numpy()
+
+        # Probabilities of the values for each type. Types of which the conditions do not occur in the contingency table
+        # get the distribution of the target attribute over the whole group
+        if conditions:
+            probabilities = df_types[conditions].merge(df_conditional.reset_index(), on=conditions, how='left')[
+                list(values)].to_numpy(dtype=float)
+        else:
+            probabilities = np.repeat(df_conditional.to_numpy(dtype=float), len(df_types), axis=0)
+        totals = np.nan_to_num(probabilities).sum(axis=1)
+        fallback = df_conditional.sum(axis=0).to_numpy(dtype=float)
+        fallback = fallback / fallback.sum() if fallback.sum() > 0 else np.full(len(values), 1 / len(values))
+        probabilities = np.where((totals > 0)[:, np.newaxis], np.nan_to_num(probabilities) / np.where(
+                totals > 0, totals, 1.)[:, np.newaxis], fallback)
+
+        counts = split_weights(population_weights(df_types), probabilities, self.rng)
+        types, value_index = np.nonzero(counts)
+
+        df = df_types.iloc[types].reset_index(drop=True)
+        df[self.target_attribute] = values[value_index]
+        df[weight_column] = counts[types, value_index]
+        return df
+
+
+def validate_population_fit(df: pd.DataFrame, df_target: pd.DataFrame, columns: List[str], attribute: str):
+    """
+    `validate_synthetic_population_fit` for both synthetic populations and type tables. The fit of a type table is
+    reported as the SRMSE of the weighted counts of `columns` and the target counts (scaled to the same total).
+
+    Args:
+        df: Synthetic population or type table
+        df_target:
+        columns:
+        attribute: Name of the attribute that was added
+
+    Returns:
+
+    """
+    if not is_type_table(df):
+        from gensynthpop.evaluation.validation import validate_synthetic_population_fit
+
+        validate_synthetic_population_fit(df, df_target, columns, attribute)
+        return
+
+    df_target = df_target.reset_index() if 'count' not in df_target.columns else df_target
+    expected = pd.to_numeric(df_target['count'], errors='coerce').groupby([df_target[c] for c in columns]).sum()
+    observed = population_to_contingency(df, columns)['count'].astype(float)
+    observed, expected = observed.align(expected, join='outer', fill_value=0.)
+    expected = expected * observed.sum() / expected.sum() if expected.sum() > 0 else expected
+    srmse = np.sqrt(((observed - expected) ** 2).mean()) / expected.mean() if expected.mean() > 0 else np.nan
+    print(f"Fit of {attribute} on {' X '.join(columns)}: SRMSE {srmse:.4f} over {len(observed)} cells")
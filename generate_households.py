@@ -1,24 +1,22 @@
-import os
+import argparse
 import re
-from typing import Callable, Literal, Optional, Tuple
+from typing import Callable, Literal, Optional, Sequence, Tuple
 
 import pandas as pd
 
-from attributes.household.household_composition import (get_mother_age_disparity, read_couples_age_disparity,
-                                                        read_couples_gender_disparity)
-from attributes.household.household_income import (add_household_type_and_income_age_group, fit_joint_household_income,
-                                                   hh_income_margin_names)
-from attributes.household.post_code import read_pc6_data
-from attributes.household.vehicle_ownership import fit_vehicle_ownership_for_type, get_vehicle_ownership_dimensions
-from gensynthpop.conditional_attribute_adder import ConditionalAttributeAdder
-from gensynthpop.evaluation.validation import validate_synthetic_population_fit
-from gensynthpop.household_grouper import HouseholdGrouper, HouseholdType
-from gensynthpop.utils.extractors import synthetic_population_to_contingency
-from reporting.household_reporting import create_household_score_table
+from data_tools.checkpoints import checkpoint_exists, default_checkpoint_formats, read_checkpoint, write_checkpoint
+from data_tools.datasources import output_path, region_name
+from data_tools.postcode_index import PostcodeIndex
+from data_tools.prefetch import prefetch_stages
+from data_tools.stage_registry import household_stage_registry
 
 
 def partition_households(df_synth_pop: pd.DataFrame, _: Optional[pd.DataFrame] = None
                          ) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    from attributes.household.household_composition import (get_mother_age_disparity, read_couples_age_disparity,
+                                                            read_couples_gender_disparity)
+    from gensynthpop.household_grouper import HouseholdGrouper, HouseholdType
+
     df_couple_age_distribution = read_couples_age_disparity()
     df_couple_gender_distribution = read_couples_gender_disparity()
     df_parent_child_age_distribution = get_mother_age_disparity()
@@ -212,27 +210,20 @@ def partition_households(df_synth_pop: pd.DataFrame, _: Optional[pd.DataFrame] =
 
 def perform_stage(version: int,
                   action: Callable[[pd.DataFrame, Optional[pd.DataFrame]], Tuple[pd.DataFrame, pd.DataFrame]],
-                  df_synth_pop: pd.DataFrame, df_synth_households: Optional[pd.DataFrame]
+                  df_synth_pop: pd.DataFrame, df_synth_households: Optional[pd.DataFrame],
+                  checkpoint_formats: Sequence[str] = tuple(default_checkpoint_formats), overwrite: bool = False
                   ) -> Tuple[pd.DataFrame, pd.DataFrame]:
-    pop_template = 'output/synthetic_population/with_households/individuals/synth_pop_DHWZ_v{version}.{extension}'
-    hh_template = 'output/synthetic_population/with_households/households/synth_households_DHWZ_v{version}.{extension}'
-
-    pop_exists = os.path.exists(pop_template.format(version=version, extension="pkl"))
-    hh_exists = os.path.exists(hh_template.format(version=version, extension="pkl"))
-
     print(f"Performing stage {version} by calling {action.__name__}")
-    if pop_exists and hh_exists:
+    if not overwrite and checkpoint_exists(population_output_template, version) and \
+            checkpoint_exists(households_output_template, version):
         print("Reading existing file")
-        df_synth_pop = pd.read_pickle(pop_template.format(version=version, extension="pkl"))
-        df_synth_households = pd.read_pickle(hh_template.format(version=version, extension="pkl"))
+        df_synth_pop = read_checkpoint(population_output_template, version)
+        df_synth_households = read_checkpoint(households_output_template, version)
     else:
         df_synth_pop, df_synth_households = action(df_synth_pop, df_synth_households)
 
-        df_synth_pop.to_pickle(pop_template.format(version=version, extension="pkl"))
-        df_synth_pop.to_csv(pop_template.format(version=version, extension="csv"))
-
-        df_synth_households.to_pickle(hh_template.format(version=version, extension="pkl"))
-        df_synth_households.to_csv(hh_template.format(version=version, extension="csv"))
+        write_checkpoint(df_synth_pop, population_output_template, version, checkpoint_formats)
+        write_checkpoint(df_synth_households, households_output_template, version, checkpoint_formats)
 
     return df_synth_pop, df_synth_households
 
@@ -356,6 +347,10 @@ def reassign_individual_household_position(
 
 
 def add_postal_code(df_synth_pop: pd.DataFrame, df_synth_households: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    from attributes.household.post_code import read_pc6_data
+    from gensynthpop.conditional_attribute_adder import ConditionalAttributeAdder
+    from gensynthpop.evaluation.validation import validate_synthetic_population_fit
+
     df_contingency = read_pc6_data()
 
     df = ConditionalAttributeAdder(
@@ -400,6 +395,12 @@ def add_income_household_type(
 
 def add_household_income(
         df_synth_pop: pd.DataFrame, df_synth_households: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    from attributes.household.household_income import (add_household_type_and_income_age_group,
+                                                       fit_joint_household_income, hh_income_margin_names)
+    from gensynthpop.conditional_attribute_adder import ConditionalAttributeAdder
+    from gensynthpop.evaluation.validation import validate_synthetic_population_fit
+    from gensynthpop.utils.extractors import synthetic_population_to_contingency
+
     df_synth_households = add_household_type_and_income_age_group(df_synth_households)
     df_contingency = fit_joint_household_income(df_synth_households)
 
@@ -439,6 +440,11 @@ def add_number_of_licenses(df_synth_pop: pd.DataFrame, df_synth_households: pd.D
 def add_vehicle_ownership(
         vehicle_type: Literal['car', 'motorcycle'],
         df_synth_pop: pd.DataFrame, df_synth_households: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    from attributes.household.vehicle_ownership import fit_vehicle_ownership_for_type, get_vehicle_ownership_dimensions
+    from gensynthpop.conditional_attribute_adder import ConditionalAttributeAdder
+    from gensynthpop.evaluation.validation import validate_synthetic_population_fit
+    from gensynthpop.utils.extractors import synthetic_population_to_contingency
+
     if not 'vehicle_ownership_income_group' in df_synth_pop.columns:
         df_synth_households.loc[:, 'vehicle_ownership_income_group'] = df_synth_households.income_group.map(
                 lambda x: int(int(x) / 2) + int(x) % 2)
@@ -472,26 +478,108 @@ def add_vehicle_ownership(
     return df_synth_pop, df
 
 
+def add_car_ownership(df_synth_pop: pd.DataFrame, df_synth_households: pd.DataFrame
+                      ) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    return add_vehicle_ownership('car', df_synth_pop, df_synth_households)
+
+
+def add_motorcycle_ownership(df_synth_pop: pd.DataFrame, df_synth_households: pd.DataFrame
+                             ) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    return add_vehicle_ownership('motorcycle', df_synth_pop, df_synth_households)
+
+
+population_output_template = output_path('synthetic_population', 'with_households', 'individuals',
+                                         f'synth_pop_{region_name()}_v{{version}}.{{extension}}')
+households_output_template = output_path('synthetic_population', 'with_households', 'households',
+                                         f'synth_households_{region_name()}_v{{version}}.{{extension}}')
+
+# The result of the individual pipeline (see `generate_individuals.py`) that the households are formed from
+individuals_input_template = output_path('synthetic_population', 'individuals',
+                                         f'synth_pop_{region_name()}_v{{version}}.{{extension}}')
+individuals_input_version = 13
+
+
+def run_household_pipeline(from_stage: Optional[int] = None, to_stage: Optional[int] = None,
+                           checkpoint_formats: Sequence[str] = tuple(default_checkpoint_formats)
+                           ) -> Tuple[pd.DataFrame, Optional[pd.DataFrame]]:
+    """
+    Runs the stages of the household pipeline in order, starting from the result of the individual pipeline. Without
+    `from_stage`, the stored results of a stage are read instead of running the stage again (see `perform_stage`).
+
+    Args:
+        from_stage: The first stage to run again, even if its results were stored. The stages after it are run again
+            as well, and the stored results of the stage before it are read
+        to_stage: The last stage to run. Defaults to the last stage
+        checkpoint_formats: Formats to store the results of each stage in (see `data_tools.checkpoints`)
+
+    Returns:
+        The synthetic population and households after `to_stage`
+    """
+    to_stage = to_stage or household_stage_registry[-1].version
+    first_stage = from_stage or 1
+
+    if first_stage > 1:
+        df_synth_pop_iteration = read_checkpoint(population_output_template, first_stage - 1)
+        df_synth_household_iteration = read_checkpoint(households_output_template, first_stage - 1)
+        assert df_synth_household_iteration is not None, f"Stage {first_stage - 1} has to be run before stage " \
+                                                         f"{first_stage}"
+    else:
+        df_synth_pop_iteration = read_checkpoint(individuals_input_template, individuals_input_version)
+        assert df_synth_pop_iteration is not None, "The individual pipeline has to be run first"
+        df_synth_household_iteration = None
+
+    entries = [entry for entry in household_stage_registry if first_stage <= entry.version <= to_stage]
+    # The datasources of the stages that are not read from their stored results are read while the first stages run
+    with prefetch_stages([entry for entry in entries if from_stage is not None or not (
+            checkpoint_exists(population_output_template, entry.version) and
+            checkpoint_exists(households_output_template, entry.version))]):
+        for entry in entries:
+            df_synth_pop_iteration, df_synth_household_iteration = perform_stage(
+                    entry.version, globals()[entry.function], df_synth_pop_iteration, df_synth_household_iteration,
+                    checkpoint_formats, overwrite=from_stage is not None)
+
+    return df_synth_pop_iteration, df_synth_household_iteration
+
+
+def export_households(df_synth_pop: pd.DataFrame, df_synth_households: pd.DataFrame, by_postal_code: bool = False,
+                      arrays: bool = False):
+    """
+    Exports the final individuals and households for simulations: as Parquet datasets partitioned by neighborhood,
+    from which simulations read only the neighborhoods they need, with a postal code index, and optionally as arrays
+
+    Args:
+        df_synth_pop:
+        df_synth_households:
+        by_postal_code: Partition the Parquet datasets by postal code within each neighborhood
+        arrays: Also export every column as a memory-mappable .npy file
+
+    Returns:
+
+    """
+    from data_tools.array_export import export_arrays
+    from data_tools.parquet_export import export_population
+
+    exported = export_population(df_synth_pop, df_synth_households, by_postal_code)
+    print(f"Exported to {', '.join(exported.values())}")
+    postcode_index = PostcodeIndex.build(df_synth_households, df_synth_pop)
+    print(f"Postcode index written to {postcode_index.save()}")
+    if arrays:
+        print(f"Exported arrays to {export_arrays(df_synth_pop, df_synth_households)}")
+
+
 if __name__ == "__main__":
-    # Start from the individual attribute population generated with `gensynthpop_dhwz.py`, which has 11 iterations
-    df_synth_pop_iteration = pd.read_pickle('output/synthetic_population/individuals/synth_pop_DHWZ_v11.pkl')
-    df_synth_household_iteration = None
-
-    stages = [
-        partition_households,
-        correct_household_assignment,
-        create_3_type_household_labels,
-        reassign_individual_household_position,
-        add_postal_code,
-        add_income_household_type,
-        add_household_income,
-        add_number_of_licenses,
-        lambda *args: add_vehicle_ownership('car', *args),
-        lambda *args: add_vehicle_ownership('motorcycle', *args),
-    ]
-
-    for v, stage in enumerate(stages):
-        df_synth_pop_iteration, df_synth_household_iteration = perform_stage(
-                v + 1, stage, df_synth_pop_iteration, df_synth_household_iteration)
+    parser = argparse.ArgumentParser(description="Forms the households of the synthetic population")
+    parser.add_argument('--export-pc6', action='store_true',
+                        help="Partition the exported datasets by postal code within each neighborhood")
+    parser.add_argument('--export-arrays', action='store_true',
+                        help="Also export every column as a memory-mappable .npy file, for simulation kernels")
+    arguments = parser.parse_args()
+
+    from reporting.household_reporting import create_household_score_table
+
+    df_synth_pop_iteration, df_synth_household_iteration = run_household_pipeline()
 
     create_household_score_table(df_synth_pop_iteration, df_synth_household_iteration)
+
+    export_households(df_synth_pop_iteration, df_synth_household_iteration, arguments.export_pc6,
+                      arguments.export_arrays)
@@ -1,29 +1,14 @@
-import os
-from typing import Callable, Optional
+import argparse
+from typing import Callable, Optional, Sequence
 
 import pandas as pd
 
-from attributes.individual.drivers_license import (add_license_age_to_synthetic_population,
-                                                   get_and_fit_car_driver_license,
-                                                   get_and_fit_conditional_moped_license,
-                                                   get_and_fit_motor_cycle_license)
-from attributes.individual.education.current_education import (add_education_age_group, current_education_margin_names,
-                                                               fit_joint_current_education)
-from attributes.individual.education.education_attainment import (add_education_attainment_age_group,
-                                                                  fit_joint_absolved_education,
-                                                                  get_education_attainment_margins)
-from attributes.individual.gender import fit_joint_age_gender
-from attributes.individual.household_position.household_position import (fit_household_position_joint_age_gender,
-                                                                         read_households_margins)
-from attributes.individual.integer_age import fit_df_integer_age
-from attributes.individual.migration_background import (add_small_age_group, fit_df_migration_background,
-                                                        read_df_migration_background_marginal)
-from attributes.marginal_data_reader import age_groups, read_marginal_data
-from gensynthpop.conditional_attribute_adder import ConditionalAttributeAdder
-from gensynthpop.evaluation.validation import validate_synthetic_population_fit
-from gensynthpop.utils.extractors import (get_margin_frames_from_synthetic_population,
-                                          synthetic_population_to_contingency)
-from reporting.reporting import score_synthetic_population
+from data_tools.checkpoints import checkpoint_exists, default_checkpoint_formats, read_checkpoint, write_checkpoint
+from data_tools.datasources import output_path, region_name
+from data_tools.prefetch import prefetch_stages
+from data_tools.stage_registry import individual_stage_registry, type_table_instantiation
+from data_tools.type_table import (attribute_adder_for, expand_type_table, population_margin_frames,
+                                   population_to_contingency, type_table_from_totals, validate_population_fit)
 
 
 def instantiate_population(_=None) -> pd.DataFrame:
@@ -34,6 +19,8 @@ def instantiate_population(_=None) -> pd.DataFrame:
     Returns:
 
     """
+    from attributes.marginal_data_reader import read_marginal_data
+
     print("Instantiating Synthetic Population")
     agent_ids = list()
     agent_neighborhoods = list()
@@ -45,17 +32,35 @@ def instantiate_population(_=None) -> pd.DataFrame:
     return pd.DataFrame(data=dict(agent_id=agent_ids, neighb_code=agent_neighborhoods))
 
 
+def instantiate_type_table(_=None) -> pd.DataFrame:
+    """
+    Counterpart of `instantiate_population` for the type table engine: instead of one row per agent, there is one row
+    per neighborhood, weighted by its number of inhabitants. The `add_*` stages split these weights over the values of
+    each attribute (see `data_tools.type_table.WeightedAttributeAdder`), and `expand_type_table` creates the agents
+    once all individual attributes have been added.
+
+    Returns:
+
+    """
+    from attributes.marginal_data_reader import read_marginal_data
+
+    print("Instantiating Synthetic Population type table")
+    return type_table_from_totals(read_marginal_data(['population'], 'population')['population'])
+
+
 def add_age_group(df_synth_pop: pd.DataFrame) -> pd.DataFrame:
+    from attributes.marginal_data_reader import age_groups, read_marginal_data
+
     print("Adding age group")
     df_age_group = read_marginal_data(age_groups, 'age_group')
-    df = ConditionalAttributeAdder(
+    df = attribute_adder_for(df_synth_pop)(
             df_synthetic_population=df_synth_pop,
             df_contingency=df_age_group,
             target_attribute='age_group',
             group_by=['neighb_code']
     ).run()
 
-    validate_synthetic_population_fit(df, df_age_group, ["neighb_code", "age_group"], "age_group")
+    validate_population_fit(df, df_age_group, ["neighb_code", "age_group"], "age_group")
 
     return df
 
@@ -73,12 +78,15 @@ def add_gender_conditionally(df_synth_pop: pd.DataFrame) -> pd.DataFrame:
     Returns:
 
     """
+    from attributes.individual.gender import fit_joint_age_gender
+    from attributes.marginal_data_reader import age_groups, read_marginal_data
+
     print("Adding gender conditioned on age group")
     df_contingency = fit_joint_age_gender()
     df_margins_age_group = read_marginal_data(age_groups, 'age_group')
     df_margins_gender = read_marginal_data(['male', 'female'], 'gender')
 
-    df = ConditionalAttributeAdder(
+    df = attribute_adder_for(df_synth_pop)(
             df_synthetic_population=df_synth_pop,
             df_contingency=df_contingency,
             target_attribute="gender",
@@ -89,12 +97,12 @@ def add_gender_conditionally(df_synth_pop: pd.DataFrame) -> pd.DataFrame:
     ).run()
 
     # The rest is evaluation
-    validate_synthetic_population_fit(df, df_margins_age_group, ["neighb_code", "age_group"], "gender")
-    validate_synthetic_population_fit(df, df_margins_gender, ["neighb_code", "gender"], "gender")
+    validate_population_fit(df, df_margins_age_group, ["neighb_code", "age_group"], "gender")
+    validate_population_fit(df, df_margins_gender, ["neighb_code", "gender"], "gender")
 
     # Note we compare to the fitted joint distribution, because unless the original joint distribution is congruent
     # with the previous data sources used, we cannot reasonably expect to match all used distributions and margins
-    validate_synthetic_population_fit(df, df_contingency, ["age_group", "gender"], "gender")
+    validate_population_fit(df, df_contingency, ["age_group", "gender"], "gender")
 
     return df
 
@@ -111,10 +119,13 @@ def add_integer_age_conditionally(df_synth_pop: pd.DataFrame) -> pd.DataFrame:
     Returns:
 
     """
+    from attributes.individual.integer_age import fit_df_integer_age
+    from attributes.marginal_data_reader import age_groups, read_marginal_data
+
     print("Adding integer age conditioned on age group and gender")
     df_contingency = fit_df_integer_age()
 
-    df = ConditionalAttributeAdder(
+    df = attribute_adder_for(df_synth_pop)(
             df_synth_pop,
             df_contingency,
             "age",
@@ -126,7 +137,7 @@ def add_integer_age_conditionally(df_synth_pop: pd.DataFrame) -> pd.DataFrame:
 
     # Note we compare to the fitted joint distribution, because unless the original joint distribution is congruent
     # with the previous data sources used, we cannot reasonably expect to match all used distributions and margins
-    validate_synthetic_population_fit(df, df_contingency, ["age_group", "gender", "age"], "age")
+    validate_population_fit(df, df_contingency, ["age_group", "gender", "age"], "age")
 
     return df
 
@@ -144,19 +155,23 @@ def add_migration_background(df_synth_pop: pd.DataFrame) -> pd.DataFrame:
 
     Returns:
     """
+    from attributes.individual.migration_background import (add_small_age_group, fit_df_migration_background,
+                                                            read_df_migration_background_marginal)
+    from attributes.marginal_data_reader import read_marginal_data
+
     print("Adding migration background conditioned on age and gender")
 
     df_synth_pop = add_small_age_group(df_synth_pop)
     df_contingency = fit_df_migration_background(df_synth_pop)
 
     margins_gender = read_marginal_data(['male', 'female'], 'gender')
-    margins_age_group = synthetic_population_to_contingency(df_synth_pop, ["neighb_code", "small_age_group"],
-                                                            True).reset_index()
-    margins_gender_age = synthetic_population_to_contingency(df_synth_pop, ["neighb_code", "gender", "small_age_group"],
-                                                             True).reset_index()
+    margins_age_group = population_to_contingency(df_synth_pop, ["neighb_code", "small_age_group"],
+                                                  True).reset_index()
+    margins_gender_age = population_to_contingency(df_synth_pop, ["neighb_code", "gender", "small_age_group"],
+                                                   True).reset_index()
     margins_migration_background = read_df_migration_background_marginal()
 
-    df = ConditionalAttributeAdder(
+    df = attribute_adder_for(df_synth_pop)(
             df_synth_pop,
             df_contingency,
             "migration_background",
@@ -166,14 +181,14 @@ def add_migration_background(df_synth_pop: pd.DataFrame) -> pd.DataFrame:
             [["gender"], ["small_age_group"], ["migration_background"], ["gender", "small_age_group"]]
     ).run()
 
-    validate_synthetic_population_fit(
+    validate_population_fit(
             df,
             margins_migration_background,
             ["neighb_code", "migration_background"],
             "migration_background"
     )
 
-    validate_synthetic_population_fit(
+    validate_population_fit(
             df,
             df_contingency,
             ["small_age_group", "gender", "migration_background"],
@@ -184,21 +199,25 @@ def add_migration_background(df_synth_pop: pd.DataFrame) -> pd.DataFrame:
 
 
 def add_absolved_education(df_synth_pop: pd.DataFrame) -> pd.DataFrame:
+    from attributes.individual.education.education_attainment import (add_education_attainment_age_group,
+                                                                      fit_joint_absolved_education,
+                                                                      get_education_attainment_margins)
+
     df_synth_pop = add_education_attainment_age_group(df_synth_pop)
     df_contingency = fit_joint_absolved_education(df_synth_pop)
 
     # Single margins
-    margins_gender = synthetic_population_to_contingency(df_synth_pop, ["neighb_code", "gender"], True).reset_index()
-    margins_age = synthetic_population_to_contingency(df_synth_pop, ["neighb_code", "education_attainment_age_group"],
-                                                      True).reset_index()
+    margins_gender = population_to_contingency(df_synth_pop, ["neighb_code", "gender"], True).reset_index()
+    margins_age = population_to_contingency(df_synth_pop, ["neighb_code", "education_attainment_age_group"],
+                                            True).reset_index()
     margins_absolved_edu_3_cats = get_education_attainment_margins()
 
     # Double margins
-    margins_gender_age = synthetic_population_to_contingency(df_synth_pop, ["neighb_code", "gender",
-                                                                            "education_attainment_age_group"],
-                                                             True).reset_index()
+    margins_gender_age = population_to_contingency(df_synth_pop, ["neighb_code", "gender",
+                                                                  "education_attainment_age_group"],
+                                                   True).reset_index()
 
-    df = ConditionalAttributeAdder(
+    df = attribute_adder_for(df_synth_pop)(
             df_synth_pop,
             df_contingency,
             "absolved_education",
@@ -218,24 +237,31 @@ def add_absolved_education(df_synth_pop: pd.DataFrame) -> pd.DataFrame:
             ]
     ).run()
 
-    validate_synthetic_population_fit(df, df_contingency,
-                                      ["gender", "education_attainment_age_group", "absolved_education"],
-                                      "absolved_education")
+    validate_population_fit(
+            df,
+            df_contingency,
+            ["gender", "education_attainment_age_group", "absolved_education"],
+            "absolved_education"
+    )
 
     return df
 
 
 def add_current_education(df_synth_pop: pd.DataFrame) -> pd.DataFrame:
+    from attributes.individual.education.current_education import (add_education_age_group,
+                                                                   current_education_margin_names,
+                                                                   fit_joint_current_education)
+
     df_synth_pop = add_education_age_group(df_synth_pop)
     df_contingency = fit_joint_current_education(df_synth_pop)
 
-    margins_dict = get_margin_frames_from_synthetic_population(
+    margins_dict = population_margin_frames(
             df_synth_pop,
             [['neighb_code'] + names for names in current_education_margin_names]
     )
     aggregates = [margins_dict[tuple(['neighb_code'] + names)] for names in current_education_margin_names]
 
-    df = ConditionalAttributeAdder(
+    df = attribute_adder_for(df_synth_pop)(
             df_synth_pop,
             df_contingency,
             "current_education",
@@ -245,7 +271,7 @@ def add_current_education(df_synth_pop: pd.DataFrame) -> pd.DataFrame:
             current_education_margin_names
     ).run()
 
-    validate_synthetic_population_fit(
+    validate_population_fit(
             df,
             df_contingency,
             ["education_age_group", "gender", "migration_background", "absolved_education", "current_education"],
@@ -255,78 +281,54 @@ def add_current_education(df_synth_pop: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
-def add_car_drivers_license(df_synth_pop: pd.DataFrame) -> pd.DataFrame:
-    df_synth_pop = add_license_age_to_synthetic_population(df_synth_pop)
+def add_drivers_licenses(df_synth_pop: pd.DataFrame) -> pd.DataFrame:
+    """
+    Adds car, moped and motor cycle licenses in a single pass, conditioned on license age.
 
-    df_car = get_and_fit_car_driver_license(df_synth_pop)
+    One joint of all three licenses is fitted, instead of a separate fit for each license, which keeps the constraint
+    that car drivers also have a moped license.
 
-    margins_age = synthetic_population_to_contingency(df_synth_pop, ["neighb_code", "license_age"], True).reset_index()
+    Args:
+        df_synth_pop:
 
-    df = ConditionalAttributeAdder(
-            df_synth_pop,
-            df_car,
-            "car_license",
-            ["neighb_code"]
-    ).add_margins(
-            [margins_age],
-            [["license_age"]]
-    ).run()
+    Returns:
 
-    validate_synthetic_population_fit(
-            df,
-            df_car,
-            ["license_age", "car_license"],
-            "car_license"
-    )
+    """
+    from attributes.individual.drivers_license import (add_license_age_to_synthetic_population,
+                                                       get_and_fit_joint_driver_license, joint_license_attribute,
+                                                       license_attributes, split_joint_license_attribute)
 
-    return df
+    print("Adding car, moped and motor cycle licenses conditioned on license age")
+    df_synth_pop = add_license_age_to_synthetic_population(df_synth_pop)
 
+    df_joint = get_and_fit_joint_driver_license(df_synth_pop)
+    df_contingency = df_joint.groupby(['license_age', joint_license_attribute])['count'].sum().reset_index()
 
-def add_motor_cycle_drivers_license(df_synth_pop: pd.DataFrame) -> pd.DataFrame:
-    df_motor_cycle = get_and_fit_motor_cycle_license(df_synth_pop)
-    margins_age = synthetic_population_to_contingency(df_synth_pop, ["neighb_code", "license_age"], True).reset_index()
+    margins_age = population_to_contingency(df_synth_pop, ["neighb_code", "license_age"], True).reset_index()
 
-    df = ConditionalAttributeAdder(
+    df = attribute_adder_for(df_synth_pop)(
             df_synth_pop,
-            df_motor_cycle,
-            "motorcycle_license",
+            df_contingency,
+            joint_license_attribute,
             ["neighb_code"]
     ).add_margins(
             [margins_age],
             [["license_age"]]
     ).run()
 
-    validate_synthetic_population_fit(
-            df,
-            df_motor_cycle,
-            ["license_age", "motorcycle_license"],
-            "motorcycle_license"
-    )
+    df = split_joint_license_attribute(df)
 
-    return df
-
-
-def add_moped_drivers_license(df_synth_pop: pd.DataFrame) -> pd.DataFrame:
-    df_moped = get_and_fit_conditional_moped_license(df_synth_pop)
-
-    margins_age = synthetic_population_to_contingency(df_synth_pop, ["neighb_code", "license_age"], True).reset_index()
-    margins_car = synthetic_population_to_contingency(df_synth_pop, ["neighb_code", "car_license"], True).reset_index()
-    margins_age_car = synthetic_population_to_contingency(df_synth_pop, ["neighb_code", "license_age", "car_license"],
-                                                          True).reset_index()
-
-    df = ConditionalAttributeAdder(
-            df_synth_pop,
-            df_moped,
-            "moped_license",
-            ["neighb_code"]
-    ).add_margins(
-            [margins_age, margins_car, margins_age_car],
-            [['license_age'], ['car_license'], ['license_age', 'car_license']]
-    ).run()
+    for license_attribute in license_attributes:
+        validate_population_fit(
+                df,
+                df_joint.groupby(['license_age', license_attribute])['count'].sum().reset_index(),
+                ["license_age", license_attribute],
+                license_attribute
+        )
 
-    validate_synthetic_population_fit(
+    validate_population_fit(
             df,
-            df_moped,
+            df_joint.groupby(['license_age', 'car_license', 'moped_license'])['count'].sum().reset_index(),
             ["license_age", "car_license", "moped_license"],
             "moped_license"
     )
@@ -343,17 +345,21 @@ def add_household_position(df_synth_pop: pd.DataFrame) -> pd.DataFrame:
 
     Returns:
     """
+    from attributes.individual.household_position.household_position import (fit_household_position_joint_age_gender,
+                                                                             read_households_margins)
+    from attributes.marginal_data_reader import read_marginal_data
+
     print("household position conditioned on age group, gender and household type")
     df_contingency = fit_household_position_joint_age_gender(df_synth_pop)
 
     margins_gender = read_marginal_data(['male', 'female'], 'gender')
-    margins_age_group = synthetic_population_to_contingency(df_synth_pop, ["neighb_code", "small_age_group"],
-                                                            True).reset_index()
-    margins_gender_age = synthetic_population_to_contingency(df_synth_pop, ["neighb_code", "gender", "small_age_group"],
-                                                             True).reset_index()
+    margins_age_group = population_to_contingency(df_synth_pop, ["neighb_code", "small_age_group"],
+                                                  True).reset_index()
+    margins_gender_age = population_to_contingency(df_synth_pop, ["neighb_code", "gender", "small_age_group"],
+                                                   True).reset_index()
     margins_household_type = read_households_margins()
 
-    df = ConditionalAttributeAdder(
+    df = attribute_adder_for(df_synth_pop)(
             df_synth_pop,
             df_contingency,
             "household_position",
@@ -363,7 +369,7 @@ def add_household_position(df_synth_pop: pd.DataFrame) -> pd.DataFrame:
             [["gender"], ["small_age_group"], ["gender", "small_age_group"], ['household_type']]
     ).run()
 
-    validate_synthetic_population_fit(
+    validate_population_fit(
             df,
             df_contingency,
             ["small_age_group", "gender", "household_position"],
@@ -374,39 +380,86 @@ def add_household_position(df_synth_pop: pd.DataFrame) -> pd.DataFrame:
 
 
 def perform_stage(version: int, action: Callable[[Optional[pd.DataFrame]], pd.DataFrame],
-                  *arg: pd.DataFrame) -> pd.DataFrame:
-    output_template = (
-        'output/synthetic_population/individuals/synth_pop_DHWZ_v{version}.{extension}')
+                  *arg: pd.DataFrame, output_template: Optional[str] = None,
+                  checkpoint_formats: Sequence[str] = tuple(default_checkpoint_formats),
+                  overwrite: bool = False) -> pd.DataFrame:
+    output_template = output_template or individuals_output_template
 
     print(f"Performing stage {version} by calling {action.__name__}")
-    if os.path.exists(output_template.format(version=version, extension="pkl")):
-        df = pd.read_pickle(output_template.format(version=version, extension="pkl"))
-    else:
+    df = None if overwrite else read_checkpoint(output_template, version)
+    if df is None:
         df = action(*arg)
-        df.to_pickle(output_template.format(version=version, extension="pkl"))
-        df.to_csv(output_template.format(version=version, extension="csv"))
+        write_checkpoint(df, output_template, version, checkpoint_formats)
 
     return df
 
 
+individuals_output_template = output_path('synthetic_population', 'individuals',
+                                          f'synth_pop_{region_name()}_v{{version}}.{{extension}}')
+
+types_output_template = output_path('synthetic_population', 'types',
+                                    f'synth_types_{region_name()}_v{{version}}.{{extension}}')
+
+
+def run_individual_pipeline(engine: str = 'agents', from_stage: Optional[int] = None, to_stage: Optional[int] = None,
+                            checkpoint_formats: Sequence[str] = tuple(default_checkpoint_formats)
+                            ) -> Optional[pd.DataFrame]:
+    """
+    Runs the stages of the individual pipeline in order. Without `from_stage`, the stored result of a stage is read
+    instead of running the stage again (see `perform_stage`).
+
+    Args:
+        engine: agents, or types for a type table that is expanded to agents after the last stage
+        from_stage: The first stage to run again, even if its result was stored. The stages after it are run again as
+            well, and the stored result of the stage before it is read
+        to_stage: The last stage to run. Defaults to the last stage
+        checkpoint_formats: Formats to store the result of each stage in (see `data_tools.checkpoints`)
+
+    Returns:
+        The synthetic population after `to_stage`
+    """
+    use_types = engine == 'types'
+    template = types_output_template if use_types else individuals_output_template
+    entries = [type_table_instantiation if use_types else individual_stage_registry[0]] + individual_stage_registry[1:]
+    to_stage = to_stage or entries[-1].version
+
+    df_synth_pop_iteration = None
+    previous_stages = [entry.version for entry in entries if from_stage is not None and entry.version < from_stage]
+    if previous_stages:
+        df_synth_pop_iteration = read_checkpoint(template, previous_stages[-1])
+        assert df_synth_pop_iteration is not None, f"Stage {previous_stages[-1]} has to be run before stage {from_stage}"
+
+    entries = [entry for entry in entries if entry.version not in previous_stages and entry.version <= to_stage]
+    # The datasources of the stages that are not read from their stored results are read while the first stages run
+    with prefetch_stages([entry for entry in entries
+                          if from_stage is not None or not checkpoint_exists(template, entry.version)]):
+        for entry in entries:
+            v = entry.version
+            df_synth_pop_iteration = perform_stage(v, globals()[entry.function],
+                                                   *([] if v == 1 else [df_synth_pop_iteration]),
+                                                   output_template=template, checkpoint_formats=checkpoint_formats,
+                                                   overwrite=from_stage is not None)
+
+    if use_types and to_stage >= individual_stage_registry[-1].version:
+        # Household formation needs one row per agent. The agents are always expanded again, because the stored
+        # individuals of the last stage may come from a run of the agents engine, or from an older type table
+        df_synth_pop_iteration = perform_stage(individual_stage_registry[-1].version, expand_type_table,
+                                               df_synth_pop_iteration, checkpoint_formats=checkpoint_formats,
+                                               overwrite=True)
+
+    return df_synth_pop_iteration
+
+
 if __name__ == "__main__":
-    df_synth_pop_iteration = perform_stage(1, instantiate_population)
-
-    stages = [
-        add_age_group,
-        add_gender_conditionally,
-        add_integer_age_conditionally,
-        add_migration_background,
-        add_absolved_education,
-        add_current_education,
-        add_car_drivers_license,
-        add_motor_cycle_drivers_license,
-        add_moped_drivers_license,
-        add_household_position
-    ]
-
-    for v, stage in enumerate(stages):
-        df_synth_pop_iteration = perform_stage(v + 2, stage, df_synth_pop_iteration)
+    parser = argparse.ArgumentParser(description="Generates the individuals of the synthetic population")
+    parser.add_argument('--engine', choices=['agents', 'types'], default='agents',
+                        help="Add the attributes to one row per agent, or to a type table with one weighted row per "
+                             "combination of attributes, which is expanded to agents after the last stage")
+    arguments = parser.parse_args()
+
+    from reporting.reporting import score_synthetic_population
+
+    df_synth_pop_iteration = run_individual_pipeline(arguments.engine)
 
     print("Done! Here is what the synthetic population looks like")
 
@@ -0,0 +1,45 @@
+import argparse
+import os
+import subprocess
+import sys
+from typing import Sequence
+
+from data_tools.datasources import preview_environment_variable, preview_output_directory, repository_directory
+
+pipeline_scripts = ['generate_individuals.py', 'generate_households.py']
+
+
+def run_preview(fraction: float, scripts: Sequence[str] = pipeline_scripts) -> None:
+    """
+    Runs the individual and household pipelines on a population of which every neighborhood margin is scaled by
+    `fraction` (see `attributes.marginal_data_reader.scale_margins`). The populations and score tables are written to
+    output/preview_{fraction}/, and the scores are computed against the scaled margins.
+
+    Each pipeline runs in its own process, as the preview mode is selected through an environment variable that is
+    read when the attribute and reporting modules are imported.
+
+    Args:
+        fraction: Fraction of the population to synthesize, e.g., 0.01
+        scripts: The pipelines to run, in order
+
+    Returns:
+
+    """
+    assert 0 < fraction <= 1, f"The fraction should be in (0, 1], got {fraction}"
+    environment = os.environ | {preview_environment_variable: str(fraction)}
+    for script in scripts:
+        print(f"Running {script} on {fraction:.1%} of the population")
+        subprocess.run([sys.executable, script], cwd=repository_directory, env=environment, check=True)
+
+    print(f"Preview written to {preview_output_directory(fraction)}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generates a scaled-down synthetic population, to quickly see the "
+                                                 "effect of a change on the whole pipeline")
+    parser.add_argument('fraction', type=float, nargs='?', default=0.01,
+                        help="Fraction of each neighborhood to synthesize (default: 0.01)")
+    parser.add_argument('--individuals-only', action='store_true', help="Skip the household pipeline")
+    arguments = parser.parse_args()
+
+    run_preview(arguments.fraction, pipeline_scripts[:1] if arguments.individuals_only else pipeline_scripts)
@@ -0,0 +1,277 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from reporting.metrics import (AlignedCells, align_comparison_tuples, comparison_tuples, fit_metrics,
+                               score_comparison_tuples, score_table)
+from reporting.scoring_engine import ScoreRow, ScoringEngine
+
+if TYPE_CHECKING:
+    from gensynthpop.evaluation.reporting import ComparisonTuple
+
+bootstrap_metrics = ['z_squared', 'x_squared', 'srmse', 'absolute_error_standardized']
+
+interval_table_columns = [
+    'row', 'dimension', 'condition', 'metric', 'estimate', 'mean', 'std', 'lower', 'upper', 'samples'
+]
+
+
+@dataclass
+class BootstrapCells:
+    """
+    Everything needed to compute the fit metrics of a resampled population, without the population itself.
+
+    Agents are grouped in types, i.e., the unique combinations of the values of all columns the observed counts are
+    computed from. Resampling the agents with replacement is the same as drawing the number of agents of each type from
+    a multinomial distribution, so the population never has to be copied or counted again. Each type contributes its
+    count to one cell of every resampled tuple.
+    """
+    cells: AlignedCells
+    fixed_observed: np.ndarray
+    type_cells: np.ndarray
+    type_of_entry: np.ndarray
+    type_probabilities: np.ndarray
+    n_agents: int
+    resampled_tuples: np.ndarray
+
+    def observed_counts(self, type_counts: np.ndarray) -> np.ndarray:
+        """Observed count of each cell, for the given number of agents of each type"""
+        return self.fixed_observed + np.bincount(
+                self.type_cells, weights=type_counts[self.type_of_entry], minlength=self.cells.n_cells)
+
+    def resample(self, rng: np.random.Generator, n_resamples: int) -> Dict[str, np.ndarray]:
+        """
+        Fit metrics of `n_resamples` bootstrap resamples of the population
+
+        Args:
+            rng:
+            n_resamples:
+
+        Returns:
+            Array of shape (n_resamples, number of tuples) per metric
+        """
+        results = {metric: np.empty((n_resamples, self.cells.n_tuples)) for metric in bootstrap_metrics}
+        for i in range(n_resamples):
+            metrics = fit_metrics(self.cells, self.observed_counts(
+                    rng.multinomial(self.n_agents, self.type_probabilities).astype(float)))
+            for metric in bootstrap_metrics:
+                results[metric][i] = metrics[metric]
+        for metric in bootstrap_metrics:
+            results[metric][:, ~self.resampled_tuples] = np.nan
+        return results
+
+
+def bootstrap_score_table(df: pd.DataFrame, rows: Sequence[ScoreRow], n_resamples: int = 200,
+                          confidence: float = 0.95, n_workers: Optional[int] = None, seed: Optional[int] = None
+                          ) -> pd.DataFrame:
+    """
+    Bootstrap confidence intervals of the fit metrics of each comparison tuple of `rows`.
+
+    The population is resampled with replacement `n_resamples` times, and the observed counts of each tuple are counted
+    again for each resample (see `BootstrapCells`). The expected distributions are not fitted again, so the intervals
+    show how much the scores vary with the sampling of the agents, for the same targets. Resamples are computed in a
+    pool of worker processes.
+
+    Observed counts can only be resampled if all their index levels are columns of `df`, and the counts of `df` in these
+    columns equal the observed counts of the tuple. Tuples with derived observed counts (e.g., households positions
+    mapped to household types) get no interval.
+
+    Args:
+        df:
+        rows: Score rows, e.g., as returned by `ScoringEngine.score_rows`
+        n_resamples:
+        confidence: Confidence level of the percentile intervals
+        n_workers: Number of worker processes. Defaults to the number of CPUs
+        seed: Seed of the random resamples
+
+    Returns:
+        Data frame with one row per comparison tuple and metric (see `interval_table_columns`)
+    """
+    tuples, row_names = comparison_tuples(df, rows)
+    df_estimates = score_comparison_tuples(tuples)
+    df_estimates['row'] = row_names
+    bootstrap_cells = get_bootstrap_cells(df, tuples)
+
+    n_workers = max(1, min(n_workers or os.cpu_count() or 1, n_resamples))
+    chunks = [len(chunk) for chunk in np.array_split(np.arange(n_resamples), n_workers * 4) if len(chunk)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+
+    if n_workers == 1:
+        results = [bootstrap_cells.resample(np.random.default_rng(chunk_seed), n)
+                   for chunk_seed, n in zip(seeds, chunks)]
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=_initialize_worker,
+                                 initargs=(bootstrap_cells,)) as pool:
+            results = list(pool.map(_resample_in_worker, seeds, chunks))
+
+    samples = {metric: np.concatenate([result[metric] for result in results]) for metric in bootstrap_metrics}
+    return summarize_samples(df_estimates, samples, confidence)
+
+
+def replicate_score_table(populations: Sequence[pd.DataFrame], rows: Sequence[ScoreRow], confidence: float = 0.95,
+                          engine: Optional[ScoringEngine] = None) -> pd.DataFrame:
+    """
+    Mean and interval of the fit metrics of each comparison tuple of `rows` over replicates of the synthetic population,
+    i.e., populations generated with the same code and data, but other random seeds. In contrast to
+    `bootstrap_score_table`, the expected distributions are fitted again for each replicate.
+
+    Args:
+        populations: The replicates
+        rows:
+        confidence: Confidence level of the percentile intervals
+        engine: Engine that computes the rows of each replicate. Defaults to an engine with the default cache directory
+
+    Returns:
+        Data frame with one row per comparison tuple and metric (see `interval_table_columns`). The estimate is the
+        score of the first replicate
+    """
+    engine = engine or ScoringEngine()
+    df_scores = [score_table(df, engine.score_rows(df, rows)) for df in populations]
+
+    samples = {metric: np.stack([scores[metric].to_numpy(dtype=float) for scores in df_scores])
+               for metric in bootstrap_metrics}
+    return summarize_samples(df_scores[0], samples, confidence)
+
+
+def get_bootstrap_cells(df: pd.DataFrame, tuples: Sequence['ComparisonTuple']) -> BootstrapCells:
+    """
+    Groups the agents of `df` in types, and aligns the cells of each tuple with the types (see `BootstrapCells`)
+
+    Args:
+        df:
+        tuples:
+
+    Returns:
+
+    """
+    observed = [comparison[0]['count'] if isinstance(comparison[0], pd.DataFrame) else comparison[0]
+                for comparison in tuples]
+    levels = [list(counts.index.names) for counts in observed]
+    resampled_tuples = np.array([all(name in df.columns for name in names) for names in levels], dtype=bool)
+
+    type_columns = list(dict.fromkeys(name for names, resampled in zip(levels, resampled_tuples) if resampled
+                                      for name in names))
+    if type_columns:
+        type_counts = df.groupby(type_columns, dropna=False, observed=True).size()
+        type_frame = type_counts.index.to_frame(index=False)
+        type_counts = type_counts.to_numpy()
+    else:
+        type_frame = pd.DataFrame(index=pd.RangeIndex(1))
+        type_counts = np.array([len(df)])
+
+    # The observed entries of a resampled tuple are its original cells (with count 0, so cells that do not occur in
+    # the population are kept), followed by each combination of its levels that occurs among the types
+    template_tuples = list()
+    type_entries = list()
+    for comparison, counts, names, resampled in zip(tuples, observed, levels, resampled_tuples):
+        if resampled:
+            entry_of_type, entries = _index_from_frame(type_frame[names]).factorize()
+            counts = pd.concat([counts.astype(float) * 0, pd.Series(0., index=entries)])
+            type_entries.append(entry_of_type)
+        template_tuples.append((counts, comparison[1], comparison[2], comparison[3]))
+
+    cells = align_comparison_tuples(template_tuples)
+
+    original = np.zeros(cells.n_cells)
+    fixed_observed = np.zeros(cells.n_cells)
+    type_cells = list()
+    type_tuples = list()
+    entry_types = iter(type_entries)
+    for i, (counts, resampled) in enumerate(zip(observed, resampled_tuples)):
+        start, stop = cells.observed_offsets[i], cells.observed_offsets[i + 1]
+        original += np.bincount(cells.observed_cell[start:start + len(counts)], weights=counts.to_numpy(dtype=float),
+                                minlength=cells.n_cells)
+        if resampled:
+            type_cells.append(cells.observed_cell[start + len(counts):stop][next(entry_types)])
+            type_tuples.append(i)
+        else:
+            fixed_observed += np.bincount(cells.observed_cell[start:stop], weights=cells.observed_values[start:stop],
+                                          minlength=cells.n_cells)
+
+    type_cells = np.concatenate(type_cells + [np.empty(0, dtype='int64')])
+    type_of_entry = np.tile(np.arange(len(type_counts)), len(type_tuples))
+
+    # Only resample tuples of which the counts of the population equal the original observed counts
+    recounted = fixed_observed + np.bincount(type_cells, weights=type_counts[type_of_entry].astype(float),
+                                             minlength=cells.n_cells)
+    mismatch = np.bincount(cells.cell_tuple, weights=np.abs(original - recounted), minlength=cells.n_tuples) > 1e-6
+    if mismatch.any():
+        keep = ~mismatch[cells.cell_tuple[type_cells]]
+        fixed_observed = np.where(mismatch[cells.cell_tuple], original, fixed_observed)
+        type_cells, type_of_entry = type_cells[keep], type_of_entry[keep]
+        resampled_tuples &= ~mismatch
+
+    return BootstrapCells(
+            cells=cells,
+            fixed_observed=fixed_observed,
+            type_cells=type_cells,
+            type_of_entry=type_of_entry,
+            type_probabilities=type_counts / type_counts.sum(),
+            n_agents=int(type_counts.sum()),
+            resampled_tuples=resampled_tuples,
+    )
+
+
+def summarize_samples(df_estimates: pd.DataFrame, samples: Dict[str, np.ndarray], confidence: float = 0.95
+                      ) -> pd.DataFrame:
+    """
+    Mean, standard deviation and percentile interval of sampled metrics
+
+    Args:
+        df_estimates: Score table with the point estimates
+        samples: Array of shape (number of samples, number of tuples) per metric
+        confidence:
+
+    Returns:
+        Data frame with one row per comparison tuple and metric
+    """
+    tail = 100 * (1 - confidence) / 2
+    summaries = list()
+    for metric, values in samples.items():
+        valid = ~np.isnan(values).all(axis=0)
+        lower, upper = np.full((2, values.shape[1]), np.nan)
+        mean, std = np.full((2, values.shape[1]), np.nan)
+        if valid.any():
+            lower[valid], upper[valid] = np.nanpercentile(values[:, valid], [tail, 100 - tail], axis=0)
+            mean[valid] = np.nanmean(values[:, valid], axis=0)
+            std[valid] = np.nanstd(values[:, valid], axis=0)
+
+        summaries.append(pd.DataFrame({
+            'row': df_estimates['row'].to_numpy(),
+            'dimension': df_estimates['dimension'].to_numpy(),
+            'condition': df_estimates['condition'].to_numpy(),
+            'metric': metric,
+            'estimate': df_estimates[metric].to_numpy(dtype=float),
+            'mean': mean,
+            'std': std,
+            'lower': lower,
+            'upper': upper,
+            'samples': (~np.isnan(values)).sum(axis=0),
+        }))
+
+    # One block per tuple, with its metrics in the order of `samples`
+    df_summary = pd.concat(summaries, ignore_index=True)
+    order = np.argsort(np.tile(np.arange(len(df_estimates)), len(summaries)), kind='stable')
+    return df_summary.iloc[order].reset_index(drop=True)[interval_table_columns]
+
+
+def _index_from_frame(frame: pd.DataFrame) -> pd.Index:
+    if frame.shape[1] == 1:
+        return pd.Index(frame.iloc[:, 0], name=frame.columns[0])
+    return pd.MultiIndex.from_frame(frame)
+
+
+_worker_cells: Optional[BootstrapCells] = None
+
+
+def _initialize_worker(bootstrap_cells: BootstrapCells) -> None:
+    global _worker_cells
+    _worker_cells = bootstrap_cells
+
+
+def _resample_in_worker(seed: np.random.SeedSequence, n_resamples: int) -> Dict[str, np.ndarray]:
+    return _worker_cells.resample(np.random.default_rng(seed), n_resamples)
@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Optional
 
 import pandas as pd
 
@@ -6,18 +6,35 @@ from attributes.household.household_income import fit_joint_household_income, hh
 from attributes.household.post_code import read_pc6_data
 from attributes.household.vehicle_ownership import fit_vehicle_ownership_for_type, get_vehicle_ownership_dimensions
 from attributes.marginal_data_reader import read_marginal_data
-from gensynthpop.evaluation.reporting import ComparisonTuple, create_score_table
+from gensynthpop.evaluation.reporting import ComparisonTuple
 from gensynthpop.utils.extractors import synthetic_population_to_contingency
-from reporting.reporting import readable_name, score_table_household_position
+from reporting.reporting import readable_name, save_score_table, score_table_household_position
+from reporting.score_store import ScoreStore, score_table_name
+from reporting.scoring_engine import ScoringEngine, reads_columns
 
 
-def create_household_score_table(df_synth_pop: pd.DataFrame, df_synth_households: pd.DataFrame):
-    population_rows = [
+def create_household_score_table(df_synth_pop: pd.DataFrame, df_synth_households: pd.DataFrame,
+                                 engine: Optional[ScoringEngine] = None, store: Optional[ScoreStore] = None):
+    """
+    Scores, stores and renders the score tables of the synthetic population after household formation, and of the
+    households. See `reporting.reporting.score_synthetic_population` for how the rows are computed.
+
+    Args:
+        df_synth_pop:
+        df_synth_households:
+        engine: Defaults to an engine with the default cache directory
+        store: Defaults to the score store in the default directory
+
+    Returns:
+
+    """
+    engine = engine or ScoringEngine()
+    population_rows = engine.score_rows(df_synth_pop, [
         score_table_household_position
-    ]
+    ])
 
-    create_score_table(df_synth_pop, population_rows,
-                       'output/scores/latex/synthpop_dhwz_population_after_households_results_table.tex', True, True)
+    save_score_table(score_table_name('population_after_households_results_table'), df_synth_pop, population_rows,
+                     store)
 
     household_rows = [
         score_3_type_households,
@@ -26,11 +43,12 @@ def create_household_score_table(df_synth_pop: pd.DataFrame, df_synth_households
         score_car_ownership,
         score_motor_cycle_ownership
     ]
+    household_rows = engine.score_rows(df_synth_households, household_rows)
 
-    create_score_table(df_synth_households, household_rows,
-                       'output/scores/latex/synthpop_dhwz_households_results_table.tex', True, True)
+    save_score_table(score_table_name('households_results_table'), df_synth_households, household_rows, store)
 
 
+@reads_columns('neighb_code', 'small_hh_type')
 def score_3_type_households(df: pd.DataFrame) -> List[ComparisonTuple]:
     df_expected = read_marginal_data(['single_person', 'with_children', 'without_children'], 'small_hh_type').set_index(
             ['neighb_code', 'small_hh_type'])
@@ -39,12 +57,15 @@ def score_3_type_households(df: pd.DataFrame) -> List[ComparisonTuple]:
     return [(df_observed, df_expected, 'household type', 'neighborhood')]
 
 
+@reads_columns('neighb_code', 'PC6')
 def score_postal_code(df: pd.DataFrame) -> List[ComparisonTuple]:
     df_expected = read_pc6_data().set_index(['neighb_code', 'PC6'])
     df_observed = synthetic_population_to_contingency(df, ['neighb_code', 'PC6'], False)
     return [(df_observed, df_expected, 'postal code', 'neighborhood')]
 
 
+@reads_columns('income_age_group', 'income_household_type', 'main_bread_winner_migration_background',
+               'income_group')
 def score_income_group(df: pd.DataFrame) -> List[ComparisonTuple]:
     df_contingency = fit_joint_household_income(df)
 
@@ -57,6 +78,7 @@ def score_income_group(df: pd.DataFrame) -> List[ComparisonTuple]:
     return rows
 
 
+@reads_columns('income_household_type', 'hh_size', 'vehicle_ownership_income_group', 'car_license', 'cars')
 def score_car_ownership(df: pd.DataFrame) -> List[ComparisonTuple]:
     df_contingency = fit_vehicle_ownership_for_type(df, 'car', df['car_license'].max())
     df_contingency.rename(columns={'n_vehicles': 'cars'}, inplace=True)
@@ -70,6 +92,8 @@ def score_car_ownership(df: pd.DataFrame) -> List[ComparisonTuple]:
     return rows
 
 
+@reads_columns('income_household_type', 'hh_size', 'vehicle_ownership_income_group', 'motorcycle_license',
+               'motorcycles')
 def score_motor_cycle_ownership(df: pd.DataFrame) -> List[ComparisonTuple]:
     df_contingency = fit_vehicle_ownership_for_type(df, 'motorcycle', df['motorcycle_license'].max())
     df_contingency.rename(columns={'n_vehicles': 'motorcycles'}, inplace=True)
@@ -0,0 +1,275 @@
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from reporting.scoring_engine import ScoreRow
+
+if TYPE_CHECKING:
+    from gensynthpop.evaluation.reporting import ComparisonTuple
+
+score_table_columns = [
+    'row', 'dimension', 'condition', 'cells', 'dof', 'observed_total', 'expected_total',
+    'z_squared', 'z_squared_p', 'x_squared', 'x_squared_p', 'srmse',
+    'absolute_error_total', 'absolute_error_standardized', 'percentage_difference'
+]
+
+
+def comparison_tuples(df: pd.DataFrame, rows: Sequence[ScoreRow]) -> Tuple[List['ComparisonTuple'], List[str]]:
+    """
+    All comparison tuples of `rows`, and the name of the row that produced each of them
+
+    Args:
+        df:
+        rows:
+
+    Returns:
+
+    """
+    tuples: List['ComparisonTuple'] = list()
+    row_names: List[str] = list()
+    for row in rows:
+        row_tuples = row(df)
+        tuples += row_tuples
+        row_names += [row.__name__] * len(row_tuples)
+    return tuples, row_names
+
+
+def score_table(df: pd.DataFrame, rows: Sequence[ScoreRow]) -> pd.DataFrame:
+    """
+    Scores all comparison tuples of `rows` in one batch (see `score_comparison_tuples`)
+
+    Args:
+        df: Synthetic population (or households) the rows are computed for
+        rows: Score rows, e.g., as returned by `ScoringEngine.score_rows`
+
+    Returns:
+        The score table, with the name of the score row that produced each tuple in the column `row`
+    """
+    tuples, row_names = comparison_tuples(df, rows)
+    df_scores = score_comparison_tuples(tuples)
+    df_scores['row'] = row_names
+    return df_scores[score_table_columns]
+
+
+def score_comparison_tuples(tuples: Sequence['ComparisonTuple']) -> pd.DataFrame:
+    """
+    Computes the fit metrics of a batch of (observed, expected, dimension, condition) comparison tuples at once.
+
+    The tuples are first aligned to one set of cells (see `align_comparison_tuples`), after which the metrics of all
+    tuples are computed with segmented sums over these cells (see `fit_metrics`).
+
+    Args:
+        tuples:
+
+    Returns:
+        Data frame with one row per comparison tuple
+    """
+    cells = align_comparison_tuples(tuples)
+    metrics = fit_metrics(cells, cells.observed_counts())
+
+    return pd.DataFrame({
+        'dimension': [comparison[2] for comparison in tuples],
+        'condition': [comparison[3] for comparison in tuples],
+        **metrics
+    })
+
+
+@dataclass
+class AlignedCells:
+    """
+    Observed and expected counts of a batch of comparison tuples, aligned to the union of their cells.
+
+    Observed counts are kept per entry of the observed frames (in the order of the tuples), with the cell each entry
+    belongs to, so they can be replaced (e.g., by resampled counts) and summed into the cells again.
+    """
+    n_tuples: int
+    cell_tuple: np.ndarray
+    cell_expected: np.ndarray
+    observed_cell: np.ndarray
+    observed_values: np.ndarray
+    observed_offsets: np.ndarray
+
+    @property
+    def n_cells(self) -> int:
+        return len(self.cell_tuple)
+
+    def observed_counts(self, observed_values: Optional[np.ndarray] = None) -> np.ndarray:
+        """Observed count of each cell, from `observed_values` per observed entry (defaults to the original ones)"""
+        values = self.observed_values if observed_values is None else observed_values
+        return np.bincount(self.observed_cell, weights=values, minlength=self.n_cells)
+
+
+def align_comparison_tuples(tuples: Sequence['ComparisonTuple']) -> AlignedCells:
+    """
+    The index levels of all tuples are encoded in one shared codebook per level name, so each observed and expected
+    count becomes a (tuple, cell) code. Observed and expected frames are aligned by summing both into the union of
+    their cells, with a count of 0 for cells that only occur on one side.
+
+    Args:
+        tuples:
+
+    Returns:
+
+    """
+    n_tuples = len(tuples)
+    observed = [_counts(comparison[0]) for comparison in tuples]
+    expected = [_align_levels(_counts(comparison[1]), observed_counts)
+                for comparison, observed_counts in zip(tuples, observed)]
+
+    cell_codes = _encode_cells(observed + expected)
+    sides = np.repeat([0, 1], [sum(len(counts) for counts in observed), sum(len(counts) for counts in expected)])
+    tuple_ids = np.concatenate([np.full(len(counts), i % n_tuples, dtype='int64')
+                                for i, counts in enumerate(observed + expected)] + [np.empty(0, dtype='int64')])
+    values = np.concatenate([counts.to_numpy(dtype=float) for counts in observed + expected] + [np.empty(0)])
+
+    # One code per (tuple, cell), so cells of different tuples never collide
+    stride = int(cell_codes.max(initial=0)) + 1
+    assert stride * max(n_tuples, 1) < 2 ** 62, "Too many cells to encode in one batch"
+    cells, cell_index = np.unique(tuple_ids * stride + cell_codes, return_inverse=True)
+    cell_index = cell_index.reshape(-1)
+
+    return AlignedCells(
+            n_tuples=n_tuples,
+            cell_tuple=cells // stride,
+            cell_expected=np.bincount(cell_index[sides == 1], weights=values[sides == 1], minlength=len(cells)),
+            observed_cell=cell_index[sides == 0],
+            observed_values=values[sides == 0],
+            observed_offsets=np.cumsum([0] + [len(counts) for counts in observed]),
+    )
+
+
+def fit_metrics(cells: AlignedCells, cell_observed: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Fit metrics of each tuple, from the observed count of each cell. Expected counts are scaled to the observed total
+    before computing the metrics, as the CBS totals do not exactly match the size of the synthetic population.
+
+    Metrics:
+        z_squared: Sum of the squared modified Z-scores (Williamson et al., 1998), i.e., the difference of the
+            observed and expected proportion of each cell, continuity-corrected by 1/2N towards the expected
+            proportion. Expected proportions of 0 (or 1) are replaced by 1/2N (or 1 - 1/2N)
+        x_squared: Pearson's chi-squared statistic, over the cells with a non-zero expected count
+        srmse: Standardized root mean squared error
+        absolute_error_total: Sum of the absolute differences of all cells
+        absolute_error_standardized: absolute_error_total divided by the observed total
+        percentage_difference: Difference between the observed and expected total, as percentage of the expected
+            total
+
+    The p-values are those of a chi-squared distribution with `dof` degrees of freedom, which is the
+    number of cells, as in the published score tables.
+
+    Args:
+        cells:
+        cell_observed:
+
+    Returns:
+        Array with the value for each tuple, per metric
+    """
+    cell_tuple = cells.cell_tuple
+    cell_expected = cells.cell_expected
+
+    def per_tuple(cell_values: np.ndarray) -> np.ndarray:
+        return np.bincount(cell_tuple, weights=cell_values, minlength=cells.n_tuples)
+
+    n = per_tuple(np.ones(cells.n_cells))
+    observed_total = per_tuple(cell_observed)
+    expected_total = per_tuple(cell_expected)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Expected counts scaled to the observed total
+        scale = np.where(expected_total > 0, observed_total / expected_total, 0.)
+        cell_scaled = cell_expected * scale[cell_tuple]
+        difference = cell_observed - cell_scaled
+
+        # Modified Z-scores
+        total = observed_total[cell_tuple]
+        correction = np.where(total > 0, 1 / (2 * total), 0.)
+        r = np.where(total > 0, cell_observed / total, 0.)
+        p = np.where(total > 0, cell_scaled / total, 0.)
+        p = np.clip(p, correction, 1 - correction)
+        r = np.where(r > p, np.maximum(r - correction, p), np.minimum(r + correction, p))
+        z_squared = per_tuple(np.where(total > 0, (r - p) ** 2 / (p * (1 - p) / total), 0.))
+
+        x_squared = per_tuple(np.where(cell_scaled > 0, difference ** 2 / cell_scaled, 0.))
+
+        absolute_error_total = per_tuple(np.abs(difference))
+        srmse = np.sqrt(per_tuple(difference ** 2) / n) / (expected_total * scale / n)
+        absolute_error_standardized = absolute_error_total / observed_total
+        percentage_difference = 100 * (observed_total - expected_total) / expected_total
+
+    dof = n
+
+    return {
+        'cells': n.astype(int),
+        'dof': dof.astype(int),
+        'observed_total': observed_total,
+        'expected_total': expected_total,
+        'z_squared': z_squared,
+        'z_squared_p': stats.chi2.sf(z_squared, dof),
+        'x_squared': x_squared,
+        'x_squared_p': stats.chi2.sf(x_squared, dof),
+        'srmse': srmse,
+        'absolute_error_total': absolute_error_total,
+        'absolute_error_standardized': absolute_error_standardized,
+        'percentage_difference': percentage_difference,
+    }
+
+
+def _counts(frame) -> pd.Series:
+    if isinstance(frame, pd.DataFrame):
+        frame = frame['count']
+    return frame.astype(float)
+
+
+def _level_names(counts: pd.Series) -> List:
+    return list(counts.index.names)
+
+
+def _align_levels(expected: pd.Series, observed: pd.Series) -> pd.Series:
+    """Orders (or, if they are not named the same, names) the index levels of `expected` like those of `observed`"""
+    observed_names = _level_names(observed)
+    expected_names = _level_names(expected)
+    if expected_names == observed_names:
+        return expected
+    assert len(expected_names) == len(observed_names), \
+        f"Expected counts have levels {expected_names}, observed counts have levels {observed_names}"
+
+    if set(expected_names) == set(observed_names) and None not in observed_names:
+        return expected.reorder_levels(observed_names)
+
+    expected = expected.copy()
+    expected.index = expected.index.set_names(observed_names)
+    return expected
+
+
+def _encode_cells(counts: Sequence[pd.Series]) -> np.ndarray:
+    """
+    Codes of the cells of all `counts`. Each level name has one codebook, shared by all counts with that level, so
+    the same label gets the same code everywhere. Unnamed levels get a codebook per position.
+    """
+    # Collect the labels of each level of all counts, so each codebook is built in one pass
+    segments: Dict[object, List[Tuple[int, np.ndarray]]] = dict()
+    for i, series in enumerate(counts):
+        for position, name in enumerate(_level_names(series)):
+            key = name if name is not None else ('__position__', position)
+            segments.setdefault(key, list()).append((i, series.index.get_level_values(position).to_numpy()))
+
+    level_codes: Dict[Tuple[int, object], np.ndarray] = dict()
+    codebook_sizes: Dict[object, int] = dict()
+    for key, level_segments in segments.items():
+        codes, codebook = pd.factorize(np.concatenate([labels for _, labels in level_segments]), use_na_sentinel=False)
+        codebook_sizes[key] = len(codebook)
+        offsets = np.cumsum([0] + [len(labels) for _, labels in level_segments])
+        for (i, _), start, stop in zip(level_segments, offsets[:-1], offsets[1:]):
+            level_codes[(i, key)] = codes[start:stop]
+
+    cell_codes = list()
+    for i, series in enumerate(counts):
+        keys = [name if name is not None else ('__position__', position)
+                for position, name in enumerate(_level_names(series))]
+        cell_codes.append(np.ravel_multi_index(
+                [level_codes[(i, key)] for key in keys], [max(codebook_sizes[key], 1) for key in keys]).astype('int64'))
+
+    return np.concatenate(cell_codes + [np.empty(0, dtype='int64')])
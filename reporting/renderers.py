@@ -0,0 +1,213 @@
+import os
+from typing import Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from data_tools.datasources import output_path
+from reporting.score_store import ScoreStore
+
+score_table_directory = output_path('scores')
+
+score_table_extensions = {'latex': 'tex', 'markdown': 'md', 'csv': 'csv'}
+
+# Score columns that can be added to the published layout of the LaTeX tables, with their headers
+latex_extra_columns = {
+    'cells': 'cells',
+    'srmse': 'SRMSE',
+    'percentage_difference': r'\% difference',
+}
+
+
+def render_latex_score_table(df_scores: pd.DataFrame, caption: Optional[str] = None, label: Optional[str] = None,
+                             extra_columns: Sequence[str] = ()) -> str:
+    """
+    Formats a score table (see `reporting.metrics.score_table`) as a LaTeX table, in the layout of the published
+    tables (e.g., output/scores/latex/synthpop_dhwz_results_table.tex). Nothing is computed here, so changing the
+    layout never requires the scores to be computed again.
+
+    Args:
+        df_scores:
+        caption: If given (or `label`), the tabular is wrapped in a table environment with this caption
+        label:
+        extra_columns: Score columns added after the published ones, any of `latex_extra_columns`
+
+    Returns:
+
+    """
+    extra_columns = list(extra_columns)
+    for column in extra_columns:
+        if column not in latex_extra_columns:
+            raise ValueError(f"Unknown extra column {column}, expected one of {list(latex_extra_columns)}")
+    n_columns = 9 + len(extra_columns)
+
+    lines: List[str] = [
+        r'\begin{tabular}{ll|r|rr|rr|rr' + '|r' * len(extra_columns) + '}',
+        r'\toprule',
+        ' & '.join(['', '', '', r'\multicolumn{2}{|c}{$Z^2$}', r'\multicolumn{2}{|c}{$X^2$}',
+                    r'\multicolumn{2}{|c}{absolute error}'] + [''] * len(extra_columns)) + r' \\',
+        ' & '.join(['', '', 'DoF', 'Score', '$p$-value', 'Score', '$p$-value', 'total', 'standardized']
+                   + [latex_extra_columns[column] for column in extra_columns]) + r' \\',
+        r'\midrule',
+    ]
+
+    score_columns = ['dof', 'z_squared', 'z_squared_p', 'x_squared', 'x_squared_p', 'absolute_error_total',
+                     'absolute_error_standardized'] + extra_columns
+    dimensions = df_scores.dimension.to_numpy()
+    # Consecutive rows of the same dimension form a group, of which only the first row names the dimension
+    group_starts = np.flatnonzero(np.r_[True, dimensions[1:] != dimensions[:-1]])
+    for group_start, group_stop in zip(group_starts, np.r_[group_starts[1:], len(df_scores)]):
+        for i in range(group_start, group_stop):
+            score = df_scores.iloc[i]
+            if i > group_start:
+                dimension = ''
+            elif group_stop - group_start > 1:
+                dimension = rf'\multirow[t]{{{group_stop - group_start}}}{{*}}{{{score.dimension}}}'
+            else:
+                dimension = score.dimension
+            values = [str(int(score.dof)) if column in ('dof', 'cells') else f'{score[column]:.6f}'
+                      for column in score_columns]
+            lines.append(' & '.join([dimension, score.condition] + values) + r' \\')
+        lines.append(rf'\cline{{1-{n_columns}}}')
+
+    lines += [r'\bottomrule', r'\end{tabular}']
+    if caption is not None or label is not None:
+        lines = [r'\begin{table}[ht]', r'\centering'] + lines
+        if caption is not None:
+            lines.append(rf'\caption{{{caption}}}')
+        if label is not None:
+            lines.append(rf'\label{{{label}}}')
+        lines.append(r'\end{table}')
+
+    return '\n'.join(lines) + '\n'
+
+
+def write_latex_score_table(df_scores: pd.DataFrame, path: str, caption: Optional[str] = None,
+                            label: Optional[str] = None, extra_columns: Sequence[str] = ()) -> None:
+    """
+    Writes `render_latex_score_table` to `path`
+
+    Args:
+        df_scores:
+        path:
+        caption:
+        label:
+        extra_columns:
+
+    Returns:
+
+    """
+    _write(path, render_latex_score_table(df_scores, caption, label, extra_columns))
+
+
+def render_markdown_score_table(df_scores: pd.DataFrame) -> str:
+    """
+    Formats a score table as a Markdown (GitHub flavoured) table
+
+    Args:
+        df_scores:
+
+    Returns:
+
+    """
+    lines = [
+        '| Attribute | Condition | DoF | Z² | p | X² | p | SRMSE | AE | AE/N |',
+        '|---|---|--:|--:|--:|--:|--:|--:|--:|--:|',
+    ]
+    for _, score in df_scores.iterrows():
+        lines.append('| ' + ' | '.join([
+            score.dimension,
+            score.condition.replace(r' $\times$ ', ' × '),
+            str(int(score.dof)),
+            _format_number(score.z_squared),
+            _format_p_value(score.z_squared_p),
+            _format_number(score.x_squared),
+            _format_p_value(score.x_squared_p),
+            _format_number(score.srmse, 3),
+            _format_number(score.absolute_error_total),
+            _format_number(score.absolute_error_standardized, 3),
+        ]) + ' |')
+
+    return '\n'.join(lines) + '\n'
+
+
+def render_csv_score_table(df_scores: pd.DataFrame) -> str:
+    """
+    All columns of a score table as CSV, without any formatting of the numbers
+
+    Args:
+        df_scores:
+
+    Returns:
+
+    """
+    return df_scores.to_csv(index=False)
+
+
+def render_stored_score_table(table: str, version: Optional[str] = None, formats: Iterable[str] = ('latex',),
+                              store: Optional[ScoreStore] = None, directory: str = score_table_directory,
+                              caption: Optional[str] = None, label: Optional[str] = None,
+                              extra_columns: Sequence[str] = ()) -> Dict[str, str]:
+    """
+    Renders a score table from the score store. Only the store is read, so no score is computed.
+
+    The files are written to {directory}/{format}/{table}.{extension}, e.g., output/scores/latex/{table}.tex
+
+    Args:
+        table:
+        version: Population version. Defaults to the most recently stored version
+        formats: Any of 'latex', 'markdown' and 'csv'
+        store: Defaults to the store in the default directory
+        directory:
+        caption: Caption of the LaTeX table
+        label: Label of the LaTeX table
+        extra_columns: Score columns added to the LaTeX table (see `render_latex_score_table`)
+
+    Returns:
+        The path of the rendered file of each format
+    """
+    df_scores = (store or ScoreStore()).load(table, version)
+
+    paths = dict()
+    for score_format in formats:
+        if score_format == 'latex':
+            rendered = render_latex_score_table(df_scores, caption, label, extra_columns)
+        elif score_format == 'markdown':
+            rendered = render_markdown_score_table(df_scores)
+        elif score_format == 'csv':
+            rendered = render_csv_score_table(df_scores)
+        else:
+            raise ValueError(
+                    f"Unknown score table format {score_format}, expected one of {list(score_table_extensions)}")
+
+        path = os.path.join(directory, score_format, f'{table}.{score_table_extensions[score_format]}')
+        _write(path, rendered)
+        paths[score_format] = path
+
+    return paths
+
+
+def _write(path: str, text: str) -> None:
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as file:
+        file.write(text)
+
+
+def _format_number(value: float, decimals: int = 1) -> str:
+    if not np.isfinite(value):
+        return '--'
+    return f'{value:,.{decimals}f}'
+
+
+def _format_p_value(value: float) -> str:
+    if not np.isfinite(value):
+        return '--'
+    if value < 0.001:
+        return '<0.001'
+    return f'{value:.3f}'
+
+
+if __name__ == '__main__':
+    # Renders the most recent scores of all stored tables, e.g., after a change to the layout of the tables
+    for stored_table in ScoreStore().tables():
+        render_stored_score_table(stored_table, formats=score_table_extensions.keys())
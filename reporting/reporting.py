@@ -1,4 +1,4 @@
-from typing import List
+from typing import List, Optional
 
 import pandas as pd
 
@@ -17,12 +17,37 @@ from attributes.individual.integer_age import fit_df_integer_age
 from attributes.individual.migration_background import (fit_df_migration_background,
                                                         read_df_migration_background_marginal)
 from attributes.marginal_data_reader import age_groups, read_marginal_data
+from data_tools.datasources import output_path
 from data_tools.static_mappings import household_map
-from gensynthpop.evaluation.reporting import ComparisonTuple, create_score_table, export_distributions_from_rows
+from gensynthpop.evaluation.reporting import ComparisonTuple, export_distributions_from_rows
 from gensynthpop.utils.extractors import synthetic_population_to_contingency
+from reporting.bootstrap import bootstrap_score_table
+from reporting.metrics import score_table
+from reporting.renderers import render_stored_score_table, score_table_extensions
+from reporting.score_store import ScoreStore, population_version, score_table_name
+from reporting.scoring_engine import ScoreRow, ScoringEngine, reads_columns
 
 
-def score_synthetic_population(df_synth_pop: pd.DataFrame):
+def score_synthetic_population(df_synth_pop: pd.DataFrame, engine: Optional[ScoringEngine] = None,
+                               store: Optional[ScoreStore] = None, version: Optional[str] = None,
+                               n_resamples: int = 0):
+    """
+    Scores the synthetic population, stores and renders the score table, and exports the compared distributions. The
+    comparison tuples of the rows are computed concurrently, and rows of which the columns did not change since the
+    last run are read from the cache of the scoring engine.
+
+    Args:
+        df_synth_pop:
+        engine: Defaults to an engine with the default cache directory
+        store: Defaults to the score store in the default directory
+        version: Population version the scores are stored under. Defaults to a hash of the population
+        n_resamples: If positive, bootstrap intervals of the scores are computed from this many resamples, and stored
+            with the suffix _bootstrap to the table name (see `reporting.bootstrap.bootstrap_score_table`)
+
+    Returns:
+
+    """
+    engine = engine or ScoringEngine()
     rows = [
         score_table_age_group,
         score_table_gender,
@@ -35,16 +60,47 @@ def score_synthetic_population(df_synth_pop: pd.DataFrame):
         score_moped_drivers_license,
         score_table_household_position
     ]
-    create_score_table(df_synth_pop, rows, 'output/scores/latex/synthpop_dhwz_results_table.tex', True, True)
-    export_distributions_from_rows(df_synth_pop, rows, 'output/distributions')
+    rows = engine.score_rows(df_synth_pop, rows)
+    save_score_table(score_table_name('results_table'), df_synth_pop, rows, store, version, n_resamples)
+    export_distributions_from_rows(df_synth_pop, rows, output_path('distributions'))
+
+
+def save_score_table(table: str, df: pd.DataFrame, rows: List[ScoreRow], store: Optional[ScoreStore] = None,
+                     version: Optional[str] = None, n_resamples: int = 0):
+    """
+    Scores `rows`, saves the scores to the score store, and renders the stored table in all formats (e.g.,
+    output/scores/latex/{table}.tex)
+
+    Args:
+        table: Name of the score table
+        df: Synthetic population or households
+        rows:
+        store: Defaults to the score store in the default directory
+        version: Population version the scores are stored under. Defaults to a hash of `df`
+        n_resamples: If positive, bootstrap intervals of the scores are stored as well, as the table {table}_bootstrap
+
+    Returns:
+
+    """
+    store = store or ScoreStore()
+    version = version or population_version(df)
+    metadata = {'rows': [row.__name__ for row in rows]}
+    store.save(table, version, score_table(df, rows), metadata=metadata)
+    render_stored_score_table(table, version, formats=score_table_extensions.keys(), store=store)
+
+    if n_resamples > 0:
+        store.save(f'{table}_bootstrap', version, bootstrap_score_table(df, rows, n_resamples),
+                   metadata={**metadata, 'n_resamples': n_resamples})
 
 
+@reads_columns('neighb_code', 'age_group')
 def score_table_age_group(df: pd.DataFrame) -> List[ComparisonTuple]:
     df_age_group_expected = read_marginal_data(age_groups, 'age_group').set_index(["neighb_code", "age_group"])["count"]
     df_age_group_observed = synthetic_population_to_contingency(df, ["neighb_code", "age_group"], full_crostab=True)
     return [(df_age_group_observed, df_age_group_expected, "age_group", "neighborhood")]
 
 
+@reads_columns('neighb_code', 'age_group', 'gender')
 def score_table_gender(df: pd.DataFrame) -> List[ComparisonTuple]:
     df_gender_expected_joint = fit_joint_age_gender().set_index(["age_group", "gender"])
     df_gender_expected_margins = read_marginal_data(
@@ -60,6 +116,7 @@ def score_table_gender(df: pd.DataFrame) -> List[ComparisonTuple]:
     ]
 
 
+@reads_columns('age', 'gender')
 def score_table_integer_age(df: pd.DataFrame) -> List[ComparisonTuple]:
     """
     Technically, integer age is also conditioned on age group. However, the scores are exactly the same when age group
@@ -84,6 +141,7 @@ def score_table_integer_age(df: pd.DataFrame) -> List[ComparisonTuple]:
     ]
 
 
+@reads_columns('neighb_code', 'small_age_group', 'gender', 'migration_background')
 def score_table_migration_background(df: pd.DataFrame) -> List[ComparisonTuple]:
     expected_margins = read_df_migration_background_marginal().set_index(["neighb_code", "migration_background"])
     expected_joint = fit_df_migration_background(df)
@@ -111,6 +169,7 @@ def score_table_migration_background(df: pd.DataFrame) -> List[ComparisonTuple]:
     ]
 
 
+@reads_columns('neighb_code', 'education_attainment_age_group', 'gender', 'absolved_education')
 def score_absolved_education(df: pd.DataFrame) -> List[ComparisonTuple]:
     expected_joint = fit_joint_absolved_education(df)
 
@@ -141,6 +200,8 @@ def score_absolved_education(df: pd.DataFrame) -> List[ComparisonTuple]:
     return scores
 
 
+@reads_columns('education_age_group', 'gender', 'migration_background', 'absolved_education',
+               'current_education')
 def score_current_eduction(df: pd.DataFrame) -> List[ComparisonTuple]:
     expected_joint = fit_joint_current_education(df)
 
@@ -159,6 +220,7 @@ def score_current_eduction(df: pd.DataFrame) -> List[ComparisonTuple]:
     return scores
 
 
+@reads_columns('age', 'license_age', 'car_license')
 def score_car_drivers_license(df: pd.DataFrame) -> List[ComparisonTuple]:
     expected_joint_car = get_and_fit_car_driver_license(df)
     observed_joint_car = synthetic_population_to_contingency(df, ["license_age", "car_license"], True)
@@ -171,6 +233,7 @@ def score_car_drivers_license(df: pd.DataFrame) -> List[ComparisonTuple]:
     ]
 
 
+@reads_columns('age', 'license_age', 'motorcycle_license')
 def score_motor_cycle_drivers_license(df: pd.DataFrame) -> List[ComparisonTuple]:
     expected_joint_motor_cycle = get_and_fit_motor_cycle_license(df)
     observed_joint_motor_cycle = synthetic_population_to_contingency(df, ['license_age', 'motorcycle_license'])
@@ -184,6 +247,7 @@ def score_motor_cycle_drivers_license(df: pd.DataFrame) -> List[ComparisonTuple]
     ]
 
 
+@reads_columns('age', 'license_age', 'car_license', 'moped_license')
 def score_moped_drivers_license(df: pd.DataFrame) -> List[ComparisonTuple]:
     expected_joint_moped = get_and_fit_conditional_moped_license(df)
     observed_joint_moped = synthetic_population_to_contingency(df, ['license_age', 'car_license', 'moped_license'])
@@ -206,6 +270,7 @@ def score_moped_drivers_license(df: pd.DataFrame) -> List[ComparisonTuple]:
     ]
 
 
+@reads_columns('neighb_code', 'small_age_group', 'gender', 'household_position')
 def score_table_household_position(df: pd.DataFrame) -> List[ComparisonTuple]:
     expected_joint = fit_household_position_joint_age_gender(df)
     expected_age_group = expected_joint.groupby(["household_position", "small_age_group"]).sum()["count"]
@@ -0,0 +1,163 @@
+import datetime
+import hashlib
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from data_tools.atomic_write import atomic_write
+from data_tools.datasources import output_path, region_name
+
+score_store_directory = output_path('scores', 'store')
+
+# Version of the layout of the stored files. Stored scores with another format version are not read
+score_store_format_version = 2
+
+# Key of the store metadata in the Parquet schema metadata of a stored table
+score_store_metadata_key = b'synthpop_score_store'
+
+
+def score_table_name(name: str) -> str:
+    """
+    Name of a score table of the synthesized region (see `data_tools.datasources.region_name`), e.g.,
+    synthpop_dhwz_results_table for `score_table_name('results_table')`
+
+    Args:
+        name:
+
+    Returns:
+
+    """
+    return f'synthpop_{region_name().lower()}_{name}'
+
+
+def population_version(df: pd.DataFrame) -> str:
+    """
+    Content hash of a synthetic population (or households) frame, used as its version in the score store when no
+    explicit version is given. The same population always gets the same version.
+
+    Args:
+        df:
+
+    Returns:
+
+    """
+    digest = hashlib.sha1(','.join(map(str, df.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    return digest.hexdigest()[:12]
+
+
+class ScoreStore:
+    """
+    Score tables (see `reporting.metrics.score_table`) stored as Parquet, per table and population version. Computing
+    the scores and rendering them are separated by the store: renderers only read from it, so a change to the layout of
+    a table does not require any score to be computed again, and notebooks can load the scores directly.
+
+    Layout:
+        {directory}/{table}/{population_version}.parquet
+
+    Example:
+        store = ScoreStore()
+        df_scores = store.load(score_table_name('results_table'))
+    """
+
+    def __init__(self, directory: str = score_store_directory):
+        self.directory = directory
+
+    def save(self, table: str, version: str, df_scores: pd.DataFrame, metadata: Optional[Dict[str, Any]] = None
+             ) -> str:
+        """
+        Stores the scores of `table` for a population version, replacing earlier scores of that version
+
+        Args:
+            table: Name of the score table, e.g., synthpop_dhwz_results_table
+            version: Population version, e.g., the result of `population_version`
+            df_scores:
+            metadata: Any JSON serializable information about the scores, stored with them
+
+        Returns:
+            Path of the stored file
+        """
+        store_metadata = {
+            'format_version': score_store_format_version,
+            'table': table,
+            'population_version': version,
+            'created': datetime.datetime.now().isoformat(timespec='seconds'),
+            'metadata': metadata or dict(),
+        }
+
+        scores = pa.Table.from_pandas(df_scores, preserve_index=False)
+        scores = scores.replace_schema_metadata({**(scores.schema.metadata or dict()),
+                                                 score_store_metadata_key: json.dumps(store_metadata).encode()})
+
+        path = self._path(table, version)
+        with atomic_write(path) as tmp_path:
+            pq.write_table(scores, tmp_path)
+
+        return path
+
+    def load(self, table: str, version: Optional[str] = None) -> pd.DataFrame:
+        """
+        Scores of `table` for a population version
+
+        Args:
+            table:
+            version: Defaults to the most recently stored version
+
+        Returns:
+
+        """
+        path = self._path(table, self._version(table, version))
+        self._check_format(table, path)
+        return pq.read_table(path).to_pandas()
+
+    def load_metadata(self, table: str, version: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Information stored with the scores of `table`: the format version, table, population version, time of storing,
+        and the `metadata` passed to `save`
+
+        Args:
+            table:
+            version: Defaults to the most recently stored version
+
+        Returns:
+
+        """
+        return self._check_format(table, self._path(table, self._version(table, version)))
+
+    def tables(self) -> List[str]:
+        """Names of the tables with stored scores"""
+        if not os.path.isdir(self.directory):
+            return list()
+        return sorted(name for name in os.listdir(self.directory) if os.path.isdir(os.path.join(self.directory, name)))
+
+    def versions(self, table: str) -> List[str]:
+        """Stored population versions of `table`, from oldest to most recently stored"""
+        table_directory = os.path.join(self.directory, table)
+        if not os.path.isdir(table_directory):
+            return list()
+        paths = [os.path.join(table_directory, name) for name in os.listdir(table_directory)
+                 if name.endswith('.parquet')]
+        return [os.path.basename(path)[:-len('.parquet')] for path in sorted(paths, key=os.path.getmtime)]
+
+    def _version(self, table: str, version: Optional[str]) -> str:
+        if version is not None:
+            return version
+        versions = self.versions(table)
+        if not versions:
+            raise FileNotFoundError(f"No scores stored for table {table} in {self.directory}")
+        return versions[-1]
+
+    def _check_format(self, table: str, path: str) -> Dict[str, Any]:
+        schema_metadata = pq.read_schema(path).metadata or dict()
+        store_metadata = json.loads(schema_metadata.get(score_store_metadata_key, b'{}'))
+        if store_metadata.get('format_version') != score_store_format_version:
+            raise ValueError(f"Scores of table {table} in {path} have format version "
+                             f"{store_metadata.get('format_version')}, expected {score_store_format_version}")
+        return store_metadata
+
+    def _path(self, table: str, version: str) -> str:
+        return os.path.join(self.directory, table, f'{version}.parquet')
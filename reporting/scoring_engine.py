@@ -0,0 +1,202 @@
+import functools
+import hashlib
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Optional, Sequence
+
+import pandas as pd
+
+from data_tools.atomic_write import atomic_write
+from data_tools.datasources import output_path
+from data_tools.shared_frame import SharedFrameSpec, SharedPopulationFrame
+
+# gensynthpop only provides the type of the comparison tuples, so scoring does not import it
+if TYPE_CHECKING:
+    from gensynthpop.evaluation.reporting import ComparisonTuple
+
+ScoreRow = Callable[[pd.DataFrame], List['ComparisonTuple']]
+
+score_cache_directory = output_path('scores', 'cache')
+
+
+def reads_columns(*columns: str) -> Callable[[ScoreRow], ScoreRow]:
+    """
+    Declares the columns of the synthetic population (or households) that a score row reads, including the columns
+    that are used to fit its expected distribution. The scoring engine caches the comparison tuples of the row under
+    a hash of exactly these columns, so a row is only recomputed when one of them changes.
+
+    Example:
+        @reads_columns('neighb_code', 'age_group')
+        def score_table_age_group(df: pd.DataFrame) -> List[ComparisonTuple]:
+            ...
+
+    Args:
+        *columns:
+
+    Returns:
+
+    """
+
+    def decorator(row: ScoreRow) -> ScoreRow:
+        row.score_columns = tuple(columns)
+        return row
+
+    return decorator
+
+
+class ScoringEngine:
+    """
+    Computes the comparison tuples of score rows concurrently, and caches them on disk.
+
+    Each row runs in its own worker process. The columns the rows read are copied into shared memory once
+    (see `data_tools.shared_frame`), so the population is not pickled for every worker. The tuples of a row are cached
+    under the hash of the columns it reads (see `reads_columns`). After a change to one attribute, only the rows that
+    read it are recomputed.
+
+    The cache does not know about changes to the datasources or to the code of a row. Call `clear` after changing
+    either of those.
+    """
+
+    def __init__(self, cache_directory: Optional[str] = score_cache_directory, n_workers: Optional[int] = None):
+        """
+
+        Args:
+            cache_directory: Directory of the cached comparison tuples. With None, tuples are only cached in memory
+            n_workers: Maximum number of worker processes. Defaults to the number of CPUs. With 1, rows are computed
+                in this process
+        """
+        self.cache_directory = cache_directory
+        self.n_workers = n_workers or os.cpu_count() or 1
+        self._memory_cache: Dict[str, List['ComparisonTuple']] = dict()
+
+    def score_rows(self, df: pd.DataFrame, rows: Sequence[ScoreRow]) -> List[ScoreRow]:
+        """
+        Computes (or reads from cache) the comparison tuples of `rows`, and returns rows that return these tuples
+        without computing anything. They can be passed to `create_score_table` and `export_distributions_from_rows`
+        in place of the original rows.
+
+        Args:
+            df:
+            rows:
+
+        Returns:
+
+        """
+        return [_CachedRow(row, tuples) for row, tuples in zip(rows, self.compute(df, rows))]
+
+    def compute(self, df: pd.DataFrame, rows: Sequence[ScoreRow]) -> List[List['ComparisonTuple']]:
+        """
+        Comparison tuples of each of the `rows`, in order. Only rows that are not cached for the current values of the
+        columns they read are computed.
+
+        Args:
+            df:
+            rows:
+
+        Returns:
+
+        """
+        column_digests = {column: _column_digest(df, column) for column in _columns_read(rows)}
+        keys = [_row_key(row, column_digests) for row in rows]
+
+        results: Dict[str, List['ComparisonTuple']] = dict()
+        for key in keys:
+            cached = self._load(key)
+            if cached is not None:
+                results[key] = cached
+
+        missing = [(row, key) for row, key in zip(rows, keys) if key not in results]
+        if missing:
+            computed = self._run(df, [row for row, _ in missing])
+            for (_, key), tuples in zip(missing, computed):
+                self._store(key, tuples)
+                results[key] = tuples
+
+        return [results[key] for key in keys]
+
+    def clear(self) -> None:
+        """Removes all cached comparison tuples"""
+        self._memory_cache.clear()
+        if self.cache_directory is not None and os.path.isdir(self.cache_directory):
+            for file_name in os.listdir(self.cache_directory):
+                if file_name.endswith('.pkl'):
+                    os.remove(os.path.join(self.cache_directory, file_name))
+
+    def _run(self, df: pd.DataFrame, rows: List[ScoreRow]) -> List[List['ComparisonTuple']]:
+        n_workers = min(self.n_workers, len(rows))
+        if n_workers <= 1:
+            return [row(df) for row in rows]
+
+        with SharedPopulationFrame.from_frame(df, _columns_read(rows)) as shared:
+            with ProcessPoolExecutor(max_workers=n_workers, initializer=_initialize_worker,
+                                     initargs=(shared.spec,)) as pool:
+                return list(pool.map(_score_row_in_worker, rows))
+
+    def _load(self, key: str) -> Optional[List['ComparisonTuple']]:
+        if key in self._memory_cache:
+            return self._memory_cache[key]
+        if self.cache_directory is None:
+            return None
+
+        path = os.path.join(self.cache_directory, f'{key}.pkl')
+        if not os.path.exists(path):
+            return None
+        with open(path, 'rb') as file:
+            tuples = pickle.load(file)
+        self._memory_cache[key] = tuples
+        return tuples
+
+    def _store(self, key: str, tuples: List['ComparisonTuple']) -> None:
+        self._memory_cache[key] = tuples
+        if self.cache_directory is None:
+            return
+
+        with atomic_write(os.path.join(self.cache_directory, f'{key}.pkl')) as tmp_path:
+            with open(tmp_path, 'wb') as file:
+                pickle.dump(tuples, file, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+class _CachedRow:
+    """Score row that returns precomputed comparison tuples, and otherwise looks like the row it replaces"""
+
+    def __init__(self, row: ScoreRow, tuples: List['ComparisonTuple']):
+        functools.update_wrapper(self, row)
+        self.tuples = tuples
+
+    def __call__(self, _df: pd.DataFrame) -> List['ComparisonTuple']:
+        return list(self.tuples)
+
+
+def _columns_read(rows: Iterable[ScoreRow]) -> List[str]:
+    columns = list()
+    for row in rows:
+        assert hasattr(row, 'score_columns'), f"Score row {row.__name__} does not declare the columns it reads"
+        columns += [column for column in row.score_columns if column not in columns]
+    return columns
+
+
+def _column_digest(df: pd.DataFrame, column: str) -> str:
+    values = pd.util.hash_pandas_object(df[column], index=False).to_numpy()
+    digest = hashlib.sha1(f'{column}:{df[column].dtype}:{len(values)}'.encode())
+    digest.update(values.tobytes())
+    return digest.hexdigest()
+
+
+def _row_key(row: ScoreRow, column_digests: Dict[str, str]) -> str:
+    digest = hashlib.sha1(f'{row.__module__}.{row.__qualname__}'.encode())
+    for column in row.score_columns:
+        digest.update(column_digests[column].encode())
+    return f'{row.__name__}_{digest.hexdigest()[:16]}'
+
+
+_worker_frame: Optional[SharedPopulationFrame] = None
+
+
+def _initialize_worker(spec: SharedFrameSpec) -> None:
+    global _worker_frame
+    _worker_frame = SharedPopulationFrame.attach(spec)
+
+
+def _score_row_in_worker(row: ScoreRow) -> List['ComparisonTuple']:
+    return row(_worker_frame.to_frame(row.score_columns, categorical=False))
@@ -0,0 +1,197 @@
+import argparse
+import cProfile
+import hashlib
+import os
+import pstats
+import sys
+import time
+from typing import List, Optional, Sequence
+
+from data_tools.checkpoints import checkpoint_formats, default_checkpoint_formats, readable_checkpoint_formats
+from data_tools.datasources import check_municipal_datasources, municipality_environment_variable, \
+    neighborhoods_environment_variable, output_environment_variable, output_path, region_name_environment_variable, \
+    selected_municipality
+from data_tools.run_config import RunConfig
+from data_tools.stage_registry import household_stage_registry, individual_stage_registry
+
+pipelines = ['individuals', 'households']
+
+
+def subset_run_config(neighb_codes: List[str], workers: int = 1, engine: str = 'agents',
+                      allow_fallback: bool = False) -> RunConfig:
+    """
+    The run configuration of a subset of neighborhoods. Its name is derived from the neighborhoods, so the results of
+    the stages of a subset are stored apart from those of the full run and of other subsets, in
+    output/regions/subset_{hash}/{municipality}.
+
+    Args:
+        neighb_codes:
+        workers:
+        engine:
+        allow_fallback: See `RunConfig`
+
+    Returns:
+
+    """
+    digest = hashlib.sha1(','.join(sorted(set(neighb_codes))).encode()).hexdigest()[:10]
+    return RunConfig(name=f'subset_{digest}', neighborhoods=sorted(set(neighb_codes)), workers=workers, engine=engine,
+                     allow_fallback=allow_fallback)
+
+
+def select_region(config: RunConfig, municipality: str):
+    """
+    Selects the neighborhoods of `municipality` in `config` for the pipelines, which read the selection when their
+    modules are imported, like `run_regions.run_region` does for its processes
+
+    Args:
+        config:
+        municipality:
+
+    Returns:
+
+    """
+    os.environ[neighborhoods_environment_variable] = ','.join(config.regions()[municipality])
+    os.environ[municipality_environment_variable] = municipality
+    os.environ[output_environment_variable] = os.path.abspath(config.output_directory(municipality))
+    os.environ[region_name_environment_variable] = municipality
+
+
+def run_pipelines(selected_pipelines: Sequence[str], engine: str = 'agents', from_stage: Optional[int] = None,
+                  to_stage: Optional[int] = None, formats: Sequence[str] = tuple(default_checkpoint_formats),
+                  score: bool = True, export_pc6: bool = False, export_arrays: bool = False):
+    """
+    Runs the selected pipelines in this process, with the stage functions and `perform_stage` of
+    `generate_individuals.py` and `generate_households.py`. A stage range applies to each of the selected pipelines,
+    so it is mostly useful with one pipeline.
+
+    The pipeline modules are imported here rather than at the top, as importing them reads the neighborhood selection.
+
+    Args:
+        selected_pipelines: individuals and/or households
+        engine: Engine of the individual pipeline (see `generate_individuals.py`)
+        from_stage: The first stage to run again, even if its result was stored
+        to_stage: The last stage to run
+        formats: Formats to store the result of each stage in
+        score: Score the synthetic population after the last stage of a pipeline
+        export_pc6: Partition the exported datasets by postal code (see `generate_households.export_households`)
+        export_arrays: Also export the final population as arrays
+
+    Returns:
+
+    """
+    if 'individuals' in selected_pipelines:
+        from generate_individuals import run_individual_pipeline
+        from reporting.reporting import score_synthetic_population
+
+        df_synth_pop = run_individual_pipeline(engine, from_stage, to_stage, formats)
+        if score and (to_stage is None or to_stage >= individual_stage_registry[-1].version):
+            score_synthetic_population(df_synth_pop)
+
+    if 'households' in selected_pipelines:
+        from generate_households import export_households, run_household_pipeline
+        from reporting.household_reporting import create_household_score_table
+
+        df_synth_pop, df_synth_households = run_household_pipeline(from_stage, to_stage, formats)
+        if to_stage is None or to_stage >= household_stage_registry[-1].version:
+            if score:
+                create_household_score_table(df_synth_pop, df_synth_households)
+            export_households(df_synth_pop, df_synth_households, export_pc6, export_arrays)
+
+
+def profile_pipelines(profile_path: str, *args, **kwargs):
+    """
+    `run_pipelines` under cProfile. The statistics are written to `profile_path` (e.g., for snakeviz), and the functions
+    with the largest cumulative time are printed
+
+    Args:
+        profile_path:
+        *args: See `run_pipelines`
+        **kwargs:
+
+    Returns:
+
+    """
+    profiler = cProfile.Profile()
+    profiler.runcall(run_pipelines, *args, **kwargs)
+
+    os.makedirs(os.path.dirname(profile_path), exist_ok=True)
+    profiler.dump_stats(profile_path)
+    pstats.Stats(profiler).sort_stats('cumulative').print_stats(25)
+    print(f"Profile written to {profile_path}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Runs the individual and/or household pipelines, or a range of their "
+                                                 "stages, on all or some neighborhoods")
+    parser.add_argument('pipelines', nargs='*', help="The pipelines to run, individuals and/or households (default: "
+                                                     "both)")
+    parser.add_argument('--from-stage', type=int,
+                        help="Run this stage and the stages after it again, even if their results were stored. The "
+                             "stored result of the stage before it is used as input")
+    parser.add_argument('--to-stage', type=int, help="Stop after this stage")
+    parser.add_argument('--neighborhoods', help="Comma separated CBS neighborhood codes to synthesize, instead of the "
+                                                "default neighborhoods. Their results are stored in output/regions/")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Number of municipalities to synthesize in parallel, if the neighborhoods are in more than "
+                             "one municipality")
+    parser.add_argument('--engine', choices=['agents', 'types'], default='agents',
+                        help="Engine of the individual pipeline")
+    parser.add_argument('--checkpoint-format', default=','.join(default_checkpoint_formats),
+                        help=f"Comma separated formats to store the result of each stage in, of "
+                             f"{', '.join(checkpoint_formats)} (default: %(default)s)")
+    parser.add_argument('--no-score', action='store_true', help="Skip scoring the population after the last stage")
+    parser.add_argument('--export-pc6', action='store_true',
+                        help="Partition the exported datasets by postal code within each neighborhood")
+    parser.add_argument('--export-arrays', action='store_true', help="Also export the final population as arrays")
+    parser.add_argument('--allow-fallback', action='store_true',
+                        help="Use the data of 's-Gravenhage where the data of the municipality of the neighborhoods is "
+                             "missing, instead of stopping. The data used instead is listed in the output directory")
+    parser.add_argument('--profile', action='store_true',
+                        help="Profile the run with cProfile, and write the statistics to output/profiles/")
+    arguments = parser.parse_args()
+
+    if not set(arguments.pipelines) <= set(pipelines):
+        parser.error(f"Unknown pipelines {', '.join(set(arguments.pipelines) - set(pipelines))}")
+    checkpoint_format = [extension.strip() for extension in arguments.checkpoint_format.split(',') if extension.strip()]
+    if not set(checkpoint_format) <= set(checkpoint_formats):
+        parser.error(f"Unknown checkpoint formats {', '.join(set(checkpoint_format) - set(checkpoint_formats))}")
+    if not set(checkpoint_format) & set(readable_checkpoint_formats):
+        parser.error(f"Store the results in at least one of {', '.join(readable_checkpoint_formats)}, so later stages "
+                     f"can read them")
+
+    if arguments.neighborhoods:
+        run_config = subset_run_config(arguments.neighborhoods.split(','), arguments.workers, arguments.engine,
+                                       arguments.allow_fallback)
+        regions = run_config.regions()
+        if len(regions) > 1:
+            # One process per municipality, like `run_regions.py`, which run this script on their own municipality
+            from run_regions import run_regions
+
+            passed_arguments = list()
+            for argument, previous in zip(sys.argv[1:], [None] + sys.argv[1:-1]):
+                if not argument.startswith('--neighborhoods') and previous != '--neighborhoods':
+                    passed_arguments.append(argument)
+            statuses = run_regions(run_config, ['run_pipeline.py'], passed_arguments)
+            sys.exit(0 if all(status == 'ok' for status in statuses.values()) else 1)
+
+        select_region(run_config, next(iter(regions)))
+        print(f"Synthesizing {len(run_config.neighborhoods)} neighborhoods, results are stored in "
+              f"{os.environ[output_environment_variable]}")
+
+    # Also when this script runs on a municipality selected by `run_regions.py`
+    check_municipal_datasources(selected_municipality(), arguments.allow_fallback, output_path())
+
+    pipeline_arguments = dict(
+        selected_pipelines=arguments.pipelines or pipelines,
+        engine=arguments.engine,
+        from_stage=arguments.from_stage,
+        to_stage=arguments.to_stage,
+        formats=checkpoint_format,
+        score=not arguments.no_score,
+        export_pc6=arguments.export_pc6,
+        export_arrays=arguments.export_arrays,
+    )
+    if arguments.profile:
+        profile_pipelines(output_path('profiles', f"run_{time.strftime('%Y%m%d_%H%M%S')}.prof"), **pipeline_arguments)
+    else:
+        run_pipelines(**pipeline_arguments)
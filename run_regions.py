@@ -0,0 +1,117 @@
+import argparse
+import os
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Sequence
+
+from data_tools.datasources import check_municipal_datasources, municipal_fallback_environment_variable, \
+    municipality_environment_variable, neighborhoods_environment_variable, output_environment_variable, \
+    region_name_environment_variable, repository_directory
+from data_tools.run_config import RunConfig, load_run_config
+
+pipeline_scripts = ['generate_individuals.py', 'generate_households.py']
+
+
+def run_region(config: RunConfig, municipality: str, neighb_codes: List[str],
+               scripts: Sequence[str] = pipeline_scripts, arguments: Sequence[str] = ()) -> str:
+    """
+    Runs the individual and household pipelines on the neighborhoods of one municipality, with the joint distributions
+    of that municipality, and writes all output (and the log of the pipelines) to the output directory of the region.
+
+    Like the preview mode, the region is selected through environment variables that are read when the attribute
+    modules are imported, so each pipeline runs in its own process.
+
+    Args:
+        config:
+        municipality: CBS municipality code, e.g., GM0518
+        neighb_codes: The neighborhoods of `municipality` to synthesize
+        scripts: The pipelines to run, in order
+        arguments: Passed to every script
+
+    Returns:
+        The output directory of the region
+    """
+    directory = os.path.abspath(config.output_directory(municipality))
+    os.makedirs(directory, exist_ok=True)
+    environment = os.environ | {
+        neighborhoods_environment_variable: ','.join(neighb_codes),
+        municipality_environment_variable: municipality,
+        output_environment_variable: directory,
+        region_name_environment_variable: municipality,
+    }
+    if config.allow_fallback:
+        environment[municipal_fallback_environment_variable] = '1'
+
+    with open(os.path.join(directory, 'run.log'), 'w') as log:
+        for script in scripts:
+            engine = ['--engine', config.engine] if script == 'generate_individuals.py' else list()
+            print(f"{municipality}: running {script} on {len(neighb_codes)} neighborhoods")
+            subprocess.run([sys.executable, script, *engine, *arguments], cwd=repository_directory, env=environment,
+                           stdout=log, stderr=subprocess.STDOUT, check=True)
+
+    return directory
+
+
+def run_regions(config: RunConfig, scripts: Sequence[str] = pipeline_scripts, arguments: Sequence[str] = ()
+                ) -> Dict[str, str]:
+    """
+    Synthesizes every municipality of a run configuration, `config.workers` municipalities at a time
+
+    Before any municipality runs, the data of every municipality is checked (see
+    `data_tools.datasources.check_municipal_datasources`), so a configuration with missing municipal data fails unless
+    `config.allow_fallback` is set.
+
+    Args:
+        config:
+        scripts: The pipelines to run, in order
+        arguments: Passed to every script
+
+    Returns:
+        The status of each municipality: ok, or the error that stopped its run
+    """
+    regions = config.regions()
+    errors = list()
+    for municipality in regions:
+        try:
+            check_municipal_datasources(municipality, config.allow_fallback,
+                                        os.path.abspath(config.output_directory(municipality)))
+        except FileNotFoundError as error:
+            errors.append(str(error))
+    if errors:
+        raise FileNotFoundError('\n'.join(errors))
+
+    statuses = dict()
+    with ThreadPoolExecutor(max_workers=config.workers) as executor:
+        futures = {municipality: executor.submit(run_region, config, municipality, neighb_codes, scripts, arguments)
+                   for municipality, neighb_codes in regions.items()}
+        for municipality, future in futures.items():
+            try:
+                print(f"{municipality}: done, written to {future.result()}")
+                statuses[municipality] = 'ok'
+            except subprocess.CalledProcessError as error:
+                print(f"{municipality}: failed, see {os.path.join(config.output_directory(municipality), 'run.log')}")
+                statuses[municipality] = str(error)
+
+    return statuses
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Synthesizes the neighborhoods and municipalities of a run "
+                                                 "configuration, one municipality per process")
+    parser.add_argument('config', help="JSON run configuration, e.g., run_configs/randstad.json")
+    parser.add_argument('--workers', type=int, help="Number of municipalities to synthesize in parallel "
+                                                    "(default: as configured)")
+    parser.add_argument('--individuals-only', action='store_true', help="Skip the household pipeline")
+    parser.add_argument('--allow-fallback', action='store_true',
+                        help="Use the data of 's-Gravenhage for municipalities of which data is missing, instead of "
+                             "stopping. The data used instead is listed in their output directory")
+    arguments = parser.parse_args()
+
+    run_config = load_run_config(arguments.config)
+    if arguments.workers:
+        run_config.workers = arguments.workers
+    run_config.allow_fallback |= arguments.allow_fallback
+
+    results = run_regions(run_config, pipeline_scripts[:1] if arguments.individuals_only else pipeline_scripts)
+    sys.exit(0 if all(status == 'ok' for status in results.values()) else 1)
@@ -0,0 +1,101 @@
+import filecmp
+import os
+
+import pandas as pd
+import pytest
+
+from benchmarks.fixtures import neighborhood_codes_for, write_fixtures
+from benchmarks.regression import Threshold, compare_results, has_regressions, measurements, render_regression_report
+
+
+def _result(stage: str, wall_time: float, repeat: int = 0, status: str = 'ok', n_agents: int = 10_000,
+            calls: tuple = ()) -> dict:
+    result = dict(pipeline='individuals', stage=stage, n_agents=n_agents, repeat=repeat, status=status)
+    if status == 'ok':
+        result |= dict(wall_time=wall_time, peak_rss=2 ** 30, ipf_iterations=20, calls=list(calls))
+    return result
+
+
+def _results(*results: dict) -> dict:
+    return dict(results=list(results))
+
+
+def test_measurements_has_a_row_per_metric_and_call():
+    call = dict(name='ipfn.ipfn.iteration', wall_time=.5, ipf_iterations=12)
+    df = measurements(_results(_result('gender', 2., calls=(call,)), _result('age', 0., status='failed')))
+
+    assert set(df[df.stage == 'gender'].metric) == {'wall_time', 'peak_rss', 'ipf_iterations'}
+    assert df[(df.call == 'ipfn.ipfn.iteration') & (df.metric == 'ipf_iterations')].value.tolist() == [12]
+    assert df[df.stage == 'age'].metric.tolist() == ['status']
+
+
+def test_compare_results_reports_changes_beyond_the_threshold():
+    baseline = _results(*[_result(stage, 10., repeat) for stage in ['slower', 'faster', 'same', 'missing']
+                          for repeat in range(3)])
+    candidate = _results(*[_result(stage, wall_time, repeat)
+                           for stage, wall_time in [('slower', 12.), ('faster', 8.), ('same', 10.5), ('new', 1.)]
+                           for repeat in range(3)])
+    thresholds = dict(wall_time=Threshold(relative=.1, absolute=.05), peak_rss=Threshold(relative=.1, absolute=0.),
+                      ipf_iterations=Threshold(relative=.05, absolute=2))
+
+    df_report = compare_results(baseline, candidate, thresholds)
+
+    status = df_report[df_report.metric == 'wall_time'].set_index('stage').status.to_dict()
+    assert status == dict(slower='regression', faster='improvement', same='ok', missing='missing', new='new')
+    assert df_report.set_index(['stage', 'metric']).loc[('slower', 'wall_time'), 'change'] == pytest.approx(.2)
+    assert has_regressions(df_report)
+    assert '| slower |' in render_regression_report(df_report)
+    assert '| same |' not in render_regression_report(df_report)
+
+
+def test_compare_results_allows_for_the_noise_of_the_repeats():
+    baseline = _results(*[_result('noisy', wall_time, repeat) for repeat, wall_time in enumerate([8., 10., 12.])])
+    candidate = _results(*[_result('noisy', wall_time, repeat) for repeat, wall_time in enumerate([9., 12., 13.])])
+
+    df_report = compare_results(baseline, candidate)
+
+    row = df_report[df_report.metric == 'wall_time'].iloc[0]
+    assert row.status == 'ok'
+    assert row.allowed == pytest.approx(3 * 1.4826 * 2.)
+    assert not has_regressions(df_report)
+
+
+def test_compare_results_reports_failed_stages():
+    baseline = _results(_result('gender', 1.))
+    candidate = _results(_result('gender', 0., status='failed'))
+
+    df_report = compare_results(baseline, candidate)
+
+    assert set(df_report.status) == {'failed'}
+    assert has_regressions(df_report)
+
+
+def test_compare_results_only_compares_common_scales():
+    baseline = _results(_result('gender', 1., n_agents=10_000), _result('gender', 9., n_agents=100_000))
+    candidate = _results(_result('gender', 1., n_agents=10_000))
+
+    df_report = compare_results(baseline, candidate)
+
+    assert set(df_report.n_agents) == {10_000}
+    assert not has_regressions(df_report)
+
+
+def test_neighborhood_codes_for():
+    assert neighborhood_codes_for(2) == ['BU05180000', 'BU05180001']
+    assert neighborhood_codes_for(10_001)[-1] == 'BU05190000'
+
+
+def test_write_fixtures_is_deterministic_for_a_seed(tmp_path):
+    first = write_fixtures(2_000, 2, str(tmp_path / 'first'), seed=5)
+    second = write_fixtures(2_000, 2, str(tmp_path / 'second'), seed=5)
+
+    files = sorted(os.path.relpath(os.path.join(directory, name), first.directory)
+                   for directory, _, names in os.walk(first.directory) for name in names)
+    assert 'fixtures.json' in files and len(files) > 10
+    for name in files:
+        first_path, second_path = os.path.join(first.directory, name), os.path.join(second.directory, name)
+        if name.endswith('.pkl'):
+            pd.testing.assert_frame_equal(pd.read_pickle(first_path), pd.read_pickle(second_path))
+        else:
+            assert filecmp.cmp(first_path, second_path, shallow=False), name
+
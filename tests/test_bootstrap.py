@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from reporting.bootstrap import (bootstrap_metrics, bootstrap_score_table, get_bootstrap_cells, interval_table_columns,
+                                 summarize_samples)
+from reporting.metrics import fit_metrics, score_comparison_tuples
+
+
+def _population() -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        'neighb_code': rng.choice(['BU1', 'BU2', 'BU3'], size=300),
+        'gender': rng.choice(['male', 'female'], size=300),
+        'age_group': rng.choice(['0-15', '15-25', '25-45', '45+'], size=300),
+    })
+
+
+def score_gender(df: pd.DataFrame) -> list:
+    observed = df.groupby(['neighb_code', 'gender']).size().astype(float)
+    return [(observed, observed * 0 + 50., 'gender', 'neighborhood')]
+
+
+def score_age_group(df: pd.DataFrame) -> list:
+    observed = df.groupby('age_group').size().astype(float)
+    # Household types are not a column of the population, so these counts cannot be resampled
+    observed_households = pd.Series([40., 60.], index=pd.Index(['single', 'family'], name='hh_type'))
+    expected_households = pd.Series([50., 50.], index=pd.Index(['single', 'family'], name='hh_type'))
+    return [
+        (observed, pd.Series(75., index=observed.index), 'age_group', 'total'),
+        (observed_households, expected_households, 'household type', 'total'),
+    ]
+
+
+def test_bootstrap_cells_recount_the_observed_counts_of_the_population():
+    df = _population()
+    tuples = score_gender(df) + score_age_group(df)
+
+    cells = get_bootstrap_cells(df, tuples)
+
+    np.testing.assert_array_equal(cells.resampled_tuples, [True, True, False])
+    assert cells.n_agents == len(df)
+    # Without resampling, the types add up to the original observed counts, and so to the original scores
+    metrics = fit_metrics(cells.cells, cells.observed_counts(cells.type_probabilities * cells.n_agents))
+    df_scores = score_comparison_tuples(tuples)
+    for metric in bootstrap_metrics:
+        np.testing.assert_allclose(metrics[metric], df_scores[metric])
+
+
+def test_bootstrap_score_table_is_deterministic_for_a_seed():
+    df = _population()
+    rows = [score_gender, score_age_group]
+
+    first = bootstrap_score_table(df, rows, n_resamples=50, n_workers=1, seed=1)
+    second = bootstrap_score_table(df, rows, n_resamples=50, n_workers=1, seed=1)
+
+    assert list(first.columns) == interval_table_columns
+    assert len(first) == 3 * len(bootstrap_metrics)
+    pd.testing.assert_frame_equal(first, second)
+
+
+def test_bootstrap_score_table_estimates_are_the_scores_of_the_population():
+    df = _population()
+    rows = [score_gender, score_age_group]
+
+    df_intervals = bootstrap_score_table(df, rows, n_resamples=50, n_workers=1, seed=2)
+
+    df_scores = score_comparison_tuples(score_gender(df) + score_age_group(df))
+    for metric in bootstrap_metrics:
+        df_metric = df_intervals[df_intervals.metric == metric]
+        np.testing.assert_allclose(df_metric.estimate, df_scores[metric])
+        assert list(df_metric.row) == ['score_gender', 'score_age_group', 'score_age_group']
+
+    resampled = df_intervals[df_intervals.dimension != 'household type']
+    assert (resampled.samples == 50).all()
+    assert (resampled.lower <= resampled.upper).all()
+    assert (df_intervals[df_intervals.dimension == 'household type'].samples == 0).all()
+
+
+def test_summarize_samples_gives_percentile_intervals():
+    df_estimates = pd.DataFrame({'row': ['row'] * 2, 'dimension': ['a', 'b'], 'condition': ['total'] * 2,
+                                 'srmse': [.5, .2]})
+    samples = {'srmse': np.column_stack([np.arange(101, dtype=float), np.full(101, np.nan)])}
+
+    df_summary = summarize_samples(df_estimates, samples, confidence=.9)
+
+    assert list(df_summary.columns) == interval_table_columns
+    first, second = df_summary.iloc[0], df_summary.iloc[1]
+    assert (first.lower, first.upper, first['mean'], first.samples) == pytest.approx((5., 95., 50., 101))
+    assert np.isnan(second.lower) and np.isnan(second['mean']) and second.samples == 0
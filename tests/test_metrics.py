@@ -0,0 +1,116 @@
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import stats
+
+from reporting.metrics import score_comparison_tuples, score_table, score_table_columns
+
+
+def _scalar_metrics(observed: pd.Series, expected: pd.Series) -> dict:
+    """The metrics of one comparison tuple, computed cell by cell"""
+    cells = list(dict.fromkeys(list(observed.index) + list(expected.index)))
+    o = [float(observed.get(cell, 0.)) for cell in cells]
+    e = [float(expected.get(cell, 0.)) for cell in cells]
+    n = len(cells)
+    observed_total, expected_total = sum(o), sum(e)
+    scaled = [value * observed_total / expected_total for value in e]
+    differences = [a - b for a, b in zip(o, scaled)]
+
+    correction = 1 / (2 * observed_total)
+    z_squared = 0.
+    for a, b in zip(o, scaled):
+        r, p = a / observed_total, min(max(b / observed_total, correction), 1 - correction)
+        r = max(r - correction, p) if r > p else min(r + correction, p)
+        z_squared += (r - p) ** 2 / (p * (1 - p) / observed_total)
+
+    x_squared = sum(d ** 2 / b for d, b in zip(differences, scaled) if b > 0)
+    dof = n
+    return {
+        'cells': n,
+        'dof': dof,
+        'observed_total': observed_total,
+        'expected_total': expected_total,
+        'z_squared': z_squared,
+        'z_squared_p': stats.chi2.sf(z_squared, dof),
+        'x_squared': x_squared,
+        'x_squared_p': stats.chi2.sf(x_squared, dof),
+        'srmse': math.sqrt(sum(d ** 2 for d in differences) / n) / (observed_total / n),
+        'absolute_error_total': sum(abs(d) for d in differences),
+        'absolute_error_standardized': sum(abs(d) for d in differences) / observed_total,
+        'percentage_difference': 100 * (observed_total - expected_total) / expected_total,
+    }
+
+
+def _tuples() -> list:
+    observed_gender = pd.Series([30., 25., 10., 0.], index=pd.MultiIndex.from_tuples(
+            [('BU1', 'male'), ('BU1', 'female'), ('BU2', 'male'), ('BU2', 'female')], names=['neighb_code', 'gender']))
+    # Levels in another order, a cell that is not observed, and an observed cell that is not expected
+    expected_gender = pd.DataFrame({'count': [28., 31., 12., 4.]}, index=pd.MultiIndex.from_tuples(
+            [('male', 'BU1'), ('female', 'BU1'), ('male', 'BU2'), ('female', 'BU3')], names=['gender', 'neighb_code']))
+    observed_age = pd.DataFrame({'count': [5., 20., 40.]},
+                                index=pd.Index(['0-15', '15-25', '25-45'], name='age_group'))
+    expected_age = pd.Series([10., 10., 45.], index=pd.Index(['0-15', '15-25', '25-45'], name='age_group'))
+    return [
+        (observed_gender, expected_gender, 'gender', 'neighborhood'),
+        (observed_age, expected_age, 'age_group', 'total'),
+    ]
+
+
+def test_score_comparison_tuples_matches_the_metrics_per_tuple():
+    tuples = _tuples()
+
+    df_scores = score_comparison_tuples(tuples)
+
+    assert list(df_scores.dimension) == ['gender', 'age_group']
+    assert list(df_scores.condition) == ['neighborhood', 'total']
+    for i, (observed, expected, _, _) in enumerate(tuples):
+        observed = observed['count'] if isinstance(observed, pd.DataFrame) else observed
+        expected = expected['count'] if isinstance(expected, pd.DataFrame) else expected
+        expected = expected.reorder_levels(observed.index.names) if expected.index.nlevels > 1 else expected
+        for metric, value in _scalar_metrics(observed, expected).items():
+            assert df_scores[metric].iloc[i] == pytest.approx(value, rel=1e-9, abs=1e-12), metric
+
+
+def test_score_comparison_tuples_of_a_hand_computed_tuple():
+    observed = pd.Series([3., 1.], index=pd.Index(['a', 'b'], name='value'))
+    expected = pd.Series([2., 2.], index=pd.Index(['a', 'b'], name='value'))
+
+    scores = score_comparison_tuples([(observed, expected, 'value', 'total')]).iloc[0]
+
+    assert scores.cells == 2 and scores.dof == 2
+    assert scores.x_squared == pytest.approx(1.)
+    assert scores.z_squared == pytest.approx(.5)
+    assert scores.srmse == pytest.approx(.5)
+    assert scores.absolute_error_total == pytest.approx(2.)
+    assert scores.absolute_error_standardized == pytest.approx(.5)
+    assert scores.percentage_difference == pytest.approx(0.)
+
+
+def test_a_perfect_fit_scores_zero():
+    counts = pd.Series([4., 6., 10.], index=pd.Index(['a', 'b', 'c'], name='value'))
+
+    scores = score_comparison_tuples([(counts, counts * 2, 'value', 'total')]).iloc[0]
+
+    assert scores.x_squared == pytest.approx(0.)
+    assert scores.srmse == pytest.approx(0.)
+    assert scores.absolute_error_total == pytest.approx(0.)
+    assert scores.x_squared_p == pytest.approx(1.)
+    assert scores.percentage_difference == pytest.approx(-50.)
+
+
+def test_score_table_labels_each_tuple_with_its_row():
+    tuples = _tuples()
+
+    def score_gender(_df):
+        return tuples[:1]
+
+    def score_age(_df):
+        return tuples[1:]
+
+    df_scores = score_table(pd.DataFrame(), [score_gender, score_age])
+
+    assert list(df_scores.columns) == score_table_columns
+    assert list(df_scores.row) == ['score_gender', 'score_age']
+    np.testing.assert_allclose(df_scores.srmse, score_comparison_tuples(tuples).srmse)
@@ -0,0 +1,52 @@
+import os
+import re
+
+import pandas as pd
+import pytest
+
+from reporting.renderers import render_latex_score_table
+
+baseline_tables = [
+    os.path.join(os.path.dirname(__file__), '..', 'output', 'scores', 'latex', f'synthpop_dhwz_{table}.tex')
+    for table in ['results_table', 'households_results_table', 'population_after_households_results_table']
+]
+
+
+def _read_latex_score_table(path: str) -> pd.DataFrame:
+    """The scores of a published LaTeX table"""
+    rows = []
+    dimension = None
+    with open(path) as file:
+        for line in file:
+            cells = line.rstrip('\n').removesuffix(r' \\').split(' & ')
+            if len(cells) < 9 or not re.fullmatch(r'\d+', cells[2]):
+                continue
+            if cells[0]:
+                dimension = re.sub(r'\\multirow\[t]\{\d+}\{\*}\{(.*)}', r'\1', cells[0])
+            rows.append([dimension, cells[1], int(cells[2])] + [float(cell) for cell in cells[3:9]])
+    return pd.DataFrame(rows, columns=['dimension', 'condition', 'dof', 'z_squared', 'z_squared_p', 'x_squared',
+                                       'x_squared_p', 'absolute_error_total', 'absolute_error_standardized'])
+
+
+@pytest.mark.parametrize('path', baseline_tables)
+def test_render_latex_score_table_keeps_the_published_layout(path):
+    df_scores = _read_latex_score_table(path)
+
+    with open(path) as file:
+        assert render_latex_score_table(df_scores) == file.read()
+
+
+def test_render_latex_score_table_adds_extra_columns_on_request():
+    df_scores = _read_latex_score_table(baseline_tables[0]).head(3)
+    df_scores['srmse'] = [.1, .2, .3]
+
+    rendered = render_latex_score_table(df_scores, extra_columns=['srmse'], caption='Scores', label='tab:scores')
+    lines = rendered.splitlines()
+
+    assert lines[2] == r'\begin{tabular}{ll|r|rr|rr|rr|r}'
+    assert lines[5].endswith(r'& standardized & SRMSE \\')
+    assert lines[7].endswith(r'& 0.000236 & 0.100000 \\')
+    assert r'\cline{1-10}' in lines
+    assert lines[-3:] == [r'\caption{Scores}', r'\label{tab:scores}', r'\end{table}']
+    with pytest.raises(ValueError):
+        render_latex_score_table(df_scores, extra_columns=['z_squared'])
@@ -0,0 +1,110 @@
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from data_tools.shared_frame import SharedFrameSpec, SharedPopulationFrame
+
+
+def _population() -> pd.DataFrame:
+    return pd.DataFrame({
+        'neighb_code': ['BU1', 'BU1', 'BU2', 'BU2', 'BU3'],
+        'age': [3, 41, 17, 80, 55],
+        'income': pd.array([1.5, None, 2., 3.25, None], dtype='Float64'),
+        'car_license': [False, True, False, True, True],
+        'gender': pd.Categorical(['male', 'female', 'female', 'male', 'male']),
+    })
+
+
+def test_to_frame_returns_the_original_values():
+    df = _population()
+
+    with SharedPopulationFrame.from_frame(df) as shared:
+        df_shared = shared.to_frame(categorical=False)
+
+        assert len(shared) == len(df)
+        assert shared.columns == list(df.columns)
+        assert list(df_shared.neighb_code) == list(df.neighb_code)
+        assert list(df_shared.gender) == list(df.gender)
+        np.testing.assert_array_equal(df_shared.age, df.age)
+        np.testing.assert_array_equal(df_shared.car_license, df.car_license)
+        np.testing.assert_array_equal(df_shared.income, [1.5, np.nan, 2., 3.25, np.nan])
+
+
+def test_categorical_columns_are_stored_as_codes():
+    with SharedPopulationFrame.from_frame(_population(), ['neighb_code']) as shared:
+        assert list(shared.categories('neighb_code')) == ['BU1', 'BU2', 'BU3']
+        np.testing.assert_array_equal(shared.column('neighb_code'), [0, 0, 1, 1, 2])
+
+        s_neighborhoods = shared.series('neighb_code', 1, 4)
+        assert isinstance(s_neighborhoods.dtype, pd.CategoricalDtype)
+        assert list(s_neighborhoods.index) == [1, 2, 3]
+        assert list(s_neighborhoods) == ['BU1', 'BU2', 'BU2']
+
+
+def test_categories_keep_their_values_and_dtype():
+    df = pd.DataFrame({
+        'PC6': pd.Series([2491, 2491, 2532, None], dtype=object),
+        'age_group': pd.Categorical(['15-25', '0-15', '15-25', '0-15'], categories=['0-15', '15-25'], ordered=True),
+    })
+
+    with SharedPopulationFrame.from_frame(df) as shared:
+        pd.testing.assert_index_equal(shared.categories('PC6'), pd.Categorical(df.PC6).categories)
+        assert list(shared.categories('PC6')) == [2491, 2532]
+        assert shared.series('age_group').dtype == df.age_group.dtype
+
+        s_postal_codes = shared.series('PC6', categorical=False)
+        assert list(s_postal_codes[:3]) == [2491, 2491, 2532]
+        assert pd.isna(s_postal_codes[3])
+
+
+def test_numeric_columns_are_not_copied():
+    with SharedPopulationFrame.from_frame(_population(), ['age']) as shared:
+        s_age = shared.series('age')
+        shared.column('age')[0] = 4
+
+        assert s_age[0] == 4
+
+
+_worker_frame: Optional[SharedPopulationFrame] = None
+
+
+def _attach(spec: SharedFrameSpec) -> None:
+    global _worker_frame
+    _worker_frame = SharedPopulationFrame.attach(spec)
+
+
+def _sum_of_ages(neighborhood: str) -> int:
+    df = _worker_frame.to_frame(['neighb_code', 'age'], categorical=False)
+    return int(df.age[df.neighb_code == neighborhood].sum())
+
+
+def test_worker_processes_read_the_shared_columns():
+    with SharedPopulationFrame.from_frame(_population()) as shared:
+        with ProcessPoolExecutor(max_workers=2, initializer=_attach, initargs=(shared.spec,)) as pool:
+            sums = list(pool.map(_sum_of_ages, ['BU1', 'BU2', 'BU3']))
+
+    assert sums == [44, 97, 55]
+
+
+def test_close_releases_the_shared_memory():
+    shared = SharedPopulationFrame.from_frame(_population(), ['age'])
+    name = shared.spec.column('age').values.shm_name
+    shared.close()
+
+    with pytest.raises(FileNotFoundError):
+        shared_memory.SharedMemory(name=name)
+
+
+def test_only_the_owner_adds_columns():
+    with SharedPopulationFrame.from_frame(_population(), ['age']) as shared:
+        attached = SharedPopulationFrame.attach(shared.spec)
+        try:
+            np.testing.assert_array_equal(attached.column('age'), shared.column('age'))
+            with pytest.raises(AssertionError):
+                attached.add_column('gender', _population().gender)
+        finally:
+            attached.close()
@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+
+from data_tools.type_table import (compress_population, expand_type_table, population_size, population_to_contingency,
+                                   split_weights, type_table_from_totals, weight_column)
+
+
+def test_split_weights_preserves_the_weight_of_each_type():
+    rng = np.random.default_rng(0)
+    weights = rng.integers(0, 50, size=200)
+    probabilities = rng.dirichlet(np.ones(4), size=200)
+
+    counts = split_weights(weights, probabilities, rng)
+
+    assert counts.dtype == np.int64
+    assert (counts >= 0).all()
+    np.testing.assert_array_equal(counts.sum(axis=1), weights)
+
+
+def test_split_weights_rounds_each_expected_count_down_or_up():
+    rng = np.random.default_rng(1)
+    weights = np.array([7, 10, 3, 1])
+    probabilities = np.array([[.5, .5, 0.], [.25, .25, .5], [1 / 3, 1 / 3, 1 / 3], [.1, .2, .7]])
+
+    counts = split_weights(weights, probabilities, rng)
+
+    expected = weights[:, np.newaxis] * probabilities
+    assert (counts >= np.floor(expected - 1e-9)).all()
+    assert (counts <= np.ceil(expected + 1e-9)).all()
+    # The fractions of 2.5 and 2.5 add up to 1, so exactly one of them is rounded up
+    assert counts[1, 2] == 5 and sorted(counts[1, :2]) == [2, 3]
+    assert counts[0, 2] == 0
+
+
+def test_split_weights_is_unbiased():
+    rng = np.random.default_rng(2)
+    weights = np.array([5])
+    probabilities = np.array([[.3, .3, .4]])
+
+    counts = np.mean([split_weights(weights, probabilities, rng)[0] for _ in range(4000)], axis=0)
+
+    np.testing.assert_allclose(counts, [1.5, 1.5, 2.], atol=0.05)
+
+
+def test_split_weights_is_deterministic_for_a_seed():
+    weights = np.array([3, 8, 13])
+    probabilities = np.array([[.2, .8], [.45, .55], [.5, .5]])
+
+    first = split_weights(weights, probabilities, np.random.default_rng(3))
+    second = split_weights(weights, probabilities, np.random.default_rng(3))
+
+    np.testing.assert_array_equal(first, second)
+
+
+def _population() -> pd.DataFrame:
+    return pd.DataFrame({
+        'agent_id': [f'SA{i:06d}' for i in range(9)],
+        'neighb_code': ['BU1'] * 5 + ['BU2'] * 4,
+        'gender': ['male', 'female', 'female', 'male', 'female', 'male', 'male', 'female', 'male'],
+        'age_group': ['0-15', '0-15', '15-25', '0-15', '15-25', '25-45', '25-45', '25-45', '0-15'],
+    })
+
+
+def test_compress_and_expand_keep_the_counts_of_each_combination():
+    df_synth_pop = _population()
+
+    df_types = compress_population(df_synth_pop)
+    df_expanded = expand_type_table(df_types, random_state=0)
+
+    assert population_size(df_types) == len(df_synth_pop)
+    assert len(df_types) == df_synth_pop[['neighb_code', 'gender', 'age_group']].drop_duplicates().shape[0]
+    assert weight_column not in df_expanded.columns
+    assert list(df_expanded.agent_id) == [f'SA{i:06d}' for i in range(len(df_synth_pop))]
+    assert list(df_expanded.neighb_code) == list(df_synth_pop.neighb_code)
+
+    columns = ['neighb_code', 'gender', 'age_group']
+    pd.testing.assert_series_equal(df_expanded.groupby(columns).size(), df_synth_pop.groupby(columns).size())
+
+
+def test_expand_type_table_is_deterministic_for_a_seed():
+    df_types = compress_population(_population())
+
+    pd.testing.assert_frame_equal(expand_type_table(df_types, random_state=4),
+                                  expand_type_table(df_types, random_state=4))
+
+
+def test_population_to_contingency_counts_the_weights_of_a_type_table():
+    df_types = compress_population(_population())
+
+    df_counts = population_to_contingency(df_types, ['neighb_code', 'age_group'], full_crostab=True)
+
+    assert df_counts.loc[('BU1', '0-15'), 'count'] == 3
+    assert df_counts.loc[('BU2', '15-25'), 'count'] == 0
+    assert df_counts['count'].sum() == 9
+    assert len(df_counts) == 2 * 3
+
+
+def test_type_table_from_totals_leaves_out_empty_neighborhoods():
+    df_types = type_table_from_totals(pd.Series([10, 0, 5], index=['BU1', 'BU2', 'BU3']))
+
+    assert list(df_types.neighb_code) == ['BU1', 'BU3']
+    assert list(df_types[weight_column]) == [10, 5]